@@ -0,0 +1,103 @@
+"""
+メッセージ本文のデコード速度を比較する
+Compare the decoders on realistic SQS payload sizes
+
+    python -m benchmarks.decode
+"""
+from __future__ import annotations
+
+import json
+import timeit
+from dataclasses import dataclass
+
+from sqs_polling.decoder import json_decoder
+from sqs_polling.utils import loads, object_hook
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None  # type: ignore
+
+try:
+    import orjson
+except ImportError:
+    orjson = None  # type: ignore
+
+
+@dataclass
+class Item:
+    sku: str
+    quantity: int
+    price: float
+
+
+@dataclass
+class Order:
+    order_id: str
+    customer_id: str
+    status: str
+    items: list[Item]
+    tags: list[str]
+
+
+def _order(i: int, n_items: int) -> dict:
+    return {
+        "order_id": f"order-{i:08d}",
+        "customer_id": f"customer-{i % 997:06d}",
+        "status": "CREATED",
+        "items": [
+            {"sku": f"SKU-{j:05d}", "quantity": j % 5 + 1, "price": 19.99 + j}
+            for j in range(n_items)
+        ],
+        "tags": ["web", "campaign-2024", "priority"],
+    }
+
+
+# 小さいイベント(約0.3KB)・一般的な注文(約4KB)・上限に近い一括データ(約200KB)
+PAYLOADS = {
+    "small": json.dumps(_order(1, 1)),
+    "medium": json.dumps(_order(2, 60)),
+    "large": json.dumps({"orders": [_order(i, 60) for i in range(48)]}),
+}
+
+
+def _stdlib_object_hook(s: str):
+    # 変更前のutils.loadsと同じく、全てのdictでobject_hookを呼ぶ
+    return json.loads(s, object_hook=object_hook)
+
+
+def _decoders(name: str) -> dict:
+    decoders = {
+        "json+object_hook (before)": _stdlib_object_hook,
+        "utils.loads": loads,
+        "json_decoder(json)": json_decoder(backend="json"),
+    }
+    if orjson is not None:
+        decoders["json_decoder(orjson)"] = json_decoder(backend="orjson")
+    if msgspec is not None:
+        decoders["json_decoder(msgspec)"] = json_decoder(backend="msgspec")
+    if name != "large":
+        decoders["json_decoder(Order, json)"] = json_decoder(Order, backend="json")
+        if msgspec is not None:
+            decoders["json_decoder(Order, msgspec)"] = json_decoder(
+                Order, backend="msgspec"
+            )
+    return decoders
+
+
+def main() -> None:
+    for name, payload in PAYLOADS.items():
+        print(f"{name}: {len(payload) / 1024:.1f} KiB")
+        number = max(10, 2_000_000 // len(payload))
+        baseline = 0.0
+        for label, decode in _decoders(name).items():
+            seconds = min(
+                timeit.repeat(lambda: decode(payload), number=number, repeat=5)
+            )
+            per_call = seconds / number * 1e6
+            baseline = baseline or per_call
+            print(f"  {label:32} {per_call:10.2f} us  x{baseline / per_call:5.2f}")
+
+
+if __name__ == "__main__":
+    main()
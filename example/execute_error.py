@@ -1,6 +1,6 @@
 from sqs_polling import heartbeat, polling, ready
+from sqs_polling.context import MessageContext
 from sqs_polling.exceptions import RetryException
-from sqs_polling.handler import Polling
 from sqs_polling.polling import logger
 
 
@@ -15,7 +15,7 @@ from sqs_polling.polling import logger
     },
     max_retry_count=2,
 )
-def execute_error(self: Polling, *args, **kwargs):
+def execute_error(self: MessageContext, *args, **kwargs):
     import random
     from pprint import pprint
 
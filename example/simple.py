@@ -2,7 +2,7 @@ import json
 from typing import Any
 
 from sqs_polling import heartbeat, polling, ready
-from sqs_polling.handler import Polling
+from sqs_polling.context import MessageContext
 from sqs_polling.polling import logger
 
 
@@ -21,7 +21,7 @@ def decoder(value: str) -> dict[str, Any]:
     decoder=decoder,
 )
 def simple(
-    self: Polling,
+    self: MessageContext,
     message_body: dict[str, Any],
     message_attribute: dict[str, Any] | None,
     message_group_id: str | None,
@@ -1,5 +1,5 @@
 from sqs_polling import heartbeat, polling, ready
-from sqs_polling.handler import Polling
+from sqs_polling.context import MessageContext
 from sqs_polling.polling import logger
 
 
@@ -12,7 +12,7 @@ from sqs_polling.polling import logger
         "endpoint_url": "http://localstack:4566",
     },
 )
-def simple(self: Polling, *args, **kwargs):
+def simple(self: MessageContext, *args, **kwargs):
     import time
     from pprint import pprint
 
@@ -1,6 +1,6 @@
 from sqs_polling import heartbeat, polling, ready
+from sqs_polling.context import MessageContext
 from sqs_polling.exceptions import RejectDLQException
-from sqs_polling.handler import Polling
 from sqs_polling.polling import logger
 
 
@@ -13,7 +13,7 @@ from sqs_polling.polling import logger
         "endpoint_url": "http://localstack:4566",
     },
 )
-def simple(self: Polling, *args, **kwargs):
+def simple(self: MessageContext, *args, **kwargs):
     from pprint import pprint
 
     logger.info("simple received.")
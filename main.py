@@ -21,11 +21,9 @@ if __name__ == "__main__":
                     "formatter": "json",
                 },
             },
-            "loggers": {
-                "sqs_polling.polling": {"handlers": ["console"], "level": "INFO"}
-            },
+            "loggers": {"sqs_polling": {"handlers": ["console"], "level": "INFO"}},
         }
     )
-    logger = getLogger("sqs_polling.polling")
+    logger = getLogger("sqs_polling")
     logger.setLevel(INFO)
     command_main()
@@ -22,6 +22,15 @@ setup(
     url="https://github.com/nonchan7720/sqs-polling",
     packages=find_packages(exclude=["tests*"]),
     install_requires=["boto3", "asyncio"],
+    extras_require={
+        "aio": ["aiobotocore"],
+        "orjson": ["orjson"],
+        "msgspec": ["msgspec"],
+        "zstd": ["zstandard"],
+        "lz4": ["lz4"],
+        "otel": ["opentelemetry-api"],
+        "bench": ["moto[server]"],
+    },
     python_requires=">=3.10",
     classifiers=[
         "Development Status :: 1 - Planning",
@@ -33,6 +42,11 @@ setup(
         "Programming Language :: Python :: 3",
         "Programming Language :: Python :: 3.10",
     ],
-    entry_points={"console_scripts": ["sqs_apolling = sqs_polling.__main__:main"]},
+    entry_points={
+        "console_scripts": [
+            "sqs_apolling = sqs_polling.__main__:main",
+            "sqs_apolling_bench = sqs_polling.bench.__main__:main",
+        ]
+    },
     license=read_file("LICENSE"),
 )
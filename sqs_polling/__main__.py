@@ -1,4 +1,5 @@
 import sys
+from typing import Any
 
 __all__ = ("main",)
 
@@ -10,23 +11,53 @@ def main():
 
     parser = argparse.ArgumentParser(description="SQS polling")
     parser.add_argument(
-        "-f", "--func_name", type=str, help="polling function name", required=True
+        "-f",
+        "--func_name",
+        type=str,
+        nargs="+",
+        help="polling function or module names",
+        required=True,
     )
     parser.add_argument("-q", "--queue_url", type=str, help="queue url")
     parser.add_argument("-c", "--concurrency", type=int, help="concurrency", default=1)
     parser.add_argument(
         "-t", "--visibility_timeout", type=int, help="sqs visibility timeout", default=0
     )
-    parser.add_argument("-w", "--max_workers", type=int, help="max workers", default=1)
+    parser.add_argument("-w", "--max_workers", type=int, help="max workers", default=0)
+    parser.add_argument(
+        "-s",
+        "--schedule",
+        choices=("weighted", "priority"),
+        help="share worker slots between queues by weight or priority",
+    )
+    parser.add_argument(
+        "--slots", type=int, help="worker slots shared by the queues", default=0
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        help="serve Prometheus metrics on this port",
+        default=0,
+    )
     args = parser.parse_args()
-    main_args = {}
+    if args.schedule and args.slots < 1:
+        parser.error("--slots is required with --schedule")
+    if args.metrics_port:
+        from sqs_polling.metrics import start_http_server
+
+        start_http_server(args.metrics_port)
+    main_args: dict[str, Any] = {}
     if args.concurrency > 1:
         main_args["max_number_of_messages"] = args.concurrency
     if args.visibility_timeout > 0:
         main_args["visibility_timeout"] = args.visibility_timeout
     if args.max_workers:
         main_args["max_workers"] = args.max_workers
-    sys.exit(_main(args.func_name, **main_args))
+    if args.schedule:
+        from sqs_polling.scheduler import Scheduler
+
+        main_args["scheduler"] = Scheduler(args.slots, args.schedule)
+    sys.exit(_main(*args.func_name, **main_args))
 
 
 if __name__ == "__main__":
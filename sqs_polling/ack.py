@@ -0,0 +1,378 @@
+from __future__ import annotations
+
+from logging import getLogger
+from threading import Condition, Lock, Thread
+from time import monotonic
+from typing import TYPE_CHECKING, Any, Callable, NamedTuple
+
+from .dlq import MAX_BATCH_BYTES, entry_bytes
+from .metrics import ack_duration, ack_entries
+
+if TYPE_CHECKING:
+    from mypy_boto3_sqs import SQSClient
+
+logger = getLogger(__name__)
+
+# SQSのバッチAPIは1リクエストあたり最大10件
+MAX_BATCH_SIZE = 10
+
+DELETE = "delete"
+CHANGE_VISIBILITY = "change_visibility"
+SEND_DLQ = "send_dlq"
+
+TEntry = tuple[dict[str, Any], int]
+
+
+class _Call(NamedTuple):
+    operation: str
+    queue_url: str
+    entries: dict[str, TEntry]
+    request: list[dict[str, Any]]
+
+
+class BaseAckBuffer:
+    """
+    削除・可視性変更・DLQへの転送のバッチ化と再送の共通処理
+    同期版と非同期版はAPIの呼び出し方と送信の契機だけが異なる
+
+    Batching, response handling and retries shared by AckBuffer and
+    AsyncAckBuffer. Subclasses only decide how a batch call is made and
+    when buffered entries are sent.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        queue_url: str,
+        *,
+        dead_letter_queue_url: str = "",
+        interval_seconds: float = 0.1,
+        max_attempts: int = 3,
+    ) -> None:
+        self.client = client
+        self.queue_url = queue_url
+        self.dead_letter_queue_url = dead_letter_queue_url
+        self.interval_seconds = interval_seconds
+        self.max_attempts = max_attempts
+        # 削除が成功した後に呼び出す処理(ReceiptHandleごと)
+        self.__on_deleted: dict[str, Callable[[], None]] = {}
+        self.__on_deleted_lock = Lock()
+
+    def delete(
+        self, receipt_handle: str, on_deleted: Callable[[], None] | None = None
+    ) -> None:
+        if on_deleted is not None:
+            with self.__on_deleted_lock:
+                self.__on_deleted[receipt_handle] = on_deleted
+        self.add(DELETE, {"ReceiptHandle": receipt_handle})
+
+    def change_visibility(self, receipt_handle: str, visibility_timeout: int) -> None:
+        self.add(
+            CHANGE_VISIBILITY,
+            {"ReceiptHandle": receipt_handle, "VisibilityTimeout": visibility_timeout},
+        )
+
+    def send_dlq(self, receipt_handle: str, entry: dict[str, Any]) -> None:
+        """
+        entryをDLQへ送信し、成功した後に元のメッセージを削除する
+        Send ``entry`` to the DLQ and delete the message once it was sent
+        """
+        self.add(SEND_DLQ, {"ReceiptHandle": receipt_handle, "Entry": entry})
+
+    def add(self, action: str, params: dict[str, Any]) -> None:
+        self._enqueue(action, [(params, 0)])
+
+    def _enqueue(self, action: str, entries: list[TEntry]) -> None:
+        raise NotImplementedError
+
+    def _calls(self, action: str, batch: list[TEntry]) -> list[_Call]:
+        """
+        バッファから取り出したエントリーをバッチAPIの呼び出しに変換する
+        Turn a batch of buffered entries into the batch API calls to make
+        """
+        if action == SEND_DLQ:
+            operation, queue_url = "send_message_batch", self.dead_letter_queue_url
+            chunks = _split_bytes(batch)
+        else:
+            operation = (
+                "delete_message_batch"
+                if action == DELETE
+                else "change_message_visibility_batch"
+            )
+            queue_url, chunks = self.queue_url, [batch]
+        return [_Call(operation, queue_url, *_build_request(chunk)) for chunk in chunks]
+
+    def _settle(
+        self, action: str, call: _Call, started_at: float, response: Any
+    ) -> None:
+        """
+        バッチAPIのレスポンスを処理し、失敗したエントリーを再送する
+        responseがNoneの場合はリクエスト自体が失敗した
+
+        Handle a batch response and retry its failed entries. ``response``
+        is None when the request itself failed.
+        """
+        _observe(self.queue_url, action, started_at, len(call.entries), response)
+        if response is None:
+            # 送信されたか不明なため全て再送する(DLQ側はSourceMessageIdで重複を判別できる)
+            self.__retry(action, list(call.entries.values()))
+            return
+        if action == SEND_DLQ:
+            for sent in response.get("Successful", []):
+                params, _ = call.entries[sent["Id"]]
+                self.delete(params["ReceiptHandle"])
+        elif action == DELETE:
+            self.__deleted(call.entries, response)
+        # DLQへ送信できなかったメッセージは削除しないため、可視性タイムアウト後に再配信される
+        self.__retry(
+            action, _failed_entries(self.queue_url, action, call.entries, response)
+        )
+
+    def __deleted(self, entries: dict[str, TEntry], response: Any) -> None:
+        failed = {failed["Id"] for failed in response.get("Failed", [])}
+        callbacks = []
+        with self.__on_deleted_lock:
+            for id_, (params, _) in entries.items():
+                handle = params["ReceiptHandle"]
+                if id_ in failed and not _sender_fault(response, id_):
+                    # 再送されるため、削除されるまで保持する
+                    continue
+                if callback := self.__on_deleted.pop(handle, None):
+                    if id_ not in failed:
+                        callbacks.append(callback)
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.error(e, exc_info=True)
+
+    def __retry(self, action: str, entries: list[TEntry]) -> None:
+        retry = _next_attempts(self.queue_url, action, entries, self.max_attempts)
+        if action == DELETE and len(retry) < len(entries):
+            # 打ち切ったエントリーの削除後の処理は呼ばない
+            kept = {params["ReceiptHandle"] for params, _ in retry}
+            with self.__on_deleted_lock:
+                for params, _ in entries:
+                    if params["ReceiptHandle"] not in kept:
+                        self.__on_deleted.pop(params["ReceiptHandle"], None)
+        if retry:
+            self._enqueue(action, retry)
+
+
+class AckBuffer(BaseAckBuffer):
+    """
+    処理が完了したメッセージの削除・可視性変更・DLQへの転送をキュー単位でまとめてバッチAPIで送信する
+    DLQへの転送は送信が成功したメッセージだけを削除し、失敗したエントリーのみ再送する
+
+    Buffer finished receipt handles per queue and flush them with the batch
+    APIs. Messages forwarded to the DLQ are deleted only once their own
+    SendMessageBatch entry succeeded, and only failed entries are resent.
+    """
+
+    def __init__(
+        self,
+        client: SQSClient,
+        queue_url: str,
+        *,
+        dead_letter_queue_url: str = "",
+        interval_seconds: float = 0.1,
+        max_attempts: int = 3,
+    ) -> None:
+        super().__init__(
+            client,
+            queue_url,
+            dead_letter_queue_url=dead_letter_queue_url,
+            interval_seconds=interval_seconds,
+            max_attempts=max_attempts,
+        )
+        self.__entries: dict[str, list[TEntry]] = {
+            DELETE: [],
+            CHANGE_VISIBILITY: [],
+            SEND_DLQ: [],
+        }
+        self.__deadline: float | None = None
+        self.__cond = Condition()
+        self.__closed = False
+        self.__thread: Thread | None = None
+
+    def _enqueue(self, action: str, entries: list[TEntry]) -> None:
+        batch = self.__push(action, entries)
+        if batch:
+            # バッファが満杯になった場合は呼び出し元のスレッドで即時送信する
+            self._send(action, batch)
+
+    def flush(self) -> None:
+        for action, batch in self.__pop_all():
+            self._send(action, batch)
+
+    def close(self) -> None:
+        with self.__cond:
+            self.__closed = True
+            self.__cond.notify_all()
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+        # 再送分もmax_attemptsで打ち切られるため必ず空になる
+        while self.pending():
+            self.flush()
+
+    def pending(self) -> int:
+        with self.__cond:
+            return sum(len(entries) for entries in self.__entries.values())
+
+    def __push(self, action: str, entries: list[TEntry]) -> list[TEntry]:
+        with self.__cond:
+            buffered = self.__entries[action]
+            buffered.extend(entries)
+            batch: list[TEntry] = []
+            if (
+                self.interval_seconds <= 0
+                or self.__closed
+                or len(buffered) >= MAX_BATCH_SIZE
+            ):
+                batch = buffered[:MAX_BATCH_SIZE]
+                del buffered[:MAX_BATCH_SIZE]
+            if buffered and not self.__closed:
+                if self.__deadline is None:
+                    self.__deadline = monotonic() + self.interval_seconds
+                self.__start()
+                self.__cond.notify()
+            return batch
+
+    def __pop_all(self) -> list[tuple[str, list[TEntry]]]:
+        with self.__cond:
+            batches = []
+            for action, buffered in self.__entries.items():
+                while buffered:
+                    batches.append((action, buffered[:MAX_BATCH_SIZE]))
+                    del buffered[:MAX_BATCH_SIZE]
+            self.__deadline = None
+            return batches
+
+    def __start(self) -> None:
+        if self.__thread is None:
+            self.__thread = Thread(
+                target=self.__run, name=f"sqs-polling-ack-{self.queue_url}", daemon=True
+            )
+            self.__thread.start()
+
+    def __run(self) -> None:
+        while True:
+            with self.__cond:
+                while not self.__closed and (
+                    self.__deadline is None or self.__deadline > monotonic()
+                ):
+                    timeout = (
+                        None
+                        if self.__deadline is None
+                        else self.__deadline - monotonic()
+                    )
+                    self.__cond.wait(timeout)
+                if self.__closed:
+                    return
+            self.flush()
+
+    def _send(self, action: str, batch: list[TEntry]) -> None:
+        for call in self._calls(action, batch):
+            started_at = monotonic()
+            try:
+                response = getattr(self.client, call.operation)(
+                    QueueUrl=call.queue_url, Entries=call.request
+                )
+            except Exception as e:
+                logger.error(e, exc_info=True)
+                response = None
+            self._settle(action, call, started_at, response)
+
+
+def _build_request(
+    batch: list[TEntry],
+) -> tuple[dict[str, TEntry], list[dict[str, Any]]]:
+    entries = {str(i): entry for i, entry in enumerate(batch)}
+    request = [
+        dict(params["Entry"] if "Entry" in params else params, Id=id_)
+        for id_, (params, _) in entries.items()
+    ]
+    return entries, request
+
+
+def _split_bytes(batch: list[TEntry]) -> list[list[TEntry]]:
+    """
+    SendMessageBatchの合計サイズの上限を超えないように分割する
+    Split a batch so that each SendMessageBatch stays within the size limit
+    """
+    chunks: list[list[TEntry]] = []
+    size = 0
+    for entry in batch:
+        entry_size = entry_bytes(entry[0]["Entry"])
+        if not chunks or size + entry_size > MAX_BATCH_BYTES:
+            chunks.append([])
+            size = 0
+        chunks[-1].append(entry)
+        size += entry_size
+    return chunks
+
+
+def _failed_entries(
+    queue_url: str, action: str, entries: dict[str, TEntry], response: Any
+) -> list[TEntry]:
+    """
+    バッチAPIのレスポンスから再送するエントリーを取り出す
+    Return the entries of a batch response that should be retried
+    """
+    retry: list[TEntry] = []
+    for failed in response.get("Failed", []):
+        entry = entries[failed["Id"]]
+        if failed.get("SenderFault"):
+            # ReceiptHandleが無効など、再送しても成功しないエラー
+            logger.error(
+                "Batch entry failed",
+                extra={
+                    "queue": queue_url,
+                    "action": action,
+                    "code": failed.get("Code"),
+                    "reason": failed.get("Message"),
+                },
+            )
+        else:
+            retry.append(entry)
+    return retry
+
+
+def _observe(
+    queue_url: str, action: str, started_at: float, size: int, response: Any
+) -> None:
+    # responseがNoneの場合はリクエスト自体が失敗した
+    ack_duration.observe(monotonic() - started_at, queue_url, action)
+    failed = size if response is None else len(response.get("Failed", []))
+    if failed:
+        ack_entries.inc(queue_url, action, "failed", amount=failed)
+    if size > failed:
+        ack_entries.inc(queue_url, action, "success", amount=size - failed)
+
+
+def _sender_fault(response: Any, id_: str) -> bool:
+    return any(
+        failed["Id"] == id_ and failed.get("SenderFault")
+        for failed in response.get("Failed", [])
+    )
+
+
+def _next_attempts(
+    queue_url: str, action: str, entries: list[TEntry], max_attempts: int
+) -> list[TEntry]:
+    retry = []
+    for params, attempts in entries:
+        if attempts + 1 >= max_attempts:
+            ack_entries.inc(queue_url, action, "dropped")
+            logger.error(
+                "Batch entry dropped",
+                extra={
+                    "queue": queue_url,
+                    "action": action,
+                    "handle": params["ReceiptHandle"],
+                },
+            )
+        else:
+            retry.append((params, attempts + 1))
+    return retry
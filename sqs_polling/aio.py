@@ -0,0 +1,417 @@
+from __future__ import annotations
+
+import traceback
+from asyncio import Semaphore, Task, gather, get_event_loop, sleep
+from contextlib import AsyncExitStack
+from time import monotonic, time
+from typing import TYPE_CHECKING
+
+from .ack import (
+    CHANGE_VISIBILITY,
+    DELETE,
+    MAX_BATCH_SIZE,
+    SEND_DLQ,
+    BaseAckBuffer,
+    TEntry,
+    _Call,
+)
+from .buffer import _group_id
+from .context import RECEIVED_AT, MessageContext, stamp_received_at
+from .exceptions import BasePollingException
+from .execute_result import ExecuteResult
+from .handler import Polling
+from .lease import LeaseManager
+from .metrics import (
+    handler_duration,
+    receive_duration,
+    receive_errors,
+    receive_messages,
+    visibility_remaining,
+    wait_duration,
+)
+from .polling import (
+    _acknowledge,
+    _decode_body,
+    _error_message,
+    _exception_result,
+    _pool_size,
+    _visibility_remaining,
+    ev,
+    logger,
+)
+from .signal import handler_result
+from .tracing import process_span, receive_span, set_message_count, set_result, span
+from .transport import TRANSPORT, AsyncTransport
+
+try:
+    from aiobotocore.config import AioConfig
+    from aiobotocore.session import get_session
+except ImportError:  # pragma: no cover
+    get_session = None
+
+if TYPE_CHECKING:
+    from mypy_boto3_sqs.type_defs import MessageTypeDef
+
+
+class AsyncAckBuffer(BaseAckBuffer):
+    """
+    AckBufferのasyncio版
+    asyncio counterpart of AckBuffer for the non-blocking client
+    """
+
+    def __init__(
+        self,
+        client,
+        queue_url: str,
+        *,
+        dead_letter_queue_url: str = "",
+        interval_seconds: float = 0.1,
+        max_attempts: int = 3,
+    ) -> None:
+        super().__init__(
+            client,
+            queue_url,
+            dead_letter_queue_url=dead_letter_queue_url,
+            interval_seconds=interval_seconds,
+            max_attempts=max_attempts,
+        )
+        self.__entries: dict[str, list[TEntry]] = {
+            DELETE: [],
+            CHANGE_VISIBILITY: [],
+            SEND_DLQ: [],
+        }
+        self.__timer: Task | None = None
+        self.__sending: set[Task] = set()
+        self.__closed = False
+
+    async def flush(self) -> None:
+        batches = []
+        for action, buffered in self.__entries.items():
+            while buffered:
+                batches.append(self._send(action, buffered[:MAX_BATCH_SIZE]))
+                del buffered[:MAX_BATCH_SIZE]
+        await gather(*batches)
+
+    async def close(self) -> None:
+        self.__closed = True
+        if self.__timer is not None:
+            self.__timer.cancel()
+            self.__timer = None
+        while self.__sending or any(self.__entries.values()):
+            # 完了済みのタスクは待っても制御が戻らず、集合から外れないため先に取り出す
+            sending = list(self.__sending)
+            self.__sending.difference_update(sending)
+            await gather(*sending)
+            await self.flush()
+
+    def _enqueue(self, action: str, entries: list[TEntry]) -> None:
+        buffered = self.__entries[action]
+        buffered.extend(entries)
+        while len(buffered) >= MAX_BATCH_SIZE or (
+            buffered and (self.interval_seconds <= 0 or self.__closed)
+        ):
+            self.__spawn(self._send(action, buffered[:MAX_BATCH_SIZE]))
+            del buffered[:MAX_BATCH_SIZE]
+        if buffered and self.__timer is None:
+            self.__timer = get_event_loop().create_task(self.__flush_later())
+
+    def __spawn(self, coro) -> None:
+        task = get_event_loop().create_task(coro)
+        self.__sending.add(task)
+        task.add_done_callback(self.__sending.discard)
+
+    async def __flush_later(self) -> None:
+        await sleep(self.interval_seconds)
+        self.__timer = None
+        await self.flush()
+
+    async def _send(self, action: str, batch: list[TEntry]) -> None:
+        await gather(
+            *(self.__call(action, call) for call in self._calls(action, batch))
+        )
+
+    async def __call(self, action: str, call: _Call) -> None:
+        started_at = monotonic()
+        try:
+            response = await getattr(self.client, call.operation)(
+                QueueUrl=call.queue_url, Entries=call.request
+            )
+        except Exception as e:
+            logger.error(e, exc_info=True)
+            response = None
+        self._settle(action, call, started_at, response)
+
+
+class AsyncEngine:
+    """
+    async defのハンドラーを1スレッドのイベントループ上で並行実行する
+    Run an ``async def`` handler concurrently on the event loop with a non-blocking client
+    """
+
+    def __init__(self, p: Polling) -> None:
+        if get_session is None and TRANSPORT not in p.aws_profile:
+            raise ImportError(
+                "aiobotocore is required for async handlers: "
+                "pip install sqs-apolling[aio]"
+            )
+        self.p = p
+        self.client = None
+        self.ack: AsyncAckBuffer | None = None
+        self.__stack = AsyncExitStack()
+        # 先読み分を含め、全ての受信ループで共有する処理枠
+        self.__capacity = Semaphore(p.max_workers + p.prefetch)
+        self.__starter: Task | None = None
+        self.__receivers: list[Task] = []
+        self.lease: LeaseManager | None = None
+        self.__tasks: set[Task] = set()
+
+    def start(self) -> Task:
+        self.__starter = get_event_loop().create_task(self.__run())
+        return self.__starter
+
+    async def aclose(self) -> None:
+        if self.__starter is not None and not self.__starter.done():
+            self.__starter.cancel()
+            await gather(self.__starter, return_exceptions=True)
+        for receiver in self.__receivers:
+            receiver.cancel()
+        await gather(*self.__receivers, return_exceptions=True)
+        await gather(*self.__tasks, return_exceptions=True)
+        if self.ack is not None:
+            await self.ack.close()
+        await self.__stack.aclose()
+
+    async def __run(self) -> None:
+        p = self.p
+        profile = dict(p.aws_profile)
+        if (transport := profile.pop(TRANSPORT, None)) is not None:
+            self.client = AsyncTransport(transport)
+        else:
+            # 同時に処理するメッセージ数に合わせて接続プールを広げる
+            config = AioConfig(max_pool_connections=_pool_size(p))
+            if (user_config := profile.pop("config", None)) is not None:
+                config = user_config.merge(config)
+            self.client = await self.__stack.enter_async_context(
+                get_session().create_client("sqs", config=config, **profile)
+            )
+        await p.aset_queue_url(self.client)
+        await p.aset_dead_later_queue_url(self.client)
+        self.ack = AsyncAckBuffer(
+            self.client,
+            p.queue_url,
+            dead_letter_queue_url=p.dead_later_queue_url,
+            interval_seconds=p.ack_interval_seconds,
+        )
+        if p.extend_visibility:
+            self.lease = LeaseManager(
+                p.queue_url,
+                p.visibility_timeout,
+                max_lease_seconds=p.max_lease_seconds,
+            )
+        loop = get_event_loop()
+        self.__receivers = [
+            loop.create_task(self.__receive_loop()) for _ in range(p.receivers)
+        ]
+        if self.lease is not None:
+            # 受信ループと一緒に停止させる
+            self.__receivers.append(loop.create_task(self.__extend_leases()))
+
+    async def __extend_leases(self) -> None:
+        assert self.lease is not None
+        while True:
+            await sleep(self.lease.interval_seconds)
+            for batch in self.lease.due():
+                try:
+                    response = await self.client.change_message_visibility_batch(  # type: ignore
+                        QueueUrl=self.p.queue_url, Entries=batch
+                    )
+                except Exception as e:
+                    # 期限は更新されないため次の周期で再度延長する
+                    logger.error(e, exc_info=True)
+                    continue
+                self.lease.extended(batch, response)
+
+    async def __receive_loop(self) -> None:
+        p = self.p
+        backoff = 0.0
+        while not ev.is_set():
+            # 空きができるまで待機する
+            await self.__capacity.acquire()
+            slots = 1
+            while slots < p.max_number_of_messages and not self.__capacity.locked():
+                await self.__capacity.acquire()
+                slots += 1
+            started_at = monotonic()
+            try:
+                with receive_span(p):
+                    messages = await self.__receive(slots)
+                    set_message_count(len(messages))
+            except Exception as e:
+                logger.error(e, exc_info=True)
+                receive_errors.inc(p.queue_url)
+                messages = []
+            else:
+                receive_duration.observe(monotonic() - started_at, p.queue_url)
+                receive_messages.observe(len(messages), p.queue_url)
+            for _ in range(slots - len(messages)):
+                self.__capacity.release()
+            if self.lease is not None:
+                for message in messages:
+                    self.lease.track(message["ReceiptHandle"])
+
+            if len(messages) > 0:
+                backoff = 0.0
+                self.__dispatch(messages)
+            else:
+                # 空の受信が続く場合のみ待機時間を延ばす
+                backoff = min(
+                    max(backoff * 2, p.interval_seconds), p.max_backoff_seconds
+                )
+                await sleep(backoff)
+
+    async def __receive(self, max_number_of_messages: int) -> list[MessageTypeDef]:
+        p = self.p
+        logger.info("Receiving.")
+        response = await self.client.receive_message(  # type: ignore
+            QueueUrl=p.queue_url,
+            VisibilityTimeout=p.visibility_timeout,
+            MaxNumberOfMessages=max_number_of_messages,
+            WaitTimeSeconds=p.wait_time_seconds,
+            AttributeNames=["All"],
+            MessageAttributeNames=["All"],
+        )
+        messages = stamp_received_at(response.get("Messages", []))
+        if messages:
+            logger.info("Received messages.", extra={"length": len(messages)})
+        else:
+            logger.info("Empty messages.")
+        return messages
+
+    def __dispatch(self, messages: list[MessageTypeDef]) -> None:
+        if self.p.queue_url.endswith(".fifo"):
+            # メッセージグループ内は順番に処理し、グループ同士は並行に処理する
+            groups: dict[str | None, list[MessageTypeDef]] = {}
+            for message in messages:
+                groups.setdefault(_group_id(message), []).append(message)
+            for group_messages in groups.values():
+                # 1件ずつ処理するグループは処理枠を1つだけ使い、残りは他のグループの受信に回す
+                for _ in group_messages[1:]:
+                    self.__capacity.release()
+                self.__spawn(self.__execute_in_order(group_messages))
+        else:
+            for message in messages:
+                self.__spawn(self.__execute_and_release(message))
+
+    def __spawn(self, coro) -> None:
+        task = get_event_loop().create_task(coro)
+        self.__tasks.add(task)
+        task.add_done_callback(self.__tasks.discard)
+
+    async def __execute_in_order(self, messages: list[MessageTypeDef]) -> None:
+        try:
+            for i, message in enumerate(messages):
+                result = await self.__execute_safely(message)
+                if result == ExecuteResult.Retry:
+                    # 再処理するメッセージより後続が先に処理されないよう、残りも戻す
+                    assert self.ack is not None
+                    for rest in messages[i + 1 :]:
+                        if self.lease is not None:
+                            self.lease.release(rest["ReceiptHandle"])
+                        self.ack.change_visibility(rest["ReceiptHandle"], 0)
+                    return
+        finally:
+            self.__capacity.release()
+
+    async def __execute_and_release(self, message: MessageTypeDef) -> None:
+        try:
+            await self.__execute_safely(message)
+        finally:
+            self.__capacity.release()
+
+    async def __execute_safely(self, message: MessageTypeDef) -> ExecuteResult:
+        p = self.p
+        started_at = time()
+        wait_duration.observe(
+            started_at - message.get(RECEIVED_AT, started_at), p.queue_url
+        )
+        result = "Error"
+        try:
+            with process_span(p, message):
+                result_type = await self._execute(message)
+                set_result(result_type)
+            result = str(result_type)
+            return result_type
+        except Exception as e:
+            logger.error(e, exc_info=True)
+            return ExecuteResult.Nil
+        finally:
+            finished_at = time()
+            handler_duration.observe(finished_at - started_at, p.queue_url, result)
+            visibility_remaining.observe(
+                _visibility_remaining(p, self.lease, message, finished_at),
+                p.queue_url,
+            )
+            if self.lease is not None:
+                self.lease.release(message["ReceiptHandle"])
+
+    async def _execute(self, message: MessageTypeDef) -> ExecuteResult:
+        p = self.p
+        ctx = MessageContext.from_message(p, message)
+        if ctx.is_max_retry():
+            # 最大リトライ回数を超えた場合は再処理せずメッセージを削除する
+            self._finish_message(ExecuteResult.Reject, message)
+            return ExecuteResult.Reject
+        result_type: ExecuteResult = ExecuteResult.Nil
+        error = ""
+        handler_result_kwargs = {
+            "result_type": result_type,
+            "retry_count": ctx.retry,
+            "error_message": "",
+            "stack_trace": "",
+        }
+        try:
+            with span(p, "decode"):
+                body = _decode_body(p, ctx, message)
+            with span(p, "handle"):
+                await p.handler(  # type: ignore
+                    ctx,
+                    body,
+                    ctx.message_attributes,
+                    ctx.message_group_id,
+                    ctx.message_deduplication_id,
+                )
+            result_type = ExecuteResult.Deletable
+        except Exception as e:
+            result_type = _exception_result(e, p.exception_deletable)
+            error = _error_message(e)
+            if not isinstance(e, BasePollingException):
+                handler_result_kwargs["error_message"] = str(e)
+                handler_result_kwargs["stack_trace"] = traceback.format_exc()
+                logger.error(e, exc_info=True, stack_info=True)
+        finally:
+            handler_result_kwargs["result_type"] = result_type
+            logger.debug("handler finally", extra={"result_type": str(result_type)})
+            handler_result.send(**handler_result_kwargs)
+        with span(p, "ack"):
+            self._finish_message(result_type, message, error)
+        return result_type
+
+    def _finish_message(
+        self, result: ExecuteResult, message: MessageTypeDef, error: str = ""
+    ) -> None:
+        assert self.ack is not None
+        _acknowledge(self.p, self.ack, result, message, error)
+
+
+def _aio_handler(p: Polling) -> AsyncEngine:
+    if p.process_worker:
+        raise ValueError("process_worker can not be used with async handlers.")
+    if p.autoscale:
+        raise ValueError("autoscale can not be used with async handlers.")
+    if p.batch:
+        raise ValueError("batch can not be used with async handlers.")
+    if p.payload_offload:
+        raise ValueError("payload_offload can not be used with async handlers.")
+    engine = AsyncEngine(p)
+    engine.start()
+    return engine
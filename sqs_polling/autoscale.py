@@ -0,0 +1,209 @@
+from __future__ import annotations
+
+from logging import getLogger
+from math import floor
+from threading import Condition, Event, Lock, Thread
+from typing import TYPE_CHECKING
+
+from .client import get_client
+
+if TYPE_CHECKING:
+    from .buffer import PrefetchBuffer
+    from .handler import Polling
+
+logger = getLogger(__name__)
+
+
+class ConcurrencyLimit:
+    """
+    上限を実行中に変更できるセマフォ
+    上限を下げた場合、実行中の処理は止めずに新しい取得だけを待たせる
+
+    Semaphore whose limit can be changed while it is in use. Lowering the
+    limit never interrupts running work; it only holds back new acquires.
+    """
+
+    def __init__(self, limit: int) -> None:
+        self.__limit = limit
+        self.__in_use = 0
+        self.__peak = 0
+        self.__cond = Condition()
+
+    @property
+    def limit(self) -> int:
+        return self.__limit
+
+    @limit.setter
+    def limit(self, value: int) -> None:
+        with self.__cond:
+            self.__limit = value
+            self.__cond.notify_all()
+
+    @property
+    def in_use(self) -> int:
+        return self.__in_use
+
+    def acquire(self, timeout: float | None = None) -> bool:
+        with self.__cond:
+            if not self.__cond.wait_for(lambda: self.__in_use < self.__limit, timeout):
+                return False
+            self.__in_use += 1
+            self.__peak = max(self.__peak, self.__in_use)
+            return True
+
+    def release(self) -> None:
+        with self.__cond:
+            self.__in_use -= 1
+            self.__cond.notify_all()
+
+    def peak(self) -> int:
+        """
+        前回の呼び出しから同時に使われた枠の最大数
+        Most slots in use at once since the previous call
+        """
+        with self.__cond:
+            peak, self.__peak = self.__peak, self.__in_use
+            return peak
+
+
+class AutoScaler:
+    """
+    キューの滞留数・ハンドラーの処理時間・エラー率から同時実行数をAIMDで調整する
+    滞留があり枠を使い切っている間は1ずつ増やし、エラーや処理時間の悪化時は割合で減らす
+
+    Adjust a ``ConcurrencyLimit`` between ``min_workers`` and ``max_workers``
+    with AIMD. The limit grows by one while the queue has a backlog and every
+    slot is busy, and is cut by a factor when the error rate rises or the
+    handler latency degrades against its best recent value.
+    """
+
+    def __init__(
+        self,
+        p: Polling,
+        limit: ConcurrencyLimit,
+        buffer: PrefetchBuffer,
+        *,
+        interval_seconds: float = 5.0,
+        max_error_rate: float = 0.1,
+        latency_tolerance: float = 2.0,
+        decrease_factor: float = 0.75,
+    ) -> None:
+        self.polling = p
+        self.limit = limit
+        self.buffer = buffer
+        self.interval_seconds = interval_seconds
+        self.max_error_rate = max_error_rate
+        self.latency_tolerance = latency_tolerance
+        self.decrease_factor = decrease_factor
+        # 最も良かった平均処理時間(徐々に忘れる)
+        self.__baseline: float | None = None
+        self.__handled = 0
+        self.__errors = 0
+        self.__latency_total = 0.0
+        self.__lock = Lock()
+        self.__stop = Event()
+        self.__thread: Thread | None = None
+
+    def record(self, latency: float, error: bool) -> None:
+        with self.__lock:
+            self.__handled += 1
+            self.__latency_total += latency
+            if error:
+                self.__errors += 1
+
+    def __window(self) -> tuple[int, int, float]:
+        with self.__lock:
+            window = (self.__handled, self.__errors, self.__latency_total)
+            self.__handled = self.__errors = 0
+            self.__latency_total = 0.0
+        return window
+
+    def __backlog(self) -> int:
+        try:
+            attr = get_client(self.polling.aws_profile).get_queue_attributes(
+                QueueUrl=self.polling.queue_url,
+                AttributeNames=["ApproximateNumberOfMessages"],
+            )
+            return int(attr["Attributes"]["ApproximateNumberOfMessages"])
+        except Exception as e:
+            logger.error(e, exc_info=True)
+            return 0
+
+    def decide(
+        self,
+        current: int,
+        peak: int,
+        depth: int,
+        handled: int,
+        errors: int,
+        latency: float,
+    ) -> tuple[int, str]:
+        """
+        次の上限と理由を返す
+        Return the next limit and the reason for it
+        """
+        if handled > 0:
+            if errors / handled > self.max_error_rate:
+                return floor(current * self.decrease_factor), "error_rate"
+            if self.__baseline is None or latency < self.__baseline:
+                self.__baseline = latency
+            else:
+                # 負荷の変化に追従できるよう基準値を少しずつ現在値へ寄せる
+                self.__baseline += (latency - self.__baseline) * 0.05
+            if latency > self.__baseline * self.latency_tolerance:
+                return floor(current * self.decrease_factor), "latency"
+        if depth > 0 and peak >= current:
+            return current + 1, "backlog"
+        if depth == 0 and peak < current / 2:
+            return current - 1, "idle"
+        return current, ""
+
+    def adjust(self) -> None:
+        p = self.polling
+        handled, errors, latency_total = self.__window()
+        latency = latency_total / handled if handled else 0.0
+        # バッファで処理待ちの分とキューに滞留している分
+        depth = self.buffer.stats()["waiting"] + self.__backlog()
+        current = self.limit.limit
+        peak = self.limit.peak()
+        limit, reason = self.decide(current, peak, depth, handled, errors, latency)
+        limit = min(max(limit, p.min_workers), p.max_workers)
+        if limit == current:
+            return
+        self.limit.limit = limit
+        # 処理できない分まで先に受信しないよう、バッファの容量も合わせる
+        batch_size = p.batch_size if p.batch else 1
+        self.buffer.resize(limit * batch_size + p.prefetch)
+        logger.info(
+            "Concurrency limit changed",
+            extra={
+                "queue": p.queue_url,
+                "from": current,
+                "to": limit,
+                "reason": reason,
+                "depth": depth,
+                "peak": peak,
+                "handled": handled,
+                "error_rate": errors / handled if handled else 0.0,
+                "latency": latency,
+            },
+        )
+
+    def start(self) -> None:
+        if self.__thread is None:
+            self.__thread = Thread(
+                target=self.__run,
+                name=f"sqs-polling-autoscale-{self.polling.queue_url}",
+                daemon=True,
+            )
+            self.__thread.start()
+
+    def stop(self) -> None:
+        self.__stop.set()
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+
+    def __run(self) -> None:
+        while not self.__stop.wait(self.interval_seconds):
+            self.adjust()
@@ -0,0 +1,479 @@
+"""
+ローカルのSQS互換サーバーにメッセージを投入し、ポーリングのスループットを計測する
+Fill a local SQS stand-in with a message mix and measure the polling engine
+
+    python -m sqs_polling.bench --backend memory --workers 1,8
+    python -m sqs_polling.bench --messages 2000 --workers 1,8 --max-messages 1,10
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import uuid
+from collections import Counter
+from itertools import product
+from logging import getLogger
+from multiprocessing.util import Finalize
+from random import Random
+from threading import Event, Lock, Thread
+from time import perf_counter, sleep, time
+from typing import Any, NamedTuple, TypedDict
+
+import boto3
+
+from ..client import get_client
+from ..decoder import json_decoder
+from ..handler import get_handler
+from ..polling import (
+    _close_ack_buffers,
+    _handler,
+    _pool_size,
+    _stop_lease_managers,
+    ev,
+    polling,
+)
+from ..signal import worker_process_init
+from ..transport import TRANSPORT, Transport
+
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    resource = None  # type: ignore
+
+logger = getLogger(__name__)
+
+# ワーカープロセスへ計測結果の出力先とハンドラーの処理時間を渡す環境変数
+ENV_DIR = "SQS_POLLING_BENCH_DIR"
+ENV_HANDLER_SECONDS = "SQS_POLLING_BENCH_HANDLER_SECONDS"
+HANDLER_NAME = "bench_handler"
+# 本文のサイズ(バイト)と割合
+DEFAULT_MIX = {256: 70, 4096: 25, 65536: 5}
+# SendMessageBatchの合計サイズの上限より余裕を持たせる
+_FILL_BATCH_BYTES = 200 * 1024
+
+
+class Scenario(NamedTuple):
+    max_workers: int
+    max_number_of_messages: int
+    process_worker: bool
+    fifo: bool
+
+    @property
+    def name(self) -> str:
+        mode = "process" if self.process_worker else "thread"
+        kind = "fifo" if self.fifo else "standard"
+        return (
+            f"{kind}/{mode}/workers={self.max_workers}"
+            f"/max_messages={self.max_number_of_messages}"
+        )
+
+
+class Report(TypedDict):
+    scenario: str
+    messages: int
+    seconds: float
+    messages_per_second: float
+    latency_p50_ms: float
+    latency_p99_ms: float
+    api_calls_per_message: float
+    api_calls: dict[str, int]
+    cpu_seconds: float
+    max_rss_mb: float
+
+
+class _Sink:
+    """
+    ハンドラーの処理結果とAPI呼び出し数をプロセスごとに集める
+    Collect end-to-end latencies and API calls, one per process
+    """
+
+    def __init__(self) -> None:
+        self.latencies: list[float] = []
+        self.calls: Counter[str] = Counter()
+        self.__lock = Lock()
+
+    def reset(self) -> None:
+        with self.__lock:
+            self.latencies = []
+            self.calls = Counter()
+
+    def record(self, latency: float) -> None:
+        with self.__lock:
+            self.latencies.append(latency)
+
+    def add(self, operation: str) -> None:
+        with self.__lock:
+            self.calls[operation] += 1
+
+    def count(self, model, **_) -> None:
+        self.add(model.name)
+
+    def dump(self, directory: str) -> None:
+        with self.__lock:
+            data = {"latencies": self.latencies, "calls": self.calls}
+        with open(os.path.join(directory, f"{os.getpid()}.json"), "w") as f:
+            json.dump(data, f)
+
+
+_sink = _Sink()
+# fork先に親プロセスの計測値を持ち込まない
+os.register_at_fork(after_in_child=_sink.reset)
+
+
+def _count_calls(client) -> None:
+    client.meta.events.register(
+        "before-call.sqs", _sink.count, unique_id="sqs-polling-bench"
+    )
+
+
+class _CountedTransport:
+    """
+    トランスポートの呼び出しを操作名(ReceiveMessageなど)ごとに数える
+    Count the calls made through a transport by SQS operation name
+    """
+
+    def __init__(self, transport: Transport) -> None:
+        self.transport = transport
+
+    def __getattr__(self, name: str):
+        method = getattr(self.transport, name)
+        operation = "".join(word.title() for word in name.split("_"))
+
+        def call(**kwargs: Any) -> dict[str, Any]:
+            _sink.add(operation)
+            return method(**kwargs)
+
+        return call
+
+
+def bench_handler(ctx, body, *_):
+    if seconds := float(os.environ.get(ENV_HANDLER_SECONDS, "0")):
+        sleep(seconds)
+    _sink.record(time() - body["t"])
+
+
+# ワーカープロセスでもモジュールの読み込み時に登録される
+polling(queue_url="bench", decoder=json_decoder())(bench_handler)
+
+
+def _init_worker(polling, **_) -> None:
+    directory = os.environ.get(ENV_DIR)
+    if polling.name != HANDLER_NAME or not directory:
+        return
+    _count_calls(get_client(polling.aws_profile))
+    # 未送信の削除が送信された後に書き出す
+    Finalize(None, _sink.dump, args=(directory,), exitpriority=1)
+
+
+worker_process_init.connect(_init_worker)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class MotoServer:
+    """
+    moto serverを別プロセスで起動する
+    計測するプロセスのCPU時間に含めないため、スレッドではなくプロセスで動かす
+
+    Run moto server in a separate process, so that its CPU time is not
+    counted against the engine being measured.
+    """
+
+    def __init__(self, port: int = 0) -> None:
+        self.port = port or _free_port()
+        self.__process: subprocess.Popen | None = None
+
+    @property
+    def endpoint_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self, timeout: float = 30.0) -> None:
+        try:
+            import moto.server  # noqa: F401
+        except ImportError:
+            raise ImportError(
+                "moto is required for the benchmark: pip install sqs-apolling[bench]"
+            ) from None
+        self.__process = subprocess.Popen(
+            [sys.executable, "-m", "moto.server", "-p", str(self.port)],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        deadline = perf_counter() + timeout
+        while perf_counter() < deadline:
+            try:
+                socket.create_connection(("127.0.0.1", self.port), 0.1).close()
+                return
+            except OSError:
+                sleep(0.1)
+        self.stop()
+        raise TimeoutError("moto server did not start.")
+
+    def stop(self) -> None:
+        if self.__process is not None:
+            self.__process.terminate()
+            self.__process.wait()
+            self.__process = None
+
+
+def parse_mix(value: str) -> dict[int, int]:
+    """
+    "256:70,4096:25,65536:5"のようなサイズと割合の指定
+    Parse a body size mix such as ``256:70,4096:25,65536:5``
+    """
+    mix = {}
+    for item in value.split(","):
+        size, _, weight = item.partition(":")
+        mix[int(size)] = int(weight or 1)
+    return mix
+
+
+def _sizes(messages: int, mix: dict[int, int], seed: int = 0) -> list[int]:
+    return Random(seed).choices(list(mix), weights=list(mix.values()), k=messages)
+
+
+def _send(sqs, url: str, sizes: list[int], fifo: bool, groups: int, offset: int):
+    entries: list[dict[str, Any]] = []
+    total = 0
+
+    def _flush():
+        nonlocal entries, total
+        if entries:
+            sqs.send_message_batch(QueueUrl=url, Entries=entries)
+        entries, total = [], 0
+
+    for i, size in enumerate(sizes, offset):
+        body = json.dumps({"t": time(), "pad": "x" * size})
+        if len(entries) == 10 or total + len(body) > _FILL_BATCH_BYTES:
+            _flush()
+        entry = {"Id": str(len(entries)), "MessageBody": body}
+        if fifo:
+            entry["MessageGroupId"] = f"group-{i % groups}"
+            entry["MessageDeduplicationId"] = f"{i}-{uuid.uuid4().hex}"
+        entries.append(entry)
+        total += len(body)
+    _flush()
+
+
+def _produce(
+    sqs, url: str, sizes: list[int], fifo: bool, groups: int, rate: float, done: Event
+) -> None:
+    # rate件/秒になるよう10件ずつ送信する
+    started_at = perf_counter()
+    try:
+        for i in range(0, len(sizes), 10):
+            wait = started_at + i / rate - perf_counter()
+            if wait > 0:
+                sleep(wait)
+            _send(sqs, url, sizes[i : i + 10], fifo, groups, i)
+    finally:
+        done.set()
+
+
+def _remaining(sqs, url: str) -> int:
+    attr = sqs.get_queue_attributes(
+        QueueUrl=url,
+        AttributeNames=[
+            "ApproximateNumberOfMessages",
+            "ApproximateNumberOfMessagesNotVisible",
+        ],
+    )["Attributes"]
+    return int(attr["ApproximateNumberOfMessages"]) + int(
+        attr["ApproximateNumberOfMessagesNotVisible"]
+    )
+
+
+async def _drained(sqs, url: str, produced: Event, timeout: float) -> None:
+    deadline = perf_counter() + timeout
+    while perf_counter() < deadline:
+        if produced.is_set() and _remaining(sqs, url) == 0:
+            return
+        await asyncio.sleep(0.05)
+    raise TimeoutError(f"Messages were not processed within {timeout} seconds.")
+
+
+def _join_threads(url: str, timeout: float = 30.0) -> None:
+    # 次の設定でevをクリアする前に、受信ループと振り分けのスレッドを終了させる
+    for thread in threading.enumerate():
+        if thread.name.endswith(url):
+            thread.join(timeout)
+
+
+def _cpu_seconds() -> float:
+    if resource is None:
+        return 0.0
+    total = 0.0
+    for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN):
+        usage = resource.getrusage(who)
+        total += usage.ru_utime + usage.ru_stime
+    return total
+
+
+def _max_rss_mb() -> float:
+    if resource is None:
+        return 0.0
+    # Linuxではキロバイト、macOSではバイト
+    scale = 1 if sys.platform == "darwin" else 1024
+    return (
+        max(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+        )
+        * scale
+        / 1024
+        / 1024
+    )
+
+
+def _percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def _collect(directory: str) -> tuple[list[float], Counter[str]]:
+    latencies = list(_sink.latencies)
+    calls = Counter(_sink.calls)
+    for name in os.listdir(directory):
+        with open(os.path.join(directory, name)) as f:
+            data = json.load(f)
+        latencies.extend(data["latencies"])
+        calls.update(data["calls"])
+    return latencies, calls
+
+
+def run_scenario(
+    scenario: Scenario,
+    aws_profile: dict[str, Any],
+    *,
+    messages: int = 1000,
+    mix: dict[int, int] = DEFAULT_MIX,
+    rate: float = 0.0,
+    groups: int = 10,
+    handler_seconds: float = 0.0,
+    continuous: bool = True,
+    timeout: float = 600.0,
+) -> Report:
+    """
+    1つの設定でキューを作成してメッセージを投入し、全て処理されるまでの計測値を返す
+    rateが0の場合は事前に全件を投入し、それ以外は処理と並行してrate件/秒で投入する
+
+    Create a queue, fill it and run the engine with one configuration until
+    every message has been deleted. With ``rate`` 0 the queue is filled
+    first; otherwise messages are produced at ``rate`` per second while the
+    engine runs, which makes the end-to-end latency meaningful.
+    """
+    # 計測対象のクライアントとは別のクライアントで投入・監視する
+    transport: Transport | None = aws_profile.get(TRANSPORT)
+    if transport is None:
+        sqs = boto3.session.Session().client("sqs", **aws_profile)
+    else:
+        sqs = transport
+        aws_profile = {TRANSPORT: _CountedTransport(transport)}
+    name = f"bench-{uuid.uuid4().hex[:12]}"
+    attributes = {"VisibilityTimeout": "30"}
+    if scenario.fifo:
+        name += ".fifo"
+        attributes["FifoQueue"] = "true"
+    url = sqs.create_queue(QueueName=name, Attributes=attributes)["QueueUrl"]
+    sizes = _sizes(messages, mix)
+    produced = Event()
+    if rate <= 0:
+        _send(sqs, url, sizes, scenario.fifo, groups, 0)
+        produced.set()
+
+    p = get_handler(f"{__name__}.{HANDLER_NAME}")
+    p.update(
+        queue_url=url,
+        aws_profile=aws_profile,
+        max_workers=scenario.max_workers,
+        max_number_of_messages=scenario.max_number_of_messages,
+        process_worker=scenario.process_worker,
+        continuous=continuous,
+        interval_seconds=0.1,
+        wait_time_seconds=1,
+        visibility_timeout=30,
+    )
+    _sink.reset()
+    if transport is None:
+        _count_calls(get_client(aws_profile, _pool_size(p)))
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ[ENV_DIR] = directory
+        os.environ[ENV_HANDLER_SECONDS] = str(handler_seconds)
+        ev.clear()
+        cpu = _cpu_seconds()
+        started_at = perf_counter()
+        executor = _handler(p)
+        if rate > 0:
+            Thread(
+                target=_produce,
+                args=(sqs, url, sizes, scenario.fifo, groups, rate, produced),
+                daemon=True,
+            ).start()
+        try:
+            loop.run_until_complete(_drained(sqs, url, produced, timeout))
+            seconds = perf_counter() - started_at
+        finally:
+            ev.set()
+            executor.shutdown(wait=True)  # type: ignore
+            _stop_lease_managers()
+            _close_ack_buffers()
+            _join_threads(url)
+            loop.close()
+            del os.environ[ENV_DIR]
+        cpu = _cpu_seconds() - cpu
+        latencies, calls = _collect(directory)
+    sqs.delete_queue(QueueUrl=url)
+    return {
+        "scenario": scenario.name,
+        "messages": messages,
+        "seconds": seconds,
+        "messages_per_second": messages / seconds,
+        "latency_p50_ms": _percentile(latencies, 0.50) * 1000,
+        "latency_p99_ms": _percentile(latencies, 0.99) * 1000,
+        "api_calls_per_message": sum(calls.values()) / messages,
+        "api_calls": dict(calls),
+        "cpu_seconds": cpu,
+        "max_rss_mb": _max_rss_mb(),
+    }
+
+
+def scenarios(
+    workers: list[int],
+    max_messages: list[int],
+    process_worker: list[bool],
+    fifo: list[bool],
+) -> list[Scenario]:
+    return [
+        Scenario(w, m, pw, f)
+        for f, pw, w, m in product(fifo, process_worker, workers, max_messages)
+    ]
+
+
+def format_table(reports: list[Report]) -> str:
+    header = (
+        f"{'scenario':<48} {'msg/s':>9} {'p50 ms':>9} {'p99 ms':>9} "
+        f"{'calls/msg':>9} {'cpu s':>7} {'rss MB':>7}"
+    )
+    lines = [header, "-" * len(header)]
+    for r in reports:
+        lines.append(
+            f"{r['scenario']:<48} {r['messages_per_second']:>9.1f} "
+            f"{r['latency_p50_ms']:>9.1f} {r['latency_p99_ms']:>9.1f} "
+            f"{r['api_calls_per_message']:>9.3f} {r['cpu_seconds']:>7.2f} "
+            f"{r['max_rss_mb']:>7.1f}"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,139 @@
+import json
+import sys
+from typing import Any
+
+__all__ = ("main",)
+
+
+def _ints(value: str) -> list[int]:
+    return [int(v) for v in value.split(",")]
+
+
+def main():
+    import argparse
+
+    from sqs_polling.bench import (
+        DEFAULT_MIX,
+        MotoServer,
+        format_table,
+        parse_mix,
+        run_scenario,
+        scenarios,
+    )
+
+    parser = argparse.ArgumentParser(description="SQS polling benchmark")
+    parser.add_argument(
+        "--backend",
+        choices=("moto", "memory"),
+        help="moto server, or the in-process MemoryTransport",
+        default="moto",
+    )
+    parser.add_argument(
+        "--endpoint-url",
+        type=str,
+        help="use a running SQS compatible server instead of starting moto",
+    )
+    parser.add_argument("--messages", type=int, help="messages per run", default=1000)
+    parser.add_argument(
+        "--mix",
+        type=parse_mix,
+        help="body sizes and weights, e.g. 256:70,4096:25,65536:5",
+        default=DEFAULT_MIX,
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        help="produce messages per second while polling (0: fill the queue first)",
+        default=0.0,
+    )
+    parser.add_argument("--workers", type=_ints, help="max_workers", default=[1, 8])
+    parser.add_argument(
+        "--max-messages", type=_ints, help="max_number_of_messages", default=[1, 10]
+    )
+    parser.add_argument(
+        "--modes",
+        type=str,
+        help="worker modes: thread,process",
+        default="thread",
+    )
+    parser.add_argument(
+        "--queue-types",
+        type=str,
+        help="queue types: standard,fifo",
+        default="standard",
+    )
+    parser.add_argument(
+        "--groups", type=int, help="message groups of FIFO queues", default=10
+    )
+    parser.add_argument(
+        "--handler-seconds", type=float, help="time spent in the handler", default=0.0
+    )
+    parser.add_argument(
+        "--no-continuous",
+        action="store_true",
+        help="poll with the interval loop instead of continuous receivers",
+    )
+    parser.add_argument("--timeout", type=float, help="timeout per run", default=600)
+    parser.add_argument("--json", action="store_true", help="print JSON lines")
+    args = parser.parse_args()
+
+    modes = args.modes.split(",")
+    queue_types = args.queue_types.split(",")
+    if not set(modes) <= {"thread", "process"}:
+        parser.error("--modes must be thread and/or process")
+    if not set(queue_types) <= {"standard", "fifo"}:
+        parser.error("--queue-types must be standard and/or fifo")
+    if args.backend == "memory" and "process" in modes:
+        parser.error("--backend memory can not be used with process workers")
+
+    server = None
+    if args.backend == "memory":
+        from sqs_polling.memory import MemoryTransport
+
+        aws_profile: dict[str, Any] = {"transport": MemoryTransport()}
+    else:
+        endpoint_url = args.endpoint_url
+        if endpoint_url is None:
+            server = MotoServer()
+            server.start()
+            endpoint_url = server.endpoint_url
+        aws_profile = {
+            "endpoint_url": endpoint_url,
+            "region_name": "us-east-1",
+            "aws_access_key_id": "bench",
+            "aws_secret_access_key": "bench",
+        }
+    reports = []
+    try:
+        for scenario in scenarios(
+            args.workers,
+            args.max_messages,
+            [mode == "process" for mode in modes],
+            [kind == "fifo" for kind in queue_types],
+        ):
+            report = run_scenario(
+                scenario,
+                aws_profile,
+                messages=args.messages,
+                mix=args.mix,
+                rate=args.rate,
+                groups=args.groups,
+                handler_seconds=args.handler_seconds,
+                continuous=not args.no_continuous,
+                timeout=args.timeout,
+            )
+            if args.json:
+                print(json.dumps(report), flush=True)
+            else:
+                print(f"{scenario.name}: {report['messages_per_second']:.1f} msg/s")
+            reports.append(report)
+    finally:
+        if server is not None:
+            server.stop()
+    if not args.json:
+        print(format_table(reports))
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+from __future__ import annotations
+
+from collections import deque
+from threading import Condition
+from time import monotonic
+from typing import TYPE_CHECKING, TypedDict
+
+if TYPE_CHECKING:
+    from mypy_boto3_sqs.type_defs import MessageTypeDef
+
+
+class BufferStats(TypedDict):
+    capacity: int
+    waiting: int
+    in_flight: int
+    reserved: int
+    bytes: int
+
+
+def _group_id(message: MessageTypeDef) -> str | None:
+    return message.get("Attributes", {}).get("MessageGroupId")
+
+
+def _message_size(message: MessageTypeDef) -> int:
+    # 本文の文字数で近似する(ASCIIのJSONであればバイト数と一致する)
+    return len(message.get("Body", ""))
+
+
+class PrefetchBuffer:
+    """
+    受信したメッセージを処理が終わるまで保持する有界バッファ
+    満杯の間は受信を止め、空き枠の数だけ受信させる
+
+    Bounded buffer between receiving and executing. A message occupies a slot
+    from the receive until ``task_done``; receivers only ask for free slots.
+    """
+
+    def __init__(self, capacity: int, max_bytes: int = 0) -> None:
+        if capacity < 1:
+            raise ValueError("capacity must be greater than or equal to 1.")
+        self.capacity = capacity
+        self.max_bytes = max_bytes
+        self._waiting: deque[MessageTypeDef] = deque()
+        self.__in_flight = 0
+        self.__reserved = 0
+        self.__bytes = 0
+        # 処理待ちのメッセージのバイト数
+        self.__waiting_bytes = 0
+        self.__closed = False
+        self._cond = Condition()
+
+    def __free(self) -> int:
+        if self.max_bytes > 0 and self.__bytes >= self.max_bytes:
+            return 0
+        return self.capacity - self._held() - self.__reserved
+
+    def resize(self, capacity: int) -> None:
+        with self._cond:
+            self.capacity = max(capacity, 1)
+            self._cond.notify_all()
+
+    def reserve(self, max_number: int, timeout: float | None = None) -> int:
+        """
+        空き枠ができるまで待機し、最大max_number件の枠を確保する
+        Block until there is room and reserve up to ``max_number`` slots.
+        Returns 0 on timeout or when the buffer is closed.
+        """
+        with self._cond:
+            if not self._cond.wait_for(
+                lambda: self.__closed or self.__free() > 0, timeout
+            ):
+                return 0
+            if self.__closed:
+                return 0
+            n = min(self.__free(), max_number)
+            self.__reserved += n
+            return n
+
+    def put(self, messages: list[MessageTypeDef], reserved: int) -> None:
+        with self._cond:
+            self.__reserved -= reserved
+            for message in messages:
+                self._append(message)
+                size = _message_size(message)
+                self.__bytes += size
+                self.__waiting_bytes += size
+            self._cond.notify_all()
+
+    def get(self, timeout: float | None = None) -> MessageTypeDef | None:
+        with self._cond:
+            if not self._cond.wait_for(lambda: self.__closed or self._ready(), timeout):
+                return None
+            if self.__closed:
+                return None
+            self.__in_flight += 1
+            message = self._pop()
+            self.__waiting_bytes -= _message_size(message)
+            return message
+
+    def get_many(
+        self,
+        max_number: int,
+        timeout: float | None = None,
+        *,
+        max_bytes: int = 0,
+        window_seconds: float = 0.0,
+    ) -> list[MessageTypeDef]:
+        """
+        取り出せるメッセージを最大max_number件まとめて取り出す
+        window_secondsを指定した場合、最初のメッセージから件数かバイト数の上限に
+        達するか時間が経過するまで、後続の受信分を待ってまとめる
+
+        Take up to ``max_number`` ready messages at once. With
+        ``window_seconds`` the first message waits for later receives until
+        ``max_number`` messages or ``max_bytes`` bytes are waiting, or the
+        window has passed.
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self.__closed or self._ready(), timeout):
+                return []
+            deadline = monotonic() + window_seconds
+            while not self.__closed and not self.__full(max_number, max_bytes):
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            if self.__closed:
+                return []
+            messages: list[MessageTypeDef] = []
+            size = 0
+            while self._ready() and len(messages) < max_number:
+                message = self._pop()
+                messages.append(message)
+                size += _message_size(message)
+                if max_bytes > 0 and size >= max_bytes:
+                    break
+            self.__in_flight += len(messages)
+            self.__waiting_bytes -= size
+            return messages
+
+    def __full(self, max_number: int, max_bytes: int) -> bool:
+        if max_bytes > 0 and self.__waiting_bytes >= max_bytes:
+            return True
+        return self._count() >= max_number
+
+    def task_done(self, message: MessageTypeDef) -> None:
+        with self._cond:
+            self.__in_flight -= 1
+            self.__bytes -= _message_size(message)
+            self._done(message)
+            self._cond.notify_all()
+
+    def discard(self, messages: list[MessageTypeDef]) -> None:
+        # 処理せずにバッファから取り除いたメッセージの分を解放する
+        with self._cond:
+            for message in messages:
+                size = _message_size(message)
+                self.__bytes -= size
+                self.__waiting_bytes -= size
+            self._cond.notify_all()
+
+    def close(self) -> list[MessageTypeDef]:
+        """
+        受信・取り出しを止め、未処理のメッセージを返す
+        Stop the buffer and return the messages that were never started
+        """
+        with self._cond:
+            self.__closed = True
+            messages = self._drain()
+            for message in messages:
+                size = _message_size(message)
+                self.__bytes -= size
+                self.__waiting_bytes -= size
+            self._cond.notify_all()
+            return messages
+
+    def _count(self) -> int:
+        return len(self._waiting)
+
+    def _held(self) -> int:
+        # 枠を使っている数(待機中と処理中のメッセージ)
+        return self._count() + self.__in_flight
+
+    def _ready(self) -> bool:
+        return len(self._waiting) > 0
+
+    def _append(self, message: MessageTypeDef) -> None:
+        self._waiting.append(message)
+
+    def _pop(self) -> MessageTypeDef:
+        return self._waiting.popleft()
+
+    def _done(self, message: MessageTypeDef) -> None:
+        pass
+
+    def _drain(self) -> list[MessageTypeDef]:
+        messages = list(self._waiting)
+        self._waiting.clear()
+        return messages
+
+    def stats(self) -> BufferStats:
+        with self._cond:
+            return {
+                "capacity": self.capacity,
+                "waiting": self._count(),
+                "in_flight": self.__in_flight,
+                "reserved": self.__reserved,
+                "bytes": self.__bytes,
+            }
+
+
+class FifoBuffer(PrefetchBuffer):
+    """
+    FIFOキュー用のバッファ
+    メッセージグループごとにキューを持ち、同じグループは1件ずつ順番に、
+    異なるグループは並行に取り出す
+
+    枠はメッセージではなくグループ単位で使うため、遅いグループの待機分が他のグループの受信を妨げない
+
+    Buffer for FIFO queues. Each MessageGroupId has its own queue: a group
+    hands out one message at a time in order, while different groups are
+    handed out in parallel. Slots are held per group rather than per
+    message, so the waiting messages of a slow group never keep the other
+    groups from being received.
+    """
+
+    def __init__(self, capacity: int, max_bytes: int = 0) -> None:
+        super().__init__(capacity, max_bytes)
+        self.__groups: dict[str | None, deque[MessageTypeDef]] = {}
+        # 待機中のメッセージがあり、処理中のメッセージがないグループ
+        self.__ready: deque[str | None] = deque()
+        self.__active: set[str | None] = set()
+        self.__count = 0
+
+    def _count(self) -> int:
+        return self.__count
+
+    def _held(self) -> int:
+        # 待機中または処理中のメッセージがあるグループの数
+        return len(self.__active.union(self.__groups))
+
+    def _ready(self) -> bool:
+        return len(self.__ready) > 0
+
+    def _append(self, message: MessageTypeDef) -> None:
+        group_id = _group_id(message)
+        group = self.__groups.get(group_id)
+        if group is None:
+            group = self.__groups[group_id] = deque()
+            if group_id not in self.__active:
+                self.__ready.append(group_id)
+        group.append(message)
+        self.__count += 1
+
+    def _pop(self) -> MessageTypeDef:
+        group_id = self.__ready.popleft()
+        group = self.__groups[group_id]
+        message = group.popleft()
+        if not group:
+            del self.__groups[group_id]
+        self.__active.add(group_id)
+        self.__count -= 1
+        return message
+
+    def _done(self, message: MessageTypeDef) -> None:
+        group_id = _group_id(message)
+        self.__active.discard(group_id)
+        if group_id in self.__groups:
+            self.__ready.append(group_id)
+
+    def _drain(self) -> list[MessageTypeDef]:
+        messages = [m for group in self.__groups.values() for m in group]
+        self.__groups.clear()
+        self.__ready.clear()
+        self.__count = 0
+        return messages
+
+    def drop_group(self, group_id: str | None) -> list[MessageTypeDef]:
+        """
+        グループの待機中のメッセージを取り除いて返す
+        前のメッセージを再処理する場合、後続を先に処理すると順序が崩れるため
+
+        Remove and return the waiting messages of a group, so they are not
+        handled ahead of a message that is going to be retried
+        """
+        with self._cond:
+            group = self.__groups.pop(group_id, None)
+            messages = list(group) if group else []
+            if group_id in self.__ready:
+                self.__ready.remove(group_id)
+            self.__count -= len(messages)
+        self.discard(messages)
+        return messages
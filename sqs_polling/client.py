@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import json
+import os
+from threading import Lock
+from typing import TYPE_CHECKING, Any
+
+import boto3
+from botocore.config import Config
+
+from .transport import TRANSPORT
+
+if TYPE_CHECKING:
+    from mypy_boto3_sqs import SQSClient
+
+# botocoreのデフォルトの接続プールサイズ
+DEFAULT_MAX_POOL_CONNECTIONS = 10
+
+_clients: dict[str, tuple[Any, int]] = {}
+_lock = Lock()
+
+
+def _client_key(aws_profile: dict[str, Any], service: str) -> str:
+    # endpoint_urlなどもプロファイルに含まれるため、プロファイル全体をキーにする
+    return service + json.dumps(aws_profile, sort_keys=True, default=repr)
+
+
+def get_client(
+    aws_profile: dict[str, Any],
+    max_pool_connections: int = DEFAULT_MAX_POOL_CONNECTIONS,
+    service: str = "sqs",
+) -> SQSClient:
+    """
+    プロファイルごとにSQSクライアントを作成して共有する
+    より大きな接続プールが必要になった場合は作り直す
+
+    Return the SQS client shared by every queue using ``aws_profile``.
+    A client with a larger connection pool replaces it when one is needed.
+    Other services (``s3`` for offloaded payloads) share the same registry.
+    A transport given as ``aws_profile["transport"]`` is returned for SQS.
+    """
+    if service == "sqs" and (transport := aws_profile.get(TRANSPORT)) is not None:
+        return transport
+    key = _client_key(aws_profile, service)
+    entry = _clients.get(key)
+    if entry is not None and entry[1] >= max_pool_connections:
+        return entry[0]
+    with _lock:
+        entry = _clients.get(key)
+        if entry is not None and entry[1] >= max_pool_connections:
+            return entry[0]
+        pool_size = max(
+            max_pool_connections,
+            entry[1] if entry is not None else DEFAULT_MAX_POOL_CONNECTIONS,
+        )
+        profile = dict(aws_profile)
+        profile.pop(TRANSPORT, None)
+        config = Config(max_pool_connections=pool_size)
+        if (user_config := profile.pop("config", None)) is not None:
+            config = user_config.merge(config)
+        # boto3.clientはデフォルトセッションを共有しスレッドセーフではないため、セッションを分ける
+        client = boto3.session.Session().client(service, config=config, **profile)
+        _clients[key] = (client, pool_size)
+        return client
+
+
+def reset_clients() -> None:
+    """
+    fork先では親プロセスの接続を使わずに作り直す
+    Drop the clients inherited from the parent process after a fork
+    """
+    global _lock
+    _clients.clear()
+    _lock = Lock()
+
+
+os.register_at_fork(after_in_child=reset_clients)
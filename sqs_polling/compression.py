@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import base64
+import gzip
+from typing import Any, Callable, Mapping
+
+# 圧縮形式を指定するメッセージ属性の一般的な名前(compression_attributeに指定して有効にする)
+CONTENT_ENCODING = "ContentEncoding"
+GZIP = "gzip"
+ZSTD = "zstd"
+LZ4 = "lz4"
+# 圧縮されていないことを表す形式
+IDENTITY = "identity"
+
+
+def _zstd() -> tuple[Callable[[bytes], bytes], Callable[[bytes], bytes]]:
+    try:
+        from compression import zstd  # type: ignore
+
+        return zstd.compress, zstd.decompress
+    except ImportError:
+        pass
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError("zstandard is required to handle zstd bodies.") from None
+
+    def _decompress(data: bytes) -> bytes:
+        # フレームに元のサイズが含まれない場合もあるためストリームで展開する
+        return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+
+    return zstandard.ZstdCompressor().compress, _decompress
+
+
+def _lz4() -> tuple[Callable[[bytes], bytes], Callable[[bytes], bytes]]:
+    try:
+        import lz4.frame
+    except ImportError:
+        raise ImportError("lz4 is required to handle lz4 bodies.") from None
+    return lz4.frame.compress, lz4.frame.decompress
+
+
+def _codec(encoding: str) -> tuple[Callable[[bytes], bytes], Callable[[bytes], bytes]]:
+    match encoding.lower():
+        case "gzip":
+            return gzip.compress, gzip.decompress
+        case "zstd":
+            return _zstd()
+        case "lz4":
+            return _lz4()
+        case _:
+            raise ValueError(f"Unsupported content encoding: {encoding}")
+
+
+def decompress_body(body: str | bytes, encoding: str) -> bytes:
+    """
+    base64で送られた圧縮済みの本文を展開する
+    形式はメッセージ属性で指定されるため、base64かどうかを推測しない
+
+    Decompress a base64-encoded compressed body. The encoding comes from a
+    message attribute, so nothing is guessed from the payload itself.
+    """
+    _, decompress = _codec(encoding)
+    return decompress(base64.b64decode(body))
+
+
+def compress_body(data: bytes, encoding: str = GZIP) -> str:
+    """
+    送信側で使う: 本文を圧縮してSQSで送れるbase64の文字列にする
+    For producers: compress a body into a base64 string that SQS accepts
+    """
+    compress, _ = _codec(encoding)
+    return base64.b64encode(compress(data)).decode("ascii")
+
+
+def content_encoding(attributes: Mapping[str, Any] | None, name: str) -> str | None:
+    """
+    メッセージ属性から圧縮形式を取り出す(大文字・小文字は区別しない)
+    属性が無い場合とidentityの場合はNoneを返し、本文はそのまま扱う
+
+    The compression format named by the ``name`` message attribute, in lower
+    case. None when the attribute is missing or says ``identity``.
+    """
+    if not name or not attributes:
+        return None
+    value = attributes.get(name)
+    if not isinstance(value, str):
+        return None
+    encoding = value.strip().lower()
+    return None if encoding in ("", IDENTITY) else encoding
@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+import base64
+import json
+from collections.abc import Iterator, Mapping
+from time import time
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from mypy_boto3_sqs.type_defs import MessageAttributeValueTypeDef, MessageTypeDef
+
+    from .handler import Polling
+    from .payload import S3Payload
+
+# 受信時刻(UNIX時間)を保持するメッセージのキー
+RECEIVED_AT = "ReceivedAt"
+
+
+def stamp_received_at(messages: list[MessageTypeDef]) -> list[MessageTypeDef]:
+    received_at = time()
+    for message in messages:
+        message[RECEIVED_AT] = received_at  # type: ignore
+    return messages
+
+
+class MessageContext:
+    """
+    メッセージごとの情報を保持し、ハンドラーの第1引数として渡される
+    未定義の属性はPollingの値を返すため、従来通りPollingとしても扱える
+
+    Per-message state passed to the handler as its first argument. Unknown
+    attributes are read from the shared ``Polling``, which is never written
+    to while messages are processed.
+    """
+
+    __slots__ = (
+        "polling",
+        "message_id",
+        "retry",
+        "receipt_handle",
+        "attributes",
+        "message_attributes",
+        "message_group_id",
+        "message_deduplication_id",
+        "received_at",
+        "envelope",
+        "payload",
+    )
+
+    def __init__(
+        self,
+        polling: Polling,
+        *,
+        message_id: str = "",
+        retry: int = 0,
+        receipt_handle: str = "",
+        attributes: dict[str, str] | None = None,
+        message_attributes: Mapping[str, Any] | None = None,
+        message_group_id: str | None = None,
+        message_deduplication_id: str | None = None,
+        received_at: float = 0.0,
+        envelope: dict[str, Any] | None = None,
+    ) -> None:
+        self.polling = polling
+        self.message_id = message_id
+        self.retry = retry
+        self.receipt_handle = receipt_handle
+        self.attributes = attributes or {}
+        self.message_attributes = message_attributes
+        self.message_group_id = message_group_id
+        self.message_deduplication_id = message_deduplication_id
+        self.received_at = received_at
+        # SNS・EventBridgeの外側のメッセージ
+        self.envelope = envelope
+        # S3に退避された本文
+        self.payload: S3Payload | None = None
+
+    @classmethod
+    def from_message(cls, polling: Polling, message: MessageTypeDef) -> MessageContext:
+        attribute = message.get("Attributes", {})
+        message_attribute: MessageAttributes | None = None
+        if _message_attribute := message.get("MessageAttributes"):
+            message_attribute = MessageAttributes(_message_attribute)
+        return cls(
+            polling,
+            message_id=message.get("MessageId", ""),
+            # 最初の受信分をマイナスする
+            retry=int(attribute.get("ApproximateReceiveCount", 1)) - 1,
+            receipt_handle=message.get("ReceiptHandle", ""),
+            attributes=attribute,  # type: ignore
+            message_attributes=message_attribute,
+            message_group_id=attribute.get("MessageGroupId", None),
+            message_deduplication_id=attribute.get("MessageDeduplicationId", None),
+            received_at=message.get(RECEIVED_AT, 0.0),  # type: ignore
+        )
+
+    def is_max_retry(self) -> bool:
+        return self.polling.is_max_retry(self.retry)
+
+    def __getattr__(self, name: str) -> Any:
+        if name == "polling":
+            raise AttributeError(name)
+        return getattr(self.polling, name)
+
+
+class MessageAttributes(Mapping[str, Any]):
+    """
+    メッセージ属性の値を参照された時に変換して返す読み取り専用のdict
+    SNSのエンベロープの属性はSQSの属性に上書きで統合される
+
+    Read-only mapping of message attribute values, converted only when a key
+    is read. Attributes from an SNS envelope are merged over the SQS ones.
+    """
+
+    __slots__ = ("__sqs", "__sns", "__values")
+
+    def __init__(
+        self,
+        sqs: Mapping[str, MessageAttributeValueTypeDef],
+        sns: Mapping[str, dict[str, str]] | None = None,
+    ) -> None:
+        self.__sqs = sqs
+        self.__sns = sns or {}
+        self.__values: dict[str, Any] = {}
+
+    def merge(self, sns: Mapping[str, dict[str, str]]) -> MessageAttributes:
+        return MessageAttributes(self.__sqs, sns)
+
+    def __getitem__(self, key: str) -> Any:
+        if key in self.__values:
+            return self.__values[key]
+        if key in self.__sns:
+            value = _get_sns_attribute_value(self.__sns[key])
+        else:
+            value = _get_message_attribute_value(self.__sqs[key])
+        self.__values[key] = value
+        return value
+
+    def __iter__(self) -> Iterator[str]:
+        yield from self.__sqs
+        for key in self.__sns:
+            if key not in self.__sqs:
+                yield key
+
+    def __len__(self) -> int:
+        return len(self.__sqs) + sum(1 for key in self.__sns if key not in self.__sqs)
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
+
+class BatchMessage(MessageContext):
+    """
+    バッチハンドラーに渡す1件分のメッセージ
+    MessageContextの値に加えてデコード済みの本文を持つ
+
+    One message of a batch handler call: its ``MessageContext`` plus the
+    decoded body.
+    """
+
+    __slots__ = ("body",)
+
+    def __init__(self, polling: Polling, **kwargs: Any) -> None:
+        super().__init__(polling, **kwargs)
+        self.body: Any = None
+
+
+def _get_message_attribute_value(
+    value: MessageAttributeValueTypeDef,
+) -> str | bytes | list[str] | list[bytes] | None:
+    """
+    StringValue
+    BinaryValue
+    StringListValues
+    BinaryListValues
+    """
+    return value.get(
+        "StringValue",
+        value.get(
+            "BinaryValue",
+            value.get("StringListValues", value.get("BinaryListValues", None)),
+        ),
+    )
+
+
+def _get_sns_attribute_value(value: Mapping[str, str]) -> Any:
+    """
+    String / Number / Binary(base64) / String.Array(JSON)
+    """
+    match value.get("Type"):
+        case "Binary":
+            return base64.b64decode(value.get("Value", ""))
+        case "String.Array":
+            return json.loads(value.get("Value", "[]"))
+        case _:
+            return value.get("Value")
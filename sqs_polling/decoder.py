@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import json
+from dataclasses import fields, is_dataclass
+from mmap import mmap
+from typing import Any, Callable, Literal, TypeVar, overload
+
+from .utils import ENVELOPE_MARKER, object_hook
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None  # type: ignore
+
+try:
+    import msgspec
+except ImportError:  # pragma: no cover
+    msgspec = None  # type: ignore
+
+T = TypeVar("T")
+TBackend = Literal["auto", "msgspec", "orjson", "json"]
+
+
+def available_backend() -> str:
+    """
+    インストールされている中で最も速いJSONライブラリ
+    The fastest JSON library that is installed
+    """
+    if msgspec is not None:
+        return "msgspec"
+    if orjson is not None:
+        return "orjson"
+    return "json"
+
+
+def _restore(o: Any) -> Any:
+    # object_hookを持たないライブラリ向けに、デコード後に内側から__type__を復元する
+    if isinstance(o, dict):
+        return object_hook({k: _restore(v) for k, v in o.items()})
+    if isinstance(o, list):
+        return [_restore(v) for v in o]
+    return o
+
+
+_ENVELOPE_MARKER_BYTES = ENVELOPE_MARKER.encode()
+
+# 本文はstr・bytesのほか、大きなペイロードの場合はmmapで渡される
+TBody = str | bytes | mmap
+
+
+def _has_envelope(s: TBody) -> bool:
+    if isinstance(s, str):
+        return ENVELOPE_MARKER in s
+    # mmapのinは1バイトしか検索できないためfindを使う
+    return s.find(_ENVELOPE_MARKER_BYTES) != -1
+
+
+def _json_input(s: TBody) -> str | bytes:
+    # 標準のjsonはmmapを読めないためコピーする
+    return s[:] if isinstance(s, mmap) else s
+
+
+def _orjson_input(s: TBody) -> str | bytes | memoryview:
+    return memoryview(s) if isinstance(s, mmap) else s
+
+
+def _raw_loads(backend: str) -> Callable[[TBody], Any]:
+    if backend == "msgspec":
+        if msgspec is None:
+            raise ImportError("msgspec is not installed.")
+        return msgspec.json.Decoder().decode
+    if backend == "orjson":
+        if orjson is None:
+            raise ImportError("orjson is not installed.")
+        return lambda s: orjson.loads(_orjson_input(s))
+    return lambda s: json.loads(_json_input(s))
+
+
+def _convert(data: Any, type_: type[T]) -> T:
+    if msgspec is not None:
+        return msgspec.convert(data, type_)
+    if is_dataclass(type_) and isinstance(data, dict):
+        names = {f.name for f in fields(type_)}
+        return type_(**{k: v for k, v in data.items() if k in names})  # type: ignore
+    return type_(**data) if isinstance(data, dict) else type_(data)  # type: ignore
+
+
+@overload
+def json_decoder(
+    type_: None = None, *, backend: TBackend = "auto"
+) -> Callable[[TBody], Any]:
+    ...
+
+
+@overload
+def json_decoder(type_: type[T], *, backend: TBackend = "auto") -> Callable[[TBody], T]:
+    ...
+
+
+def json_decoder(type_=None, *, backend="auto"):
+    """
+    pollingのdecoderに渡すJSONデコーダーを作成する
+    msgspec・orjsonがインストールされていれば使い、本文に``__type__``が
+    含まれる場合のみobject_hookによる変換を行う
+    type_を指定した場合はdataclassやmsgspec.Structなどに直接デコードする
+
+    Build a JSON decoder for ``@polling(decoder=...)``. msgspec or orjson is
+    used when installed, and the ``__type__``/``__value__`` envelope is only
+    walked when the body contains it. With ``type_`` the body is decoded
+    straight into that dataclass, ``msgspec.Struct`` or other type.
+    """
+    if backend == "auto":
+        backend = available_backend()
+    raw_loads = _raw_loads(backend)
+
+    def _loads(s: TBody) -> Any:
+        if not _has_envelope(s):
+            return raw_loads(s)
+        if backend == "json":
+            return json.loads(_json_input(s), object_hook=object_hook)
+        return _restore(raw_loads(s))
+
+    if type_ is None:
+        return _loads
+
+    if backend == "msgspec":
+        typed_loads = msgspec.json.Decoder(type_).decode
+
+        def _decode_msgspec(s: TBody) -> Any:
+            if _has_envelope(s):
+                return _convert(_loads(s), type_)
+            return typed_loads(s)
+
+        return _decode_msgspec
+
+    def _decode(s: TBody) -> Any:
+        return _convert(_loads(s), type_)
+
+    return _decode
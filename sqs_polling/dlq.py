@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone
+from logging import getLogger
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from mypy_boto3_sqs.type_defs import MessageTypeDef
+
+logger = getLogger(__name__)
+
+# SQSのメッセージ属性は1メッセージあたり最大10個
+MAX_MESSAGE_ATTRIBUTES = 10
+# SendMessageBatchの1リクエストあたりの合計サイズ
+MAX_BATCH_BYTES = 256 * 1024
+# 失敗理由の属性に入れる最大文字数
+MAX_ERROR_LENGTH = 1024
+
+# DLQへ転送する際に付与する失敗情報の属性(優先度順)
+ERROR = "DeadLetter.Error"
+RETRY_COUNT = "DeadLetter.RetryCount"
+SOURCE_MESSAGE_ID = "DeadLetter.SourceMessageId"
+SOURCE_QUEUE = "DeadLetter.SourceQueue"
+FAILED_AT = "DeadLetter.FailedAt"
+
+_ATTRIBUTE_KEYS = ("DataType", "StringValue", "BinaryValue")
+
+
+def _string(value: str, data_type: str = "String") -> dict[str, Any]:
+    return {"DataType": data_type, "StringValue": value}
+
+
+def _failure_attributes(
+    message: MessageTypeDef, source_queue_url: str, error: str
+) -> dict[str, Any]:
+    attribute = message.get("Attributes", {})
+    retry = int(attribute.get("ApproximateReceiveCount", 1)) - 1
+    # 空文字は属性値に設定できない
+    error = (error or "RejectDLQException")[:MAX_ERROR_LENGTH]
+    failure = {
+        ERROR: _string(error),
+        RETRY_COUNT: _string(str(retry), "Number"),
+        SOURCE_MESSAGE_ID: _string(message.get("MessageId", "")),
+        SOURCE_QUEUE: _string(source_queue_url),
+        FAILED_AT: _string(datetime.now(timezone.utc).isoformat()),
+    }
+    return {name: value for name, value in failure.items() if value["StringValue"]}
+
+
+def dlq_entry(
+    message: MessageTypeDef,
+    dead_letter_queue_url: str,
+    source_queue_url: str,
+    error: str = "",
+    trace_context: dict[str, str] | None = None,
+) -> dict[str, Any]:
+    """
+    DLQへ送るSendMessageBatchのエントリー(Idを除く)を作成する
+    本文とメッセージ属性は受信したまま転送し、空きがある分だけ
+    トレースコンテキストと失敗情報の属性を追加する
+
+    Build the SendMessageBatch entry (without ``Id``) that forwards a message
+    to its DLQ. The body and every message attribute are copied unchanged.
+    The trace context and then failure metadata are added while SQS's limit
+    of 10 attributes allows.
+    """
+    attributes = {
+        name: {k: v for k, v in value.items() if k in _ATTRIBUTE_KEYS}
+        for name, value in (message.get("MessageAttributes") or {}).items()
+    }
+    dropped = []
+    for name, value in (trace_context or {}).items():
+        # 送信側のコンテキストは転送した処理のコンテキストに置き換える
+        if name in attributes or len(attributes) < MAX_MESSAGE_ATTRIBUTES:
+            attributes[name] = _string(value)
+        else:
+            dropped.append(name)
+    for name, value in _failure_attributes(message, source_queue_url, error).items():
+        if name in attributes:
+            continue
+        if len(attributes) < MAX_MESSAGE_ATTRIBUTES:
+            attributes[name] = value
+        else:
+            dropped.append(name)
+    if dropped:
+        logger.warning(
+            "Too many message attributes to add trace context or failure metadata",
+            extra={"queue": source_queue_url, "dropped": dropped},
+        )
+    entry: dict[str, Any] = {"MessageBody": message.get("Body", "")}
+    if attributes:
+        entry["MessageAttributes"] = attributes
+    attribute = message.get("Attributes", {})
+    if value := attribute.get("MessageGroupId"):
+        entry["MessageGroupId"] = value
+    if dead_letter_queue_url.endswith(".fifo"):
+        # 再送した場合に重複して登録されないよう、元のIDで重複排除する
+        dedup_id = attribute.get("MessageDeduplicationId") or message.get("MessageId")
+        if dedup_id:
+            entry["MessageDeduplicationId"] = dedup_id
+    return entry
+
+
+def entry_bytes(entry: dict[str, Any]) -> int:
+    """
+    SQSが数えるメッセージサイズ(本文と属性の名前・型・値の合計)
+    Message size as SQS counts it: body plus attribute names, types and values
+    """
+    size = len(entry["MessageBody"].encode("utf-8"))
+    for name, value in entry.get("MessageAttributes", {}).items():
+        size += len(name.encode("utf-8")) + len(value["DataType"].encode("utf-8"))
+        if "StringValue" in value:
+            size += len(value["StringValue"].encode("utf-8"))
+        if "BinaryValue" in value:
+            size += len(value["BinaryValue"])
+    return size
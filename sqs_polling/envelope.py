@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any, Literal
+
+from .context import MessageAttributes
+from .decoder import _raw_loads, available_backend
+
+if TYPE_CHECKING:
+    from .context import MessageContext
+
+TEnvelope = Literal["sns", "eventbridge", "auto"]
+SNS: TEnvelope = "sns"
+EVENTBRIDGE: TEnvelope = "eventbridge"
+AUTO: TEnvelope = "auto"
+
+_loads = _raw_loads(available_backend())
+
+
+def _kind(envelope: Any) -> str | None:
+    if not isinstance(envelope, dict):
+        return None
+    if envelope.get("Type") == "Notification" and "Message" in envelope:
+        return SNS
+    if "detail-type" in envelope and "detail" in envelope:
+        return EVENTBRIDGE
+    return None
+
+
+def unwrap(kind: TEnvelope, body: str, ctx: MessageContext) -> Any:
+    """
+    SNS・EventBridgeのエンベロープを1度だけパースして内側のメッセージを返す
+    エンベロープはctx.envelopeに保持し、SNSのメッセージ属性はctx.message_attributesに統合する
+    SNSのMessageは文字列のまま返すためdecoderでデコードされ、
+    EventBridgeのdetailはデコード済みの値を返す
+
+    Parse an SNS or EventBridge envelope once and return the inner message.
+    The envelope is kept on ``ctx.envelope``, and SNS message attributes are
+    merged into ``ctx.message_attributes`` without being converted. The SNS
+    ``Message`` is returned as a string for the decoder, while the
+    EventBridge ``detail`` is returned already decoded.
+    With ``auto`` a body that is not an envelope is returned unchanged.
+    """
+    if kind == AUTO:
+        if not body.startswith("{"):
+            return body
+        try:
+            envelope = _loads(body)
+        except ValueError:
+            return body
+    else:
+        envelope = _loads(body)
+    detected = _kind(envelope)
+    if detected is None:
+        if kind == AUTO:
+            return body
+        raise ValueError(f"The message body is not an {kind} envelope.")
+    if kind != AUTO and detected != kind:
+        raise ValueError(f"Expected an {kind} envelope, got {detected}.")
+    ctx.envelope = envelope
+    if detected == EVENTBRIDGE:
+        return envelope["detail"]
+    if attributes := envelope.get("MessageAttributes"):
+        if ctx.message_attributes is None:
+            ctx.message_attributes = MessageAttributes({}, attributes)
+        else:
+            ctx.message_attributes = ctx.message_attributes.merge(attributes)  # type: ignore
+    return envelope["Message"]
@@ -1,31 +1,51 @@
 import json
-from typing import Any, Callable, TypeVar
+from collections.abc import Mapping
+from inspect import iscoroutinefunction
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, TypeVar, Union
+from warnings import warn
 
 from sqs_polling.types import RedrivePolicy
 
+if TYPE_CHECKING:
+    from sqs_polling.context import BatchMessage, MessageContext
+    from sqs_polling.envelope import TEnvelope
+    from sqs_polling.execute_result import ExecuteResult
 
-def __default_decode(x: str) -> str:
+
+def _default_decode(x: str) -> str:
     return x
 
 
 TMessageBody = TypeVar("TMessageBody")
-TMessageAttribute = dict[str, Any] | None
+TMessageAttribute = Mapping[str, Any] | None
 TMessageGroupId = str | None
 TMessageDeduplicationId = str | None
 
 THandle = Callable[
     [
-        "Polling",
+        "MessageContext",
         TMessageBody,
         TMessageAttribute,
         TMessageGroupId,
         TMessageDeduplicationId,
     ],
-    None,
+    None | Awaitable[None],
 ]
 
 TDecode = Callable[[str], TMessageBody] | None
 
+# バッチハンドラーの戻り値
+# None: 全件削除 / list: 渡した順の結果 / dict: MessageIdごとの結果
+# 結果はExecuteResult・例外・None(削除)のいずれか
+TBatchItemResult = Union["ExecuteResult", BaseException, None]
+TBatchResult = (
+    list[TBatchItemResult]
+    | tuple[TBatchItemResult, ...]
+    | dict[str, TBatchItemResult]
+    | None
+)
+TBatchHandle = Callable[["Polling", list["BatchMessage"]], TBatchResult]
+
 
 class Polling:
     def __init__(
@@ -42,7 +62,30 @@ class Polling:
         process_worker: bool = False,
         aws_profile: dict[str, Any] = {},
         max_retry_count: int = 0,
-        decoder: TDecode[TMessageBody] = None
+        decoder: TDecode[TMessageBody] = None,
+        ack_interval_seconds: float = 0.1,
+        continuous: bool = False,
+        wait_time_seconds: int = 20,
+        max_backoff_seconds: float = 20.0,
+        receivers: int = 1,
+        prefetch: int = 0,
+        prefetch_bytes: int = 0,
+        extend_visibility: bool = False,
+        max_lease_seconds: float = 43200,
+        weight: int = 1,
+        priority: int = 0,
+        autoscale: bool = False,
+        min_workers: int = 1,
+        batch: bool = False,
+        batch_size: int = 10,
+        batch_bytes: int = 0,
+        batch_window_seconds: float = 0.0,
+        envelope: "TEnvelope | None" = None,
+        payload_offload: bool = False,
+        payload_spill_bytes: int = 16 * 1024 * 1024,
+        payload_delete: bool = True,
+        compression_attribute: str = "",
+        tracing: bool = False,
     ) -> None:
         if queue_name == "" and queue_url == "":
             raise ValueError("Either queue_name or queue_url must be specified.")
@@ -56,19 +99,77 @@ class Polling:
         self.max_number_of_messages = max_number_of_messages
         self.process_worker = process_worker
         self.aws_profile = aws_profile
+        # 非推奨のretry属性の値(エンジンからは書き込まない)
         self.__retry = 0
         self.__max_retry_count = max_retry_count
         self.__dead_later_queue_url = ""
-        self.decorator = decoder or __default_decode
+        self.decorator = decoder or _default_decode
+        self.ack_interval_seconds = ack_interval_seconds
+        self.continuous = continuous
+        self.wait_time_seconds = wait_time_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        if receivers < 1:
+            raise ValueError("receivers must be greater than or equal to 1.")
+        self.receivers = receivers
+        # ワーカー数を超えて先に受信しておくメッセージ数
+        # 多すぎると処理待ちの間に可視性タイムアウトを超えて再配信される
+        self.prefetch = prefetch
+        # 0の場合はバイト数で制限しない
+        self.prefetch_bytes = prefetch_bytes
+        # 処理中のメッセージの可視性タイムアウトを自動で延長する
+        self.extend_visibility = extend_visibility
+        self.max_lease_seconds = max_lease_seconds
+        # 複数のキューでワーカーを共有する場合の配分の重みと優先度
+        self.weight = weight
+        self.priority = priority
+        # 同時実行数をmin_workersからmax_workersの間で自動調整する
+        self.autoscale = autoscale
+        self.min_workers = min_workers
+        # ハンドラーにメッセージのリストを渡す
+        self.batch = batch
+        self.batch_size = batch_size
+        # 複数回の受信分をまとめる場合のバイト数(0の場合は制限しない)と待ち時間(0の場合は待たない)
+        self.batch_bytes = batch_bytes
+        self.batch_window_seconds = batch_window_seconds
+        # SNS・EventBridgeのエンベロープを外してからハンドラーに渡す
+        self.envelope = envelope
+        # Extended Client形式でS3に退避された本文を取得する
+        # payload_spill_bytesを超える本文は一時ファイルに書き出してmmapで渡す
+        self.payload_offload = payload_offload
+        self.payload_spill_bytes = payload_spill_bytes
+        # メッセージの削除時にS3のオブジェクトも削除する
+        self.payload_delete = payload_delete
+        # 本文の圧縮形式(gzip・zstd・lz4)を指定するメッセージ属性の名前(空の場合は展開しない)
+        self.compression_attribute = compression_attribute
+        # OpenTelemetryで受信・デコード・ハンドラー・削除のスパンを作成する
+        self.tracing = tracing
 
     @property
     def retry(self) -> int:
+        """
+        非推奨: リトライ回数はメッセージごとにMessageContext.retryで渡される
+        Deprecated: the retry count is per message, read ``MessageContext.retry``
+        """
+        warn(
+            "Polling.retry is deprecated, use MessageContext.retry instead.",
+            DeprecationWarning,
+            stacklevel=2,
+        )
         return self.__retry
 
     @retry.setter
     def retry(self, value: int):
+        warn(
+            "Polling.retry is deprecated, use MessageContext.retry instead.",
+            DeprecationWarning,
+            stacklevel=2,
+        )
         self.__retry = value
 
+    @property
+    def max_retry_count(self) -> int:
+        return self.__max_retry_count
+
     @property
     def queue_url(self) -> str:
         return self.__queue_url
@@ -96,26 +197,144 @@ class Polling:
         )
         self.process_worker = kwargs.get("process_worker", self.process_worker)
         self.aws_profile = kwargs.get("aws_profile", self.aws_profile)
-        self.decorator = kwargs.get("decorator", self.decorator)
+        self.decorator = kwargs.get("decoder", kwargs.get("decorator", self.decorator))
+        self.ack_interval_seconds = kwargs.get(
+            "ack_interval_seconds", self.ack_interval_seconds
+        )
+        self.continuous = kwargs.get("continuous", self.continuous)
+        self.wait_time_seconds = kwargs.get("wait_time_seconds", self.wait_time_seconds)
+        self.max_backoff_seconds = kwargs.get(
+            "max_backoff_seconds", self.max_backoff_seconds
+        )
+        self.receivers = kwargs.get("receivers", self.receivers)
+        self.prefetch = kwargs.get("prefetch", self.prefetch)
+        self.prefetch_bytes = kwargs.get("prefetch_bytes", self.prefetch_bytes)
+        self.extend_visibility = kwargs.get("extend_visibility", self.extend_visibility)
+        self.max_lease_seconds = kwargs.get("max_lease_seconds", self.max_lease_seconds)
+        self.weight = kwargs.get("weight", self.weight)
+        self.priority = kwargs.get("priority", self.priority)
+        self.autoscale = kwargs.get("autoscale", self.autoscale)
+        self.min_workers = kwargs.get("min_workers", self.min_workers)
+        self.batch = kwargs.get("batch", self.batch)
+        self.batch_size = kwargs.get("batch_size", self.batch_size)
+        self.batch_bytes = kwargs.get("batch_bytes", self.batch_bytes)
+        self.batch_window_seconds = kwargs.get(
+            "batch_window_seconds", self.batch_window_seconds
+        )
+        self.envelope = kwargs.get("envelope", self.envelope)
+        self.payload_offload = kwargs.get("payload_offload", self.payload_offload)
+        self.payload_spill_bytes = kwargs.get(
+            "payload_spill_bytes", self.payload_spill_bytes
+        )
+        self.payload_delete = kwargs.get("payload_delete", self.payload_delete)
+        self.compression_attribute = kwargs.get(
+            "compression_attribute", self.compression_attribute
+        )
+        self.tracing = kwargs.get("tracing", self.tracing)
 
     def connect(self, func: THandle) -> None:
         self.handler = func
 
-    def is_max_retry(self) -> bool:
-        return self.__max_retry_count > 0 and self.retry >= self.__max_retry_count
+    @property
+    def is_async(self) -> bool:
+        return iscoroutinefunction(self.handler)
+
+    @property
+    def name(self) -> str:
+        return self.handler.__name__
+
+    @property
+    def module(self) -> str:
+        return self.handler.__module__
+
+    @property
+    def qualified_name(self) -> str:
+        """
+        ハンドラーを登録するキー(モジュール名.関数名)
+        Key the handler is registered under: ``module.qualname``
+        """
+        return f"{self.module}.{self.handler.__qualname__}"
+
+    def options(self) -> dict[str, Any]:
+        """
+        updateに渡せる設定値(ハンドラーとデコーダーを除く)
+        Settings that can be passed to ``update``, except the handler and decoder
+        """
+        return {
+            "queue_url": self.queue_url,
+            "visibility_timeout": self.visibility_timeout,
+            "exception_deletable": self.exception_deletable,
+            "interval_seconds": self.interval_seconds,
+            "max_workers": self.max_workers,
+            "max_number_of_messages": self.max_number_of_messages,
+            "process_worker": self.process_worker,
+            "aws_profile": self.aws_profile,
+            "ack_interval_seconds": self.ack_interval_seconds,
+            "continuous": self.continuous,
+            "wait_time_seconds": self.wait_time_seconds,
+            "max_backoff_seconds": self.max_backoff_seconds,
+            "receivers": self.receivers,
+            "prefetch": self.prefetch,
+            "prefetch_bytes": self.prefetch_bytes,
+            "extend_visibility": self.extend_visibility,
+            "max_lease_seconds": self.max_lease_seconds,
+            "weight": self.weight,
+            "priority": self.priority,
+            "autoscale": self.autoscale,
+            "min_workers": self.min_workers,
+            "batch": self.batch,
+            "batch_size": self.batch_size,
+            "batch_bytes": self.batch_bytes,
+            "batch_window_seconds": self.batch_window_seconds,
+            "envelope": self.envelope,
+            "payload_offload": self.payload_offload,
+            "payload_spill_bytes": self.payload_spill_bytes,
+            "payload_delete": self.payload_delete,
+            "compression_attribute": self.compression_attribute,
+            "tracing": self.tracing,
+        }
+
+    def is_max_retry(self, retry: int | None = None) -> bool:
+        if retry is None:
+            # 従来通り引数なしで呼び出された場合はretry属性の値で判定する
+            warn(
+                "is_max_retry() without the retry count is deprecated, "
+                "use MessageContext.is_max_retry() instead.",
+                DeprecationWarning,
+                stacklevel=2,
+            )
+            retry = self.__retry
+        return self.__max_retry_count > 0 and retry >= self.__max_retry_count
 
     def set_dead_later_queue_url(self, client) -> None:
         attr = client.get_queue_attributes(
             QueueUrl=self.queue_url, AttributeNames=["RedrivePolicy"]
         )
+        if dead_later_queue_name := self.__get_dead_later_queue_name(attr):
+            self.__dead_later_queue_url = self.__get_queue_url(
+                client, dead_later_queue_name
+            )
+
+    async def aset_queue_url(self, client) -> None:
+        if self.__queue_url == "":
+            resp = await client.get_queue_url(QueueName=self.queue_name)
+            self.__queue_url = resp.get("QueueUrl")
+
+    async def aset_dead_later_queue_url(self, client) -> None:
+        attr = await client.get_queue_attributes(
+            QueueUrl=self.queue_url, AttributeNames=["RedrivePolicy"]
+        )
+        if dead_later_queue_name := self.__get_dead_later_queue_name(attr):
+            resp = await client.get_queue_url(QueueName=dead_later_queue_name)
+            self.__dead_later_queue_url = resp.get("QueueUrl")
+
+    def __get_dead_later_queue_name(self, attr) -> str:
         value = attr.get("Attributes", {}).get("RedrivePolicy")
         if value:
             policy: RedrivePolicy = json.loads(value)
             queue_arn = policy.get("deadLetterTargetArn", "")
-            dead_later_queue_name = queue_arn.split(":")[-1]
-            self.__dead_later_queue_url = self.__get_queue_url(
-                client, dead_later_queue_name
-            )
+            return queue_arn.split(":")[-1]
+        return ""
 
     def __get_queue_url(self, client, queue_name) -> str:
         resp = client.get_queue_url(QueueName=queue_name)
@@ -126,8 +345,15 @@ _handlers: dict[str, Polling] = {}
 
 
 def set_handler(name: str, p: Polling) -> None:
+    # 別のモジュールの同名のハンドラーを上書きしないよう、重複した登録はエラーにする
+    if name in _handlers:
+        raise ValueError(f"A polling handler is already registered as {name}.")
     _handlers[name] = p
 
 
 def get_handler(name: str) -> Polling:
     return _handlers[name]
+
+
+def get_handlers(module_name: str) -> list[Polling]:
+    return [p for p in _handlers.values() if p.module == module_name]
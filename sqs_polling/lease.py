@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+from logging import getLogger
+from math import ceil
+from threading import Event, Lock, Thread
+from time import monotonic
+from typing import TYPE_CHECKING, Any
+
+from .ack import MAX_BATCH_SIZE
+
+if TYPE_CHECKING:
+    from mypy_boto3_sqs import SQSClient
+
+logger = getLogger(__name__)
+
+
+class _Lease:
+    __slots__ = ("received_at", "expires_at")
+
+    def __init__(self, received_at: float, expires_at: float) -> None:
+        self.received_at = received_at
+        self.expires_at = expires_at
+
+
+class LeaseManager:
+    """
+    処理中のメッセージの可視性タイムアウトを期限切れ前にまとめて延長する
+    Keep in-flight messages invisible by extending their visibility timeout in batches
+    """
+
+    def __init__(
+        self,
+        queue_url: str,
+        visibility_timeout: int,
+        *,
+        max_lease_seconds: float = 43200,
+    ) -> None:
+        self.queue_url = queue_url
+        self.visibility_timeout = visibility_timeout
+        self.max_lease_seconds = max_lease_seconds
+        # 残り時間が半分を切ったら延長する
+        self.margin_seconds = visibility_timeout / 2
+        # 延長が期限に間に合うよう、確認の間隔は判定幅(margin_seconds)より短くする
+        self.interval_seconds = max(visibility_timeout / 4, 0.1)
+        self.__leases: dict[str, _Lease] = {}
+        self.__lock = Lock()
+        self.__stop = Event()
+        self.__thread: Thread | None = None
+
+    def track(self, receipt_handle: str) -> None:
+        now = monotonic()
+        with self.__lock:
+            self.__leases[receipt_handle] = _Lease(now, now + self.visibility_timeout)
+
+    def release(self, receipt_handle: str) -> None:
+        with self.__lock:
+            self.__leases.pop(receipt_handle, None)
+
+    def remaining(self, receipt_handle: str) -> float | None:
+        """
+        可視性タイムアウトまでの残り秒数(追跡していない場合はNone)
+        Seconds left before the message becomes visible, or None if not tracked
+        """
+        with self.__lock:
+            lease = self.__leases.get(receipt_handle)
+        return None if lease is None else lease.expires_at - monotonic()
+
+    def __len__(self) -> int:
+        with self.__lock:
+            return len(self.__leases)
+
+    def due(self) -> list[list[dict[str, Any]]]:
+        """
+        延長が必要なリースをバッチAPIのエントリーに分割して返す
+        Return the ChangeMessageVisibilityBatch entries for leases about to expire
+        """
+        now = monotonic()
+        entries = []
+        with self.__lock:
+            for handle, lease in list(self.__leases.items()):
+                if lease.expires_at - now > self.margin_seconds:
+                    continue
+                remaining = lease.received_at + self.max_lease_seconds - now
+                if remaining <= 0:
+                    # 最大リース時間に達したため延長をやめる
+                    logger.warning(
+                        "Max lease time reached",
+                        extra={"queue": self.queue_url, "handle": handle},
+                    )
+                    del self.__leases[handle]
+                    continue
+                # 0秒にすると処理中に他の受信へ渡るため、1秒未満は切り上げる
+                timeout = max(1, ceil(min(self.visibility_timeout, remaining)))
+                entries.append({"ReceiptHandle": handle, "VisibilityTimeout": timeout})
+        return [
+            [
+                dict(entry, Id=str(i))
+                for i, entry in enumerate(entries[n : n + MAX_BATCH_SIZE])
+            ]
+            for n in range(0, len(entries), MAX_BATCH_SIZE)
+        ]
+
+    def extended(self, batch: list[dict[str, Any]], response: Any) -> None:
+        """
+        延長できたリースの期限を更新する
+        SenderFaultの失敗はリースから外し、一時的な失敗は次の周期で再度延長する
+
+        Update the successfully extended leases. Entries that failed with a
+        sender fault are dropped; transient failures are kept and retried on
+        the next tick.
+        """
+        now = monotonic()
+        failures = {failed["Id"]: failed for failed in response.get("Failed", [])}
+        with self.__lock:
+            for entry in batch:
+                handle = entry["ReceiptHandle"]
+                if failed := failures.get(entry["Id"]):
+                    logger.debug(
+                        "Lease extension failed",
+                        extra={
+                            "queue": self.queue_url,
+                            "handle": handle,
+                            "code": failed.get("Code"),
+                        },
+                    )
+                    if failed.get("SenderFault"):
+                        # 処理が終わって削除済みのメッセージなど、再送しても成功しない
+                        self.__leases.pop(handle, None)
+                elif lease := self.__leases.get(handle):
+                    lease.expires_at = now + entry["VisibilityTimeout"]
+
+    def start(self, client: SQSClient) -> None:
+        if self.__thread is None:
+            self.__thread = Thread(
+                target=self.__run,
+                args=(client,),
+                name=f"sqs-polling-lease-{self.queue_url}",
+                daemon=True,
+            )
+            self.__thread.start()
+
+    def stop(self) -> None:
+        self.__stop.set()
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+
+    def __run(self, client: SQSClient) -> None:
+        while not self.__stop.wait(self.interval_seconds):
+            for batch in self.due():
+                logger.debug(
+                    "Extend visibility",
+                    extra={"queue": self.queue_url, "length": len(batch)},
+                )
+                try:
+                    response = client.change_message_visibility_batch(
+                        QueueUrl=self.queue_url, Entries=batch  # type: ignore
+                    )
+                except Exception as e:
+                    # 期限は更新されないため次の周期で再度延長する
+                    logger.error(e, exc_info=True)
+                    continue
+                self.extended(batch, response)
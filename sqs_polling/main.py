@@ -5,11 +5,13 @@ from concurrent.futures import ProcessPoolExecutor as Executor
 from concurrent.futures import ThreadPoolExecutor
 from time import sleep
 
-from sqs_polling.handler import get_handler
+from sqs_polling.aio import AsyncEngine
+from sqs_polling.handler import Polling, get_handler, get_handlers
 from sqs_polling.polling import _handler, logger, shutdown
 
+from .scheduler import Scheduler
 from .signal import heartbeat, ready
-from .utils import find_module
+from .utils import NotAPackage, find_module
 
 
 def _heartbeat_handler(pid: int):
@@ -39,25 +41,72 @@ def heartbeat_handler():
     future.add_done_callback(callback(pid))
 
 
-def handler(func_name: str, **kwargs) -> Executor | ThreadPoolExecutor:
-    func_names = func_name.split(".")
-    module_name = ".".join(func_names[:-1])
-    _ = find_module(module_name)
-    name = func_names[-1]
-    p = get_handler(name)
+def _get_pollings(func_name: str) -> list[Polling]:
+    """
+    関数名の場合はそのハンドラーを、モジュール名の場合は登録済みの全てのハンドラーを返す
+    Resolve a function path to its handler, or a module path to all of its handlers
+    """
+    try:
+        module = find_module(func_name)
+    except (ImportError, NotAPackage):
+        module = None
+    if module is not None:
+        pollings = get_handlers(module.__name__)
+        if not pollings:
+            raise ValueError(f"No polling handlers are registered in {func_name}.")
+        return pollings
+    module_name, _, name = func_name.rpartition(".")
+    module = find_module(module_name)
+    return [get_handler(f"{module.__name__}.{name}")]
+
+
+def handler(func_name: str, **kwargs) -> Executor | ThreadPoolExecutor | AsyncEngine:
+    pollings = _get_pollings(func_name)
+    if len(pollings) > 1:
+        # どのハンドラーを起動するか決められないため、複数の場合はhandlersを使わせる
+        raise ValueError(
+            f"{func_name} has several polling handlers, use handlers() instead."
+        )
+    (p,) = pollings
     p.update(**kwargs)
     return _handler(p)
 
 
-def main(func_name: str, **kwargs) -> None:
-    executor = handler(func_name, **kwargs)
+def handlers(
+    *func_names: str, scheduler: Scheduler | None = None, **kwargs
+) -> list[Executor | ThreadPoolExecutor | AsyncEngine]:
+    """
+    複数のハンドラーを1つのイベントループで起動する
+    キューごとの同時実行数は各ハンドラーのmax_workersで制限され、クライアントは共有される
+    schedulerを渡した場合、ワーカーの枠をキューの重みと優先度に応じて配分する
+
+    Start several handlers on one event loop. Each queue keeps its own
+    ``max_workers`` limit while clients are shared per AWS profile.
+    With ``scheduler`` the queues also share its slots by weight or priority.
+    """
+    pollings = {id(p): p for name in func_names for p in _get_pollings(name)}
+    if len(pollings) > 1 and ("queue_url" in kwargs or "queue_name" in kwargs):
+        raise ValueError("queue_url and queue_name can not be shared by handlers.")
+    executors = []
+    for p in pollings.values():
+        p.update(**kwargs)
+        executors.append(_handler(p, scheduler))
+    if scheduler is not None:
+        scheduler.start()
+    return executors
+
+
+def main(*func_names: str, scheduler: Scheduler | None = None, **kwargs) -> None:
+    executors = handlers(*func_names, scheduler=scheduler, **kwargs)
     ready.send()
     heartbeat_handler()
     loop = get_event_loop()
     for s in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT):
         loop.add_signal_handler(
             s,
-            lambda s=s: create_task(shutdown(loop=loop, executor=executor, signal=s)),
+            lambda s=s: create_task(shutdown(loop=loop, executor=executors, signal=s)),
         )
     loop.run_forever()
+    if scheduler is not None:
+        scheduler.stop()
     loop.close()
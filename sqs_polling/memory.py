@@ -0,0 +1,693 @@
+from __future__ import annotations
+
+import heapq
+import json
+from collections import Counter, OrderedDict, deque
+from hashlib import md5, sha256
+from itertools import count
+from threading import Condition
+from time import monotonic, time
+from typing import Any, Callable
+from uuid import uuid4
+
+from botocore.exceptions import ClientError
+
+from .dlq import MAX_BATCH_BYTES, entry_bytes
+
+# 1リクエストあたりの最大件数
+MAX_BATCH_ENTRIES = 10
+MAX_VISIBILITY_TIMEOUT = 43200
+# FIFOキューの重複排除の期間(秒)
+DEDUPLICATION_SECONDS = 300
+
+NON_EXISTENT_QUEUE = "AWS.SimpleQueueService.NonExistentQueue"
+RECEIPT_HANDLE_IS_INVALID = "ReceiptHandleIsInvalid"
+MESSAGE_NOT_INFLIGHT = "AWS.SimpleQueueService.MessageNotInflight"
+INVALID_PARAMETER_VALUE = "InvalidParameterValue"
+MISSING_PARAMETER = "MissingParameter"
+
+
+def _error(operation: str, code: str, message: str) -> ClientError:
+    return ClientError(
+        {
+            "Error": {"Code": code, "Message": message},
+            "ResponseMetadata": {"HTTPStatusCode": 400},
+        },
+        operation,
+    )
+
+
+def _batch_error(operation: str, entries: list[dict[str, Any]]) -> None:
+    if not entries:
+        raise _error(
+            operation,
+            "AWS.SimpleQueueService.EmptyBatchRequest",
+            "There should be at least one entry in the request.",
+        )
+    if len(entries) > MAX_BATCH_ENTRIES:
+        raise _error(
+            operation,
+            "AWS.SimpleQueueService.TooManyEntriesInBatchRequest",
+            f"Maximum number of entries per request are {MAX_BATCH_ENTRIES}.",
+        )
+    ids = [entry["Id"] for entry in entries]
+    if len(set(ids)) != len(ids):
+        raise _error(
+            operation,
+            "AWS.SimpleQueueService.BatchEntryIdsNotDistinct",
+            "Id values must be unique within a batch request.",
+        )
+
+
+class _Message:
+    __slots__ = (
+        "message_id",
+        "body",
+        "message_attributes",
+        "system_attributes",
+        "group_id",
+        "deduplication_id",
+        "sequence_number",
+        "sent_timestamp",
+        "visible_at",
+        "receive_count",
+        "first_received_at",
+        "receipt_handle",
+        "version",
+    )
+
+    def __init__(
+        self,
+        message_id: str,
+        body: str,
+        message_attributes: dict[str, Any],
+        system_attributes: dict[str, Any],
+        group_id: str,
+        deduplication_id: str,
+        sequence_number: str,
+        visible_at: float,
+    ) -> None:
+        self.message_id = message_id
+        self.body = body
+        self.message_attributes = message_attributes
+        self.system_attributes = system_attributes
+        self.group_id = group_id
+        self.deduplication_id = deduplication_id
+        self.sequence_number = sequence_number
+        self.sent_timestamp = int(time() * 1000)
+        self.visible_at = visible_at
+        self.receive_count = 0
+        self.first_received_at = 0
+        self.receipt_handle = ""
+        # 状態が変わるたびに増やし、古い待ち行列の要素を読み飛ばす
+        self.version = 0
+
+    def in_flight(self, now: float) -> bool:
+        return self.receive_count > 0 and self.visible_at > now
+
+
+class _Queue:
+    def __init__(self, name: str, url: str, arn: str, attributes: dict[str, str]):
+        self.name = name
+        self.url = url
+        self.arn = arn
+        self.fifo = name.endswith(".fifo")
+        self.attributes = {
+            "VisibilityTimeout": "30",
+            "DelaySeconds": "0",
+            **attributes,
+            "QueueArn": arn,
+        }
+        if self.fifo:
+            self.attributes["FifoQueue"] = "true"
+        self.messages: dict[str, _Message] = {}
+        # 標準キュー: 受信できるメッセージと、可視性タイムアウト・遅延中のメッセージ
+        self.ready: deque[tuple[str, int]] = deque()
+        self.hidden: list[tuple[float, int, str, int]] = []
+        # FIFOキュー: メッセージグループごとの送信順のメッセージ
+        self.groups: OrderedDict[str, deque[str]] = OrderedDict()
+        self.deduplication: dict[str, tuple[float, str, str]] = {}
+        self.sequence = count(1)
+
+    @property
+    def visibility_timeout(self) -> int:
+        return int(self.attributes["VisibilityTimeout"])
+
+    @property
+    def redrive(self) -> tuple[str, int] | None:
+        if value := self.attributes.get("RedrivePolicy"):
+            policy = json.loads(value)
+            return policy["deadLetterTargetArn"], int(policy["maxReceiveCount"])
+        return None
+
+
+class MemoryTransport:
+    """
+    プロセス内でSQSを再現するスレッドセーフなトランスポート
+    可視性タイムアウト、受信回数、FIFOキューのメッセージグループと重複排除、
+    RedrivePolicyによるDLQへの移動、ロングポーリングを再現する
+    ネットワークを使わないため、テストやベンチマークでエンジンを最高速で動かせる
+
+    An in-process, thread-safe SQS for tests and benchmarks. It models
+    visibility timeouts, receive counts, FIFO message groups and
+    deduplication, redrive to a dead-letter queue and long polling. No
+    network round trips are made, so the engine runs at full speed.
+
+    ``clock`` is used for visibility timeouts and delays; pass a fake clock
+    and ``WaitTimeSeconds=0`` for deterministic tests. The state lives in
+    this process, so it can not be used with ``process_worker``.
+
+        memory = MemoryTransport()
+        memory.create_queue(QueueName="queue_name")
+
+        @polling(queue_name="queue_name", aws_profile={"transport": memory})
+        def task(self, body, *_):
+            ...
+    """
+
+    def __init__(
+        self,
+        *,
+        region_name: str = "us-east-1",
+        account_id: str = "000000000000",
+        clock: Callable[[], float] = monotonic,
+    ) -> None:
+        self.region_name = region_name
+        self.account_id = account_id
+        self.clock = clock
+        # 操作ごとの呼び出し回数
+        self.calls: Counter[str] = Counter()
+        self.__queues: dict[str, _Queue] = {}
+        self.__cond = Condition()
+        self.__hidden_order = count()
+
+    def __reduce__(self):
+        raise TypeError("MemoryTransport can not be shared with worker processes.")
+
+    def create_queue(
+        self, *, QueueName: str, Attributes: dict[str, str] | None = None, **_
+    ) -> dict[str, Any]:
+        with self.__cond:
+            self.calls["CreateQueue"] += 1
+            url = self.__url(QueueName)
+            if (queue := self.__queues.get(url)) is None:
+                arn = f"arn:aws:sqs:{self.region_name}:{self.account_id}:{QueueName}"
+                queue = _Queue(QueueName, url, arn, dict(Attributes or {}))
+                self.__queues[url] = queue
+            elif Attributes and any(
+                queue.attributes.get(k) != v for k, v in Attributes.items()
+            ):
+                raise _error(
+                    "CreateQueue",
+                    "QueueAlreadyExists",
+                    "A queue already exists with the same name and a different value.",
+                )
+            return {"QueueUrl": url}
+
+    def delete_queue(self, *, QueueUrl: str, **_) -> dict[str, Any]:
+        with self.__cond:
+            self.calls["DeleteQueue"] += 1
+            self.__queue("DeleteQueue", QueueUrl)
+            del self.__queues[QueueUrl]
+            return {}
+
+    def purge_queue(self, *, QueueUrl: str, **_) -> dict[str, Any]:
+        with self.__cond:
+            self.calls["PurgeQueue"] += 1
+            queue = self.__queue("PurgeQueue", QueueUrl)
+            queue.messages.clear()
+            queue.ready.clear()
+            queue.hidden.clear()
+            queue.groups.clear()
+            return {}
+
+    def get_queue_url(self, *, QueueName: str, **_) -> dict[str, Any]:
+        with self.__cond:
+            self.calls["GetQueueUrl"] += 1
+            return {"QueueUrl": self.__queue("GetQueueUrl", self.__url(QueueName)).url}
+
+    def get_queue_attributes(
+        self, *, QueueUrl: str, AttributeNames: list[str] | None = None, **_
+    ) -> dict[str, Any]:
+        with self.__cond:
+            self.calls["GetQueueAttributes"] += 1
+            queue = self.__queue("GetQueueAttributes", QueueUrl)
+            now = self.clock()
+            visible = delayed = in_flight = 0
+            for message in queue.messages.values():
+                if message.visible_at <= now:
+                    visible += 1
+                elif message.receive_count:
+                    in_flight += 1
+                else:
+                    delayed += 1
+            attributes = {
+                **queue.attributes,
+                "ApproximateNumberOfMessages": str(visible),
+                "ApproximateNumberOfMessagesNotVisible": str(in_flight),
+                "ApproximateNumberOfMessagesDelayed": str(delayed),
+            }
+        names = AttributeNames or []
+        if "All" not in names:
+            attributes = {k: v for k, v in attributes.items() if k in names}
+        return {"Attributes": attributes}
+
+    def set_queue_attributes(
+        self, *, QueueUrl: str, Attributes: dict[str, str], **_
+    ) -> dict[str, Any]:
+        with self.__cond:
+            self.calls["SetQueueAttributes"] += 1
+            queue = self.__queue("SetQueueAttributes", QueueUrl)
+            queue.attributes.update(Attributes)
+            return {}
+
+    def send_message(self, *, QueueUrl: str, **entry: Any) -> dict[str, Any]:
+        with self.__cond:
+            self.calls["SendMessage"] += 1
+            queue = self.__queue("SendMessage", QueueUrl)
+            result = self.__send(queue, entry, "SendMessage")
+            self.__cond.notify_all()
+            return result
+
+    def send_message_batch(
+        self, *, QueueUrl: str, Entries: list[dict[str, Any]], **_
+    ) -> dict[str, Any]:
+        _batch_error("SendMessageBatch", Entries)
+        if sum(entry_bytes(entry) for entry in Entries) > MAX_BATCH_BYTES:
+            raise _error(
+                "SendMessageBatch",
+                "AWS.SimpleQueueService.BatchRequestTooLong",
+                f"Batch requests can not be longer than {MAX_BATCH_BYTES} bytes.",
+            )
+        successful, failed = [], []
+        with self.__cond:
+            self.calls["SendMessageBatch"] += 1
+            queue = self.__queue("SendMessageBatch", QueueUrl)
+            for entry in Entries:
+                params = {k: v for k, v in entry.items() if k != "Id"}
+                try:
+                    result = self.__send(queue, params, "SendMessageBatch")
+                except ClientError as e:
+                    failed.append(_failed(entry["Id"], e))
+                else:
+                    successful.append({"Id": entry["Id"], **result})
+            self.__cond.notify_all()
+        return {"Successful": successful, "Failed": failed}
+
+    def receive_message(
+        self,
+        *,
+        QueueUrl: str,
+        MaxNumberOfMessages: int = 1,
+        VisibilityTimeout: int | None = None,
+        WaitTimeSeconds: int = 0,
+        AttributeNames: list[str] | None = None,
+        MessageSystemAttributeNames: list[str] | None = None,
+        MessageAttributeNames: list[str] | None = None,
+        **_,
+    ) -> dict[str, Any]:
+        if not 1 <= MaxNumberOfMessages <= MAX_BATCH_ENTRIES:
+            raise _error(
+                "ReceiveMessage",
+                INVALID_PARAMETER_VALUE,
+                "MaxNumberOfMessages must be between 1 and 10.",
+            )
+        deadline = monotonic() + WaitTimeSeconds
+        attribute_names = [
+            *(AttributeNames or []),
+            *(MessageSystemAttributeNames or []),
+        ]
+        with self.__cond:
+            self.calls["ReceiveMessage"] += 1
+            while True:
+                queue = self.__queue("ReceiveMessage", QueueUrl)
+                now = self.clock()
+                timeout = (
+                    queue.visibility_timeout
+                    if VisibilityTimeout is None
+                    else VisibilityTimeout
+                )
+                messages = self.__take(queue, MaxNumberOfMessages, now)
+                if messages or (wait := deadline - monotonic()) <= 0:
+                    break
+                # 次にメッセージが見えるようになるまでか、送信・可視性の変更まで待つ
+                if (next_at := self.__next_visible_at(queue)) is not None:
+                    wait = min(wait, max(next_at - now, 0.001))
+                self.__cond.wait(wait)
+            received = []
+            for message in messages:
+                message.receive_count += 1
+                if not message.first_received_at:
+                    message.first_received_at = int(time() * 1000)
+                message.receipt_handle = (
+                    f"{queue.name}/{message.message_id}/{message.receive_count}"
+                )
+                self.__hide(queue, message, now + timeout)
+                received.append(
+                    _response(message, attribute_names, MessageAttributeNames or [])
+                )
+        return {"Messages": received} if received else {}
+
+    def delete_message(self, *, QueueUrl: str, ReceiptHandle: str, **_):
+        with self.__cond:
+            self.calls["DeleteMessage"] += 1
+            queue = self.__queue("DeleteMessage", QueueUrl)
+            self.__delete(queue, ReceiptHandle, "DeleteMessage")
+            self.__cond.notify_all()
+            return {}
+
+    def delete_message_batch(
+        self, *, QueueUrl: str, Entries: list[dict[str, Any]], **_
+    ) -> dict[str, Any]:
+        _batch_error("DeleteMessageBatch", Entries)
+        successful, failed = [], []
+        with self.__cond:
+            self.calls["DeleteMessageBatch"] += 1
+            queue = self.__queue("DeleteMessageBatch", QueueUrl)
+            for entry in Entries:
+                try:
+                    self.__delete(queue, entry["ReceiptHandle"], "DeleteMessageBatch")
+                except ClientError as e:
+                    failed.append(_failed(entry["Id"], e))
+                else:
+                    successful.append({"Id": entry["Id"]})
+            self.__cond.notify_all()
+        return {"Successful": successful, "Failed": failed}
+
+    def change_message_visibility(
+        self, *, QueueUrl: str, ReceiptHandle: str, VisibilityTimeout: int, **_
+    ) -> dict[str, Any]:
+        with self.__cond:
+            self.calls["ChangeMessageVisibility"] += 1
+            queue = self.__queue("ChangeMessageVisibility", QueueUrl)
+            self.__change_visibility(
+                queue, ReceiptHandle, VisibilityTimeout, "ChangeMessageVisibility"
+            )
+            self.__cond.notify_all()
+            return {}
+
+    def change_message_visibility_batch(
+        self, *, QueueUrl: str, Entries: list[dict[str, Any]], **_
+    ) -> dict[str, Any]:
+        operation = "ChangeMessageVisibilityBatch"
+        _batch_error(operation, Entries)
+        successful, failed = [], []
+        with self.__cond:
+            self.calls[operation] += 1
+            queue = self.__queue(operation, QueueUrl)
+            for entry in Entries:
+                try:
+                    self.__change_visibility(
+                        queue,
+                        entry["ReceiptHandle"],
+                        entry["VisibilityTimeout"],
+                        operation,
+                    )
+                except ClientError as e:
+                    failed.append(_failed(entry["Id"], e))
+                else:
+                    successful.append({"Id": entry["Id"]})
+            self.__cond.notify_all()
+        return {"Successful": successful, "Failed": failed}
+
+    def __url(self, queue_name: str) -> str:
+        return f"https://sqs.{self.region_name}.memory/{self.account_id}/{queue_name}"
+
+    def __queue(self, operation: str, url: str) -> _Queue:
+        if (queue := self.__queues.get(url)) is None:
+            raise _error(
+                operation,
+                NON_EXISTENT_QUEUE,
+                "The specified queue does not exist.",
+            )
+        return queue
+
+    def __send(self, queue: _Queue, entry: dict[str, Any], operation: str):
+        body = entry.get("MessageBody", "")
+        if not body:
+            raise _error(operation, MISSING_PARAMETER, "MessageBody is required.")
+        if entry_bytes({"MessageBody": body, **entry}) > MAX_BATCH_BYTES:
+            raise _error(
+                operation,
+                INVALID_PARAMETER_VALUE,
+                f"Message must be shorter than {MAX_BATCH_BYTES} bytes.",
+            )
+        now = self.clock()
+        group_id = entry.get("MessageGroupId", "")
+        deduplication_id = entry.get("MessageDeduplicationId", "")
+        sequence_number = ""
+        if queue.fifo:
+            if not group_id:
+                raise _error(
+                    operation,
+                    MISSING_PARAMETER,
+                    "The request must contain the parameter MessageGroupId.",
+                )
+            if "DelaySeconds" in entry:
+                raise _error(
+                    operation,
+                    INVALID_PARAMETER_VALUE,
+                    "DelaySeconds is not supported per message on FIFO queues.",
+                )
+            if not deduplication_id:
+                if queue.attributes.get("ContentBasedDeduplication") != "true":
+                    raise _error(
+                        operation,
+                        INVALID_PARAMETER_VALUE,
+                        "The queue should either have ContentBasedDeduplication "
+                        "enabled or MessageDeduplicationId provided explicitly.",
+                    )
+                deduplication_id = sha256(body.encode("utf-8")).hexdigest()
+            if (sent := queue.deduplication.get(deduplication_id)) and sent[0] > now:
+                # 重複排除の期間内は受け付けたように応答し、追加しない
+                return _sent(sent[1], body, sent[2])
+            sequence_number = f"{next(queue.sequence):020d}"
+        delay = int(entry.get("DelaySeconds", queue.attributes["DelaySeconds"]))
+        message = _Message(
+            str(uuid4()),
+            body,
+            {
+                name: dict(value)
+                for name, value in (entry.get("MessageAttributes") or {}).items()
+            },
+            {
+                name: value["StringValue"]
+                for name, value in (entry.get("MessageSystemAttributes") or {}).items()
+            },
+            group_id,
+            deduplication_id,
+            sequence_number,
+            now + delay,
+        )
+        self.__append(queue, message)
+        if queue.fifo:
+            queue.deduplication[deduplication_id] = (
+                now + DEDUPLICATION_SECONDS,
+                message.message_id,
+                sequence_number,
+            )
+        return _sent(message.message_id, body, sequence_number)
+
+    def __append(self, queue: _Queue, message: _Message) -> None:
+        queue.messages[message.message_id] = message
+        if queue.fifo:
+            queue.groups.setdefault(message.group_id, deque()).append(
+                message.message_id
+            )
+        elif message.visible_at > self.clock():
+            self.__hide(queue, message, message.visible_at)
+        else:
+            queue.ready.append((message.message_id, message.version))
+
+    def __hide(self, queue: _Queue, message: _Message, visible_at: float) -> None:
+        message.version += 1
+        message.visible_at = visible_at
+        if not queue.fifo:
+            heapq.heappush(
+                queue.hidden,
+                (
+                    visible_at,
+                    next(self.__hidden_order),
+                    message.message_id,
+                    message.version,
+                ),
+            )
+
+    def __next_visible_at(self, queue: _Queue) -> float | None:
+        if not queue.fifo:
+            return queue.hidden[0][0] if queue.hidden else None
+        heads = [
+            queue.messages[ids[0]].visible_at for ids in queue.groups.values() if ids
+        ]
+        return min(heads) if heads else None
+
+    def __take(self, queue: _Queue, limit: int, now: float) -> list[_Message]:
+        if queue.fifo:
+            return self.__take_fifo(queue, limit, now)
+        # 可視性タイムアウトが切れたメッセージを受信できる状態へ戻す
+        while queue.hidden and queue.hidden[0][0] <= now:
+            _, _, message_id, version = heapq.heappop(queue.hidden)
+            message = queue.messages.get(message_id)
+            if message is not None and message.version == version:
+                queue.ready.append((message_id, version))
+        messages: list[_Message] = []
+        while queue.ready and len(messages) < limit:
+            message_id, version = queue.ready.popleft()
+            message = queue.messages.get(message_id)
+            if message is None or message.version != version:
+                continue
+            if not self.__redrive(queue, message):
+                messages.append(message)
+        return messages
+
+    def __take_fifo(self, queue: _Queue, limit: int, now: float) -> list[_Message]:
+        # 処理中のメッセージがあるグループは、そのメッセージが終わるまで受信しない
+        # 1回の受信では同じグループのメッセージを送信順にまとめて返す
+        messages: list[_Message] = []
+        for group_id, ids in list(queue.groups.items()):
+            taken = False
+            for message_id in list(ids):
+                message = queue.messages[message_id]
+                if message.visible_at > now or len(messages) == limit:
+                    break
+                if self.__redrive(queue, message):
+                    continue
+                messages.append(message)
+                taken = True
+            if taken:
+                # 他のグループにも順に受信させる
+                queue.groups.move_to_end(group_id)
+            if len(messages) == limit:
+                break
+        return messages
+
+    def __redrive(self, queue: _Queue, message: _Message) -> bool:
+        """
+        受信回数がmaxReceiveCountに達したメッセージをDLQへ移動する
+        Move a message that reached maxReceiveCount to the dead-letter queue
+        """
+        if (redrive := queue.redrive) is None or message.receive_count < redrive[1]:
+            return False
+        target = next((q for q in self.__queues.values() if q.arn == redrive[0]), None)
+        if target is None:
+            return False
+        self.__remove(queue, message)
+        message.receive_count = 0
+        message.receipt_handle = ""
+        message.version += 1
+        message.visible_at = self.clock()
+        if target.fifo:
+            message.sequence_number = f"{next(target.sequence):020d}"
+            message.group_id = message.group_id or "default"
+        self.__append(target, message)
+        return True
+
+    def __remove(self, queue: _Queue, message: _Message) -> None:
+        del queue.messages[message.message_id]
+        if queue.fifo:
+            ids = queue.groups[message.group_id]
+            ids.remove(message.message_id)
+            if not ids:
+                del queue.groups[message.group_id]
+
+    def __find(self, queue: _Queue, receipt_handle: str, operation: str):
+        name, _, rest = receipt_handle.partition("/")
+        message_id, _, receive_count = rest.partition("/")
+        if name != queue.name or not message_id or not receive_count.isdigit():
+            raise _error(
+                operation,
+                RECEIPT_HANDLE_IS_INVALID,
+                f"The input receipt handle {receipt_handle!r} is not valid.",
+            )
+        return queue.messages.get(message_id)
+
+    def __delete(self, queue: _Queue, receipt_handle: str, operation: str) -> None:
+        # 削除済みのメッセージの削除はSQSと同様に成功させる
+        if (message := self.__find(queue, receipt_handle, operation)) is not None:
+            self.__remove(queue, message)
+
+    def __change_visibility(
+        self, queue: _Queue, receipt_handle: str, timeout: int, operation: str
+    ) -> None:
+        if not 0 <= int(timeout) <= MAX_VISIBILITY_TIMEOUT:
+            raise _error(
+                operation,
+                INVALID_PARAMETER_VALUE,
+                f"VisibilityTimeout must be between 0 and {MAX_VISIBILITY_TIMEOUT}.",
+            )
+        message = self.__find(queue, receipt_handle, operation)
+        now = self.clock()
+        if (
+            message is None
+            or message.receipt_handle != receipt_handle
+            or not message.in_flight(now)
+        ):
+            raise _error(
+                operation,
+                MESSAGE_NOT_INFLIGHT,
+                "Message does not exist or is not available for visibility timeout change.",
+            )
+        self.__hide(queue, message, now + int(timeout))
+
+
+def _failed(id_: str, e: ClientError) -> dict[str, Any]:
+    error = e.response["Error"]
+    return {
+        "Id": id_,
+        "SenderFault": True,
+        "Code": error["Code"],
+        "Message": error["Message"],
+    }
+
+
+def _sent(message_id: str, body: str, sequence_number: str) -> dict[str, Any]:
+    result = {
+        "MessageId": message_id,
+        "MD5OfMessageBody": md5(body.encode("utf-8")).hexdigest(),
+    }
+    if sequence_number:
+        result["SequenceNumber"] = sequence_number
+    return result
+
+
+def _selected(name: str, names: list[str]) -> bool:
+    for selector in names:
+        if selector in ("All", ".*", name):
+            return True
+        if selector.endswith(".*") and name.startswith(selector[:-1]):
+            return True
+    return False
+
+
+def _response(
+    message: _Message, attribute_names: list[str], message_attribute_names: list[str]
+) -> dict[str, Any]:
+    attributes = {
+        "SentTimestamp": str(message.sent_timestamp),
+        "ApproximateReceiveCount": str(message.receive_count),
+        "ApproximateFirstReceiveTimestamp": str(message.first_received_at),
+        **message.system_attributes,
+    }
+    if message.group_id:
+        attributes["MessageGroupId"] = message.group_id
+    if message.deduplication_id:
+        attributes["MessageDeduplicationId"] = message.deduplication_id
+    if message.sequence_number:
+        attributes["SequenceNumber"] = message.sequence_number
+    response: dict[str, Any] = {
+        "MessageId": message.message_id,
+        "ReceiptHandle": message.receipt_handle,
+        "MD5OfBody": md5(message.body.encode("utf-8")).hexdigest(),
+        "Body": message.body,
+    }
+    if attributes := {
+        k: v for k, v in attributes.items() if _selected(k, attribute_names)
+    }:
+        response["Attributes"] = attributes
+    if message_attributes := {
+        name: dict(value)
+        for name, value in message.message_attributes.items()
+        if _selected(name, message_attribute_names)
+    }:
+        response["MessageAttributes"] = message_attributes
+    return response
@@ -0,0 +1,454 @@
+from __future__ import annotations
+
+import os
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from logging import getLogger
+from math import inf
+from threading import Event, Lock, Thread
+from typing import Callable, NamedTuple, Protocol, TypeVar
+
+logger = getLogger(__name__)
+
+NAMESPACE = "sqs_polling"
+
+# 処理時間向けのバケット(秒)
+LATENCY_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+# 可視性タイムアウトの残り時間向けのバケット(秒)
+DEADLINE_BUCKETS = (0.0, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0, 43200.0)
+# 1回の受信で取得した件数向けのバケット
+RECEIVE_BUCKETS = (0.0, 1.0, 2.0, 5.0, 10.0)
+
+TLabels = tuple[str, ...]
+# (メトリクス名, 操作, 値, ラベル)
+TRecord = tuple[str, str, float, TLabels]
+
+# ワーカープロセスで記録した値を親プロセスへ送る関数
+_forwarder: Callable[[TRecord], None] | None = None
+
+
+def forward_to(send: Callable[[TRecord], None] | None) -> None:
+    """
+    このプロセスで記録した値をsendにも渡す(ワーカープロセスから親プロセスへ送るため)
+    Also pass every update recorded in this process to ``send``, so worker
+    processes can report to the parent. None stops forwarding.
+    """
+    global _forwarder
+    _forwarder = send
+
+
+class Sample(NamedTuple):
+    name: str
+    labels: dict[str, str]
+    value: float
+
+
+class MetricFamily(NamedTuple):
+    name: str
+    type: str
+    help: str
+    samples: list[Sample]
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, help: str, labelnames: TLabels = ()) -> None:
+        self.name = f"{NAMESPACE}_{name}"
+        self.help = help
+        self.labelnames = labelnames
+        self._lock = Lock()
+
+    def _labels(self, values: TLabels) -> dict[str, str]:
+        return dict(zip(self.labelnames, values))
+
+    def _forward(self, op: str, value: float, labels: TLabels) -> None:
+        if _forwarder is None:
+            return
+        try:
+            _forwarder((self.name, op, value, labels))
+        except Exception as e:
+            logger.error(e, exc_info=True)
+
+    def collect(self) -> MetricFamily:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: TLabels = ()) -> None:
+        super().__init__(name, help, labelnames)
+        self.__values: dict[TLabels, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self.__values[labels] = self.__values.get(labels, 0.0) + amount
+        self._forward("inc", amount, labels)
+
+    def collect(self) -> MetricFamily:
+        with self._lock:
+            values = list(self.__values.items())
+        samples = [
+            Sample(f"{self.name}_total", self._labels(labels), value)
+            for labels, value in values
+        ]
+        return MetricFamily(self.name, self.type, self.help, samples)
+
+
+class Gauge(_Metric):
+    """
+    値を設定するか、収集時に呼び出す関数を登録するゲージ
+    A gauge that is either set or read from a function at collection time
+    """
+
+    type = "gauge"
+
+    def __init__(self, name: str, help: str, labelnames: TLabels = ()) -> None:
+        super().__init__(name, help, labelnames)
+        self.__values: dict[TLabels, float | Callable[[], float]] = {}
+
+    def set(self, value: float, *labels: str) -> None:
+        with self._lock:
+            self.__values[labels] = value
+        self._forward("set", value, labels)
+
+    def set_function(self, function: Callable[[], float], *labels: str) -> None:
+        with self._lock:
+            self.__values[labels] = function
+
+    def remove(self, *labels: str) -> None:
+        with self._lock:
+            self.__values.pop(labels, None)
+
+    def collect(self) -> MetricFamily:
+        with self._lock:
+            values = list(self.__values.items())
+        samples = []
+        for labels, value in values:
+            try:
+                current = value() if callable(value) else value
+            except Exception as e:
+                logger.error(e, exc_info=True)
+                continue
+            samples.append(Sample(self.name, self._labels(labels), float(current)))
+        return MetricFamily(self.name, self.type, self.help, samples)
+
+
+class Histogram(_Metric):
+    """
+    固定バケットのヒストグラム
+    観測は二分探索と加算のみで、累積値の計算は収集時に行う
+
+    Histogram with fixed buckets. An observation is a bisect and two
+    additions; cumulative bucket counts are only built at collection time.
+    """
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: TLabels = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # ラベルごとの[バケットごとの件数..., +Infの件数], 合計
+        self.__values: dict[TLabels, tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self.__values.get(labels) or self.__new(labels)
+            counts[i] += 1
+            total[0] += value
+        self._forward("observe", value, labels)
+
+    def __new(self, labels: TLabels) -> tuple[list[int], list[float]]:
+        value = ([0] * (len(self.buckets) + 1), [0.0])
+        self.__values[labels] = value
+        return value
+
+    def collect(self) -> MetricFamily:
+        with self._lock:
+            values = [
+                (labels, list(counts), total[0])
+                for labels, (counts, total) in self.__values.items()
+            ]
+        samples = []
+        for labels, counts, total in values:
+            base = self._labels(labels)
+            cumulative = 0
+            for bound, count in zip((*self.buckets, inf), counts):
+                cumulative += count
+                le = "+Inf" if bound == inf else _format_value(bound)
+                samples.append(
+                    Sample(f"{self.name}_bucket", {**base, "le": le}, cumulative)
+                )
+            samples.append(Sample(f"{self.name}_sum", base, total))
+            samples.append(Sample(f"{self.name}_count", base, cumulative))
+        return MetricFamily(self.name, self.type, self.help, samples)
+
+
+class Registry:
+    def __init__(self) -> None:
+        self.__metrics: dict[str, _Metric] = {}
+        self.__lock = Lock()
+
+    def register(self, metric: _Metric) -> None:
+        with self.__lock:
+            self.__metrics[metric.name] = metric
+
+    def get(self, name: str) -> _Metric | None:
+        with self.__lock:
+            return self.__metrics.get(name)
+
+    def apply(self, record: TRecord) -> None:
+        """
+        他のプロセスから転送された値を記録する
+        Record an update forwarded from another process
+        """
+        name, op, value, labels = record
+        metric = self.get(name)
+        match metric, op:
+            case Counter(), "inc":
+                metric.inc(*labels, amount=value)
+            case Gauge(), "set":
+                metric.set(value, *labels)
+            case Histogram(), "observe":
+                metric.observe(value, *labels)
+            case _:
+                logger.warning("Unknown metric update", extra={"metric": name})
+
+    def collect(self) -> list[MetricFamily]:
+        with self.__lock:
+            metrics = list(self.__metrics.values())
+        return [metric.collect() for metric in metrics]
+
+    def reset_locks(self) -> None:
+        """
+        fork時に他のスレッドが持っていたロックはfork先で解放されないため作り直す
+        Recreate the locks after a fork; a lock held by another thread of the
+        parent would never be released in the child
+        """
+        self.__lock = Lock()
+        for metric in self.__metrics.values():
+            metric._lock = Lock()
+
+
+REGISTRY = Registry()
+os.register_at_fork(after_in_child=REGISTRY.reset_locks)
+
+
+TMetric = TypeVar("TMetric", bound=_Metric)
+
+
+def _register(metric: TMetric) -> TMetric:
+    REGISTRY.register(metric)
+    return metric
+
+
+receive_duration = _register(
+    Histogram(
+        "receive_duration_seconds", "Duration of ReceiveMessage calls.", ("queue",)
+    )
+)
+receive_messages = _register(
+    Histogram(
+        "receive_messages",
+        "Messages returned by one ReceiveMessage call.",
+        ("queue",),
+        RECEIVE_BUCKETS,
+    )
+)
+receive_errors = _register(
+    Counter("receive_errors", "ReceiveMessage calls that failed.", ("queue",))
+)
+wait_duration = _register(
+    Histogram(
+        "wait_duration_seconds",
+        "Time from receive until a worker picked the message up.",
+        ("queue",),
+    )
+)
+handler_duration = _register(
+    Histogram(
+        "handler_duration_seconds",
+        "Handler duration per message by result.",
+        ("queue", "result"),
+    )
+)
+visibility_remaining = _register(
+    Histogram(
+        "visibility_remaining_seconds",
+        "Time left before the visibility timeout when the handler finished.",
+        ("queue",),
+        DEADLINE_BUCKETS,
+    )
+)
+ack_duration = _register(
+    Histogram(
+        "ack_duration_seconds",
+        "Duration of the delete, visibility and DLQ batch calls.",
+        ("queue", "action"),
+    )
+)
+ack_entries = _register(
+    Counter(
+        "ack_entries",
+        "Batch entries by action and outcome (success, failed, dropped).",
+        ("queue", "action", "outcome"),
+    )
+)
+buffer_messages = _register(
+    Gauge(
+        "buffer_messages",
+        "Messages held by the prefetch buffer (waiting, in_flight, reserved).",
+        ("queue", "state"),
+    )
+)
+workers_in_use = _register(
+    Gauge("workers_in_use", "Workers running a handler.", ("queue",))
+)
+workers_limit = _register(
+    Gauge("workers_limit", "Current concurrency limit.", ("queue",))
+)
+
+
+def _format_value(value: float) -> str:
+    if value == inf:
+        return "+Inf"
+    if value == -inf:
+        return "-Inf"
+    if float(value).is_integer():
+        return f"{value:.1f}"
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def render(
+    families: list[MetricFamily] | None = None, *, openmetrics: bool = False
+) -> str:
+    """
+    Prometheusのテキスト形式(openmetrics=TrueでOpenMetrics形式)に変換する
+    Render metrics in the Prometheus text format, or OpenMetrics with ``openmetrics``
+    """
+    if families is None:
+        families = REGISTRY.collect()
+    lines = []
+    for family in families:
+        # Prometheusのテキスト形式ではcounterの名前に_totalを含める
+        name = family.name
+        if family.type == "counter" and not openmetrics:
+            name = f"{name}_total"
+        lines.append(f"# HELP {name} {family.help}")
+        lines.append(f"# TYPE {name} {family.type}")
+        for sample in family.samples:
+            labels = ",".join(f'{k}="{_escape(v)}"' for k, v in sample.labels.items())
+            labels = f"{{{labels}}}" if labels else ""
+            lines.append(f"{sample.name}{labels} {_format_value(sample.value)}")
+    if openmetrics:
+        lines.append("# EOF")
+    return "\n".join(lines) + "\n"
+
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+OPENMETRICS_CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        openmetrics = "application/openmetrics-text" in self.headers.get("Accept", "")
+        body = render(openmetrics=openmetrics).encode("utf-8")
+        self.send_response(200)
+        self.send_header(
+            "Content-Type",
+            OPENMETRICS_CONTENT_TYPE if openmetrics else PROMETHEUS_CONTENT_TYPE,
+        )
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        # スクレイプごとのアクセスログは出力しない
+        pass
+
+
+def start_http_server(port: int, addr: str = "") -> ThreadingHTTPServer:
+    """
+    /metricsでメトリクスを返すHTTPサーバーをデーモンスレッドで起動する
+    Serve the metrics on ``/metrics`` from a daemon thread
+    """
+    server = ThreadingHTTPServer((addr, port), _MetricsHandler)
+    server.daemon_threads = True
+    Thread(target=server.serve_forever, name="sqs-polling-metrics", daemon=True).start()
+    logger.info("Metrics server started", extra={"addr": addr, "port": port})
+    return server
+
+
+class Exporter(Protocol):
+    def export(self, families: list[MetricFamily]) -> None:
+        ...
+
+
+class PeriodicExporter:
+    """
+    一定間隔でメトリクスを収集してexporterへ渡す
+    停止時にも最後の値を渡す
+
+    Collect the metrics every ``interval_seconds`` and pass them to an
+    exporter, for push gateways, StatsD or an OpenTelemetry bridge. The last
+    values are exported once more on ``stop``.
+    """
+
+    def __init__(self, exporter: Exporter, interval_seconds: float = 10.0) -> None:
+        self.exporter = exporter
+        self.interval_seconds = interval_seconds
+        self.__stop = Event()
+        self.__thread: Thread | None = None
+
+    def start(self) -> None:
+        if self.__thread is None:
+            self.__thread = Thread(
+                target=self.__run, name="sqs-polling-metrics-exporter", daemon=True
+            )
+            self.__thread.start()
+
+    def stop(self) -> None:
+        self.__stop.set()
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+        self.export()
+
+    def export(self) -> None:
+        try:
+            self.exporter.export(REGISTRY.collect())
+        except Exception as e:
+            logger.error(e, exc_info=True)
+
+    def __run(self) -> None:
+        while not self.__stop.wait(self.interval_seconds):
+            self.export()
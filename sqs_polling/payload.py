@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import json
+import tempfile
+from logging import getLogger
+from mmap import ACCESS_READ, mmap
+from typing import IO, TYPE_CHECKING, Any
+
+from .client import get_client
+
+if TYPE_CHECKING:
+    from .handler import Polling
+
+logger = getLogger(__name__)
+
+# Amazon SQS Extended Client Libraryが本文に設定するS3のポインター
+# ["software.amazon.payloadoffloading.PayloadS3Pointer", {"s3BucketName": ..., "s3Key": ...}]
+POINTER_CLASS = "software.amazon.payloadoffloading.PayloadS3Pointer"
+_POINTER_PREFIX = f'["{POINTER_CLASS}"'
+# 大きなペイロードを読み込む単位
+CHUNK_SIZE = 1024 * 1024
+
+
+def is_pointer(body: Any) -> bool:
+    return isinstance(body, str) and body.startswith(_POINTER_PREFIX)
+
+
+class S3Payload:
+    """
+    S3に退避された本文
+    spill_bytesを超える場合はメモリに載せず、一時ファイルに書き出してmmapで参照する
+
+    A message body offloaded to S3 by the extended client. Bodies larger than
+    ``spill_bytes`` are streamed to a temporary file and handed out as a
+    read-only ``mmap`` instead of being held in memory.
+    """
+
+    __slots__ = ("bucket", "key", "aws_profile", "__file", "__mmap")
+
+    def __init__(self, bucket: str, key: str, aws_profile: dict[str, Any]) -> None:
+        self.bucket = bucket
+        self.key = key
+        self.aws_profile = aws_profile
+        self.__file: IO[bytes] | None = None
+        self.__mmap: mmap | None = None
+
+    @classmethod
+    def from_pointer(cls, body: str, aws_profile: dict[str, Any]) -> S3Payload:
+        _, pointer = json.loads(body)
+        return cls(pointer["s3BucketName"], pointer["s3Key"], aws_profile)
+
+    def read(self, spill_bytes: int = 0) -> str | mmap:
+        s3 = get_client(self.aws_profile, service="s3")
+        response = s3.get_object(Bucket=self.bucket, Key=self.key)
+        stream = response["Body"]
+        if spill_bytes <= 0 or response["ContentLength"] <= spill_bytes:
+            return stream.read().decode("utf-8")
+        file = tempfile.TemporaryFile()
+        try:
+            for chunk in stream.iter_chunks(CHUNK_SIZE):
+                file.write(chunk)
+            file.flush()
+            self.__mmap = mmap(file.fileno(), 0, access=ACCESS_READ)
+        except BaseException:
+            file.close()
+            raise
+        self.__file = file
+        logger.debug(
+            "Payload spilled to a file",
+            extra={"bucket": self.bucket, "key": self.key},
+        )
+        return self.__mmap
+
+    def close(self) -> None:
+        if self.__mmap is not None:
+            try:
+                self.__mmap.close()
+            except BufferError:
+                # ハンドラーが参照を保持している場合はGCに任せる
+                logger.warning(
+                    "Payload is still referenced",
+                    extra={"bucket": self.bucket, "key": self.key},
+                )
+            self.__mmap = None
+        if self.__file is not None:
+            self.__file.close()
+            self.__file = None
+
+    def delete(self) -> None:
+        s3 = get_client(self.aws_profile, service="s3")
+        s3.delete_object(Bucket=self.bucket, Key=self.key)
+        logger.debug("Payload deleted", extra={"bucket": self.bucket, "key": self.key})
+
+
+def fetch(p: Polling, body: str) -> tuple[str | mmap, S3Payload]:
+    payload = S3Payload.from_pointer(body, p.aws_profile)
+    return payload.read(p.payload_spill_bytes), payload
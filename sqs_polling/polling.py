@@ -1,39 +1,97 @@
 from __future__ import annotations
 
+import os
 import traceback
-from asyncio import Event, all_tasks, current_task, gather, get_event_loop
-from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from asyncio import all_tasks, current_task, gather
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
 from functools import wraps
-from itertools import groupby
+from itertools import zip_longest
 from logging import getLogger
+from mmap import mmap
+from multiprocessing.util import Finalize
+from threading import Event, Lock, Thread
+from time import monotonic, time
 from typing import TYPE_CHECKING, Any, Callable
 
-import boto3
-
-from .exceptions import RejectDLQException, RejectException, RetryException
+from .ack import AckBuffer, BaseAckBuffer
+from .autoscale import AutoScaler, ConcurrencyLimit
+from .buffer import FifoBuffer, PrefetchBuffer, _group_id
+from .client import DEFAULT_MAX_POOL_CONNECTIONS, get_client
+from .compression import content_encoding, decompress_body
+from .context import RECEIVED_AT, BatchMessage, MessageContext, stamp_received_at
+from .dlq import dlq_entry
+from .envelope import unwrap
+from .exceptions import (
+    BasePollingException,
+    RejectDLQException,
+    RejectException,
+    RetryException,
+)
 from .execute_result import ExecuteResult
-from .handler import Polling, TDecode, THandle, TMessageBody, set_handler
-from .signal import handler_result, missing_receipt_handle
+from .handler import Polling, TBatchResult, TDecode, THandle, TMessageBody, set_handler
+from .lease import LeaseManager
+from .metrics import (
+    buffer_messages,
+    handler_duration,
+    receive_duration,
+    receive_errors,
+    receive_messages,
+    visibility_remaining,
+    wait_duration,
+    workers_in_use,
+    workers_limit,
+)
+from .payload import S3Payload, fetch, is_pointer
+from .signal import (
+    buffer_occupancy,
+    close_dispatcher,
+    handler_result,
+    missing_receipt_handle,
+)
 from .signal import shutdown as shutdown_signal
+from .tracing import (
+    batch_span,
+    process_span,
+    receive_span,
+    set_message_count,
+    set_result,
+    span,
+    trace_context,
+)
 
 if TYPE_CHECKING:
-    from asyncio import AbstractEventLoop
-
     from mypy_boto3_sqs import SQSClient
-    from mypy_boto3_sqs.type_defs import MessageAttributeValueTypeDef, MessageTypeDef
+    from mypy_boto3_sqs.type_defs import MessageTypeDef
+
+    from .aio import AsyncEngine
+    from .envelope import TEnvelope
+    from .scheduler import Scheduler
 
 ev = Event()
 logger = getLogger(__name__)
 
 
 async def shutdown(
-    loop, executor: ProcessPoolExecutor | ThreadPoolExecutor, signal=None
+    loop,
+    executor: ProcessPoolExecutor
+    | ThreadPoolExecutor
+    | AsyncEngine
+    | list[ProcessPoolExecutor | ThreadPoolExecutor | AsyncEngine],
+    signal=None,
 ) -> None:
     ev.set()
     if signal:
         logger.info(f"received exit signal {signal.name}...")
     shutdown_signal.send()
-    executor.shutdown(wait=True, cancel_futures=False)
+    executors = executor if isinstance(executor, list) else [executor]
+    for e in executors:
+        if isinstance(e, (ProcessPoolExecutor, ThreadPoolExecutor)):
+            e.shutdown(wait=True, cancel_futures=False)
+        else:
+            await e.aclose()
+    _stop_lease_managers()
+    _close_ack_buffers()
+    close_dispatcher()
     tasks = [t for t in all_tasks() if t is not current_task()]
 
     [task.cancel() for task in tasks]
@@ -60,6 +118,29 @@ def polling(
     aws_profile: dict[str, Any] = {},
     max_retry_count=0,
     decoder: TDecode[TMessageBody] = None,
+    ack_interval_seconds: float = 0.1,
+    continuous: bool = False,
+    wait_time_seconds: int = 20,
+    max_backoff_seconds: float = 20.0,
+    receivers: int = 1,
+    prefetch: int = 0,
+    prefetch_bytes: int = 0,
+    extend_visibility: bool = False,
+    max_lease_seconds: float = 43200,
+    weight: int = 1,
+    priority: int = 0,
+    autoscale: bool = False,
+    min_workers: int = 1,
+    batch: bool = False,
+    batch_size: int = 10,
+    batch_bytes: int = 0,
+    batch_window_seconds: float = 0.0,
+    envelope: TEnvelope | None = None,
+    payload_offload: bool = False,
+    payload_spill_bytes: int = 16 * 1024 * 1024,
+    payload_delete: bool = True,
+    compression_attribute: str = "",
+    tracing: bool = False,
 ) -> Callable[[THandle[TMessageBody]], None]:
     def inner(func: THandle):
         @wraps(func)
@@ -77,87 +158,399 @@ def polling(
                 aws_profile=aws_profile,
                 max_retry_count=max_retry_count,
                 decoder=decoder,
+                ack_interval_seconds=ack_interval_seconds,
+                continuous=continuous,
+                wait_time_seconds=wait_time_seconds,
+                max_backoff_seconds=max_backoff_seconds,
+                receivers=receivers,
+                prefetch=prefetch,
+                prefetch_bytes=prefetch_bytes,
+                extend_visibility=extend_visibility,
+                max_lease_seconds=max_lease_seconds,
+                weight=weight,
+                priority=priority,
+                autoscale=autoscale,
+                min_workers=min_workers,
+                batch=batch,
+                batch_size=batch_size,
+                batch_bytes=batch_bytes,
+                batch_window_seconds=batch_window_seconds,
+                envelope=envelope,
+                payload_offload=payload_offload,
+                payload_spill_bytes=payload_spill_bytes,
+                payload_delete=payload_delete,
+                compression_attribute=compression_attribute,
+                tracing=tracing,
             )
-            set_handler(func.__name__, p)
+            set_handler(p.qualified_name, p)
 
         return _inner()
 
     return inner
 
 
-_session: SQSClient | None = None
+def _get_session(
+    aws_profile_dict: dict[str, Any],
+    max_pool_connections: int = DEFAULT_MAX_POOL_CONNECTIONS,
+) -> SQSClient:
+    return get_client(aws_profile_dict, max_pool_connections)
 
 
-def _get_session(aws_profile_dict: dict[str, Any]) -> SQSClient:
-    global _session
+def _pool_size(p: Polling) -> int:
+    # ワーカー、受信ループ、削除・可視性延長のスレッドが同時に接続する
+    return p.max_workers + p.receivers + 2
 
-    if _session is None:
-        _session = boto3.client("sqs", **aws_profile_dict)
 
-    return _session
+_ack_buffers: dict[str, AckBuffer] = {}
+_ack_buffers_lock = Lock()
 
 
-def _handler(p: Polling) -> ProcessPoolExecutor | ThreadPoolExecutor:
-    sqs = _get_session(p.aws_profile)
+def _get_ack_buffer(p: Polling) -> AckBuffer:
+    with _ack_buffers_lock:
+        buffer = _ack_buffers.get(p.queue_url)
+        if buffer is None:
+            buffer = AckBuffer(
+                _get_session(p.aws_profile),
+                p.queue_url,
+                dead_letter_queue_url=p.dead_later_queue_url,
+                interval_seconds=p.ack_interval_seconds,
+            )
+            _ack_buffers[p.queue_url] = buffer
+            # ワーカープロセスの終了時にも未送信分を送信する
+            Finalize(None, buffer.close, exitpriority=10)
+        return buffer
+
+
+def _close_ack_buffers() -> None:
+    with _ack_buffers_lock:
+        buffers = list(_ack_buffers.values())
+    for buffer in buffers:
+        buffer.close()
+
+
+def _reset_ack_buffers() -> None:
+    # fork先ではフラッシュ用スレッドが存在しないため作り直す
+    global _ack_buffers_lock
+    _ack_buffers.clear()
+    _ack_buffers_lock = Lock()
+
+
+os.register_at_fork(after_in_child=_reset_ack_buffers)
+
+
+_lease_managers: dict[str, LeaseManager] = {}
+
+
+def _get_lease_manager(p: Polling) -> LeaseManager | None:
+    return _lease_managers.get(p.queue_url)
+
+
+def _start_lease_manager(p: Polling, sqs: SQSClient) -> None:
+    # まとめる間に保持しているメッセージも期限切れにならないよう延長する
+    extend = p.extend_visibility or (p.batch and p.batch_window_seconds > 0)
+    if extend and p.queue_url not in _lease_managers:
+        lease = LeaseManager(
+            p.queue_url,
+            p.visibility_timeout,
+            max_lease_seconds=p.max_lease_seconds,
+        )
+        lease.start(sqs)
+        _lease_managers[p.queue_url] = lease
+
+
+def _stop_lease_managers() -> None:
+    for lease in _lease_managers.values():
+        lease.stop()
+
+
+def _handler(
+    p: Polling, scheduler: Scheduler | None = None
+) -> ProcessPoolExecutor | ThreadPoolExecutor | AsyncEngine:
+    if p.is_async:
+        if scheduler is not None:
+            raise ValueError("A scheduler can not be used with async handlers.")
+        from .aio import _aio_handler
+
+        return _aio_handler(p)
+    sqs = _get_session(p.aws_profile, _pool_size(p))
     p.set_queue_url(sqs)
     p.set_dead_later_queue_url(sqs)
-    Executor = ProcessPoolExecutor if p.process_worker else ThreadPoolExecutor
-    executor = Executor(max_workers=p.max_workers + 1)
-    loop = get_event_loop()
-    loop.run_in_executor(
-        executor,
-        _polling,
-        loop,
-        executor,
-        p,
-    )
+    _start_lease_manager(p, sqs)
+    if scheduler is not None:
+        scheduler.register(p)
+    if p.process_worker:
+        from .memory import MemoryTransport
+        from .worker import ProcessWorkerPool
+
+        if isinstance(sqs, MemoryTransport):
+            raise ValueError("MemoryTransport can not be used with process workers.")
+
+        # 受信ループはプロセスへ渡せないため、ワーカーはハンドラーの実行のみに使う
+        executor = ProcessWorkerPool(p, p.max_workers)
+        submit = executor.submit_batch if p.batch else executor.submit_message
+    else:
+        # 受信ループは専用スレッドで動かすため、ワーカーはハンドラーの実行のみに使う
+        executor = ThreadPoolExecutor(max_workers=p.max_workers)
+
+        def submit(messages: list[MessageTypeDef]) -> Future:
+            if p.batch:
+                return executor.submit(
+                    _execute_batch, p, messages, p.exception_deletable, p.aws_profile
+                )
+            return executor.submit(
+                _execute,
+                p,
+                messages[0],
+                p.exception_deletable,
+                p.aws_profile,
+            )
+
+    # 先読み分を含め、全ての受信ループで共有するバッファ
+    Buffer = FifoBuffer if p.queue_url.endswith(".fifo") else PrefetchBuffer
+    buffer = Buffer(p.max_workers * _batch_size(p) + p.prefetch, p.prefetch_bytes)
+    Thread(
+        target=_dispatch,
+        args=(submit, buffer, p, scheduler),
+        name=f"sqs-polling-dispatcher-{p.queue_url}",
+        daemon=True,
+    ).start()
+    receive = _continuous_polling if p.continuous else _polling
+    for i in range(p.receivers):
+        Thread(
+            target=receive,
+            args=(buffer, p, scheduler),
+            name=f"sqs-polling-receiver-{i}-{p.queue_url}",
+            daemon=True,
+        ).start()
     return executor
 
 
-def _polling(
-    loop: AbstractEventLoop,
-    executor: ThreadPoolExecutor | ProcessPoolExecutor,
+def _batch_size(p: Polling) -> int:
+    return p.batch_size if p.batch else 1
+
+
+def _take(buffer: PrefetchBuffer, p: Polling) -> list[MessageTypeDef]:
+    if p.batch:
+        return buffer.get_many(
+            p.batch_size,
+            timeout=1.0,
+            max_bytes=p.batch_bytes,
+            window_seconds=p.batch_window_seconds,
+        )
+    message = buffer.get(timeout=1.0)
+    return [] if message is None else [message]
+
+
+def _dispatch(
+    submit: Callable[[list[MessageTypeDef]], Future],
+    buffer: PrefetchBuffer,
     p: Polling,
+    scheduler: Scheduler | None = None,
 ):
-    def _submit(message: MessageTypeDef):
-        f = executor.submit(
-            _execute,
-            p,
-            message,
-            p.exception_deletable,
-            p.aws_profile,
+    """
+    バッファからメッセージを取り出し、空きワーカーに渡す
+    バッチモードでは1つのワーカーに複数のメッセージをまとめて渡す
+
+    Hand buffered messages to the executor as workers become free. In batch
+    mode one worker gets a list of messages.
+    """
+    workers = ConcurrencyLimit(p.max_workers)
+    scaler: AutoScaler | None = None
+    if p.autoscale:
+        workers.limit = min(p.min_workers, p.max_workers)
+        buffer.resize(workers.limit * _batch_size(p) + p.prefetch)
+        scaler = AutoScaler(p, workers, buffer)
+        scaler.start()
+    lease = _get_lease_manager(p)
+    _register_gauges(p, buffer, workers)
+
+    def _done(messages: list[MessageTypeDef], started_at: float):
+        def _callback(f: Future):
+            results: list[ExecuteResult] = []
+            if not f.cancelled() and f.exception() is None:
+                results = f.result() if p.batch else [f.result()]
+            finished_at = time()
+            # 受信から処理開始までの待機時間
+            wait_seconds = started_at - messages[0].get(RECEIVED_AT, started_at)
+            wait_duration.observe(wait_seconds, p.queue_url)
+            if scheduler is not None:
+                scheduler.release(p, wait_seconds)
+            if scaler is not None:
+                scaler.record(
+                    finished_at - started_at,
+                    not results or any(r != ExecuteResult.Deletable for r in results),
+                )
+            for message, result in zip_longest(messages, results):
+                handler_duration.observe(
+                    finished_at - started_at,
+                    p.queue_url,
+                    "Error" if result is None else str(result),
+                )
+                visibility_remaining.observe(
+                    _visibility_remaining(p, lease, message, finished_at),
+                    p.queue_url,
+                )
+                if lease is not None:
+                    lease.release(message["ReceiptHandle"])
+                if isinstance(buffer, FifoBuffer) and result == ExecuteResult.Retry:
+                    # 再処理するメッセージより後続が先に処理されないよう、同じグループの待機分も戻す
+                    _release_messages(p, buffer.drop_group(_group_id(message)))
+            workers.release()
+            for message in messages:
+                buffer.task_done(message)
+
+        return _callback
+
+    messages: list[MessageTypeDef] = []
+    while not ev.is_set():
+        if not messages:
+            if not workers.acquire(timeout=1.0):
+                continue
+            messages = _take(buffer, p)
+            if not messages:
+                workers.release()
+                continue
+        # 他のキューと共有する枠の順番が来るまでメッセージを保持したまま待つ
+        if scheduler is not None and not scheduler.acquire(p, timeout=1.0):
+            continue
+        try:
+            f = submit(messages)
+        except RuntimeError:
+            # shutdown後は処理せずにキューへ戻す
+            if scheduler is not None:
+                scheduler.release(p)
+            break
+        f.add_done_callback(_done(messages, time()))
+        messages = []
+
+    if scaler is not None:
+        scaler.stop()
+    if messages:
+        workers.release()
+        for message in messages:
+            buffer.task_done(message)
+        _release_messages(p, messages)
+    # 処理を開始していないメッセージは即時再処理できるように戻す
+    _release_messages(p, buffer.close())
+
+
+def _register_gauges(
+    p: Polling, buffer: PrefetchBuffer, workers: ConcurrencyLimit
+) -> None:
+    # 値は収集時に読み出すため、メッセージごとの処理には影響しない
+    for state in ("waiting", "in_flight", "reserved"):
+        buffer_messages.set_function(
+            lambda state=state: buffer.stats()[state], p.queue_url, state
         )
-        return f
+    workers_in_use.set_function(lambda: workers.in_use, p.queue_url)
+    workers_limit.set_function(lambda: workers.limit, p.queue_url)
 
-    sqs = _get_session(p.aws_profile)
 
-    messages = _sqs_receive(
-        sqs, p.queue_url, p.visibility_timeout, p.max_number_of_messages
-    )
-    if len(messages) > 0:
-        if p.queue_url.endswith(".fifo"):
-            grouped_messages = groupby(
-                messages, key=lambda x: x.get("Attributes", {}).get("MessageGroupId")
+def _visibility_remaining(
+    p: Polling, lease: LeaseManager | None, message: MessageTypeDef, now: float
+) -> float:
+    """
+    ハンドラーの終了時点で可視性タイムアウトまでに残っていた時間
+    Seconds that were left before the message would have become visible again
+    """
+    if (
+        lease is not None
+        and (remaining := lease.remaining(message["ReceiptHandle"])) is not None
+    ):
+        return remaining
+    return message.get(RECEIVED_AT, now) + p.visibility_timeout - now
+
+
+def _release_messages(p: Polling, messages: list[MessageTypeDef]) -> None:
+    if messages:
+        ack = _get_ack_buffer(p)
+        lease = _get_lease_manager(p)
+        for message in messages:
+            if lease is not None:
+                lease.release(message["ReceiptHandle"])
+            ack.change_visibility(message["ReceiptHandle"], 0)
+
+
+def _receive_into(buffer: PrefetchBuffer, p: Polling, sqs: SQSClient, slots: int):
+    started_at = monotonic()
+    try:
+        with receive_span(p):
+            messages = _sqs_receive(
+                sqs, p.queue_url, p.visibility_timeout, slots, p.wait_time_seconds
             )
-            # メッセージグループ単位で順番に処理させる(非同期ではなく待機させる)
-            for group_id, group_messages in grouped_messages:
-                logger.info("Fifo queue", extra={"GroupId": group_id})
-                messages = list(group_messages)
-                for message in messages:
-                    f = _submit(message)
-                    f.result()
-        else:
-            [_submit(message) for message in messages]
+            set_message_count(len(messages))
+    except Exception as e:
+        logger.error(e, exc_info=True)
+        receive_errors.inc(p.queue_url)
+        messages = []
+    else:
+        receive_duration.observe(monotonic() - started_at, p.queue_url)
+        receive_messages.observe(len(messages), p.queue_url)
+    lease = _get_lease_manager(p)
+    if lease is not None:
+        for message in messages:
+            lease.track(message["ReceiptHandle"])
+    buffer.put(messages, slots)
+    buffer_occupancy.send(queue_url=p.queue_url, **buffer.stats())
+    return messages
+
+
+def _receive_limit(
+    buffer: PrefetchBuffer, p: Polling, scheduler: Scheduler | None
+) -> int:
+    if scheduler is None:
+        return p.max_number_of_messages
+    stats = buffer.stats()
+    held = stats["waiting"] + stats["in_flight"] + stats["reserved"]
+    return scheduler.receive_limit(p, p.max_number_of_messages, held)
+
+
+def _polling(buffer: PrefetchBuffer, p: Polling, scheduler: Scheduler | None = None):
+    """
+    interval_seconds毎に受信する
+    ロングポーリングでイベントループを止めないよう、受信ループ専用のスレッドで動かす
+
+    Receive every ``interval_seconds`` on a dedicated receiver thread, so a
+    long poll never blocks the event loop or the other queues' receivers.
+    """
+    sqs = _get_session(p.aws_profile)
 
     # shutdownを受け取った場合は新規ポーリングはしない
-    if not ev.is_set():
-        loop.call_later(
-            p.interval_seconds,
-            _polling,
-            loop,
-            executor,
-            p,
-        )
+    while not ev.is_set():
+        # バッファに空きがない場合と、他のキューに枠を譲っている場合は今回の受信を見送る
+        slots = buffer.reserve(_receive_limit(buffer, p, scheduler), timeout=0)
+        if slots > 0:
+            _receive_into(buffer, p, sqs, slots)
+        ev.wait(p.interval_seconds)
+
+
+def _continuous_polling(
+    buffer: PrefetchBuffer, p: Polling, scheduler: Scheduler | None = None
+):
+    """
+    バッファに空きができ次第、間隔を空けずに次の受信を行う
+    Receive again as soon as the buffer has room, backing off only on empty receives
+    """
+    sqs = _get_session(p.aws_profile)
+    backoff = 0.0
+
+    while not ev.is_set():
+        limit = _receive_limit(buffer, p, scheduler)
+        if scheduler is not None and limit == 0:
+            # 他のキューに枠を譲っている間は受信せず、割り当てが変わるまで待つ
+            scheduler.wait(timeout=1.0)
+            continue
+        # バッファに空きができるまで待機する
+        slots = buffer.reserve(limit, timeout=1.0)
+        if slots == 0:
+            continue
+        messages = _receive_into(buffer, p, sqs, slots)
+        if len(messages) > 0:
+            backoff = 0.0
+        else:
+            # 空の受信が続く場合のみ待機時間を延ばす
+            backoff = min(max(backoff * 2, p.interval_seconds), p.max_backoff_seconds)
+            ev.wait(backoff)
 
 
 def _sqs_receive(
@@ -177,7 +570,7 @@ def _sqs_receive(
         MessageAttributeNames=["All"],
     )
     if "Messages" in response:
-        messages = [m for m in response["Messages"]]
+        messages = stamp_received_at([m for m in response["Messages"]])
         logger.info("Received messages.", extra={"length": len(messages)})
     else:
         logger.info("Empty messages.")
@@ -191,55 +584,241 @@ def _execute(
     message: MessageTypeDef,
     exception_deletable: bool,
     aws_profile_dict: dict[str, Any],
-):
-    attribute = message.get("Attributes", {})
-    retry_count = int(attribute.get("ApproximateReceiveCount", 1))
-    p.retry = retry_count - 1  # 最初の受信分をマイナスする
-    if p.is_max_retry():
+) -> ExecuteResult:
+    with process_span(p, message):
+        result_type = _execute_message(
+            p, message, exception_deletable, aws_profile_dict
+        )
+        set_result(result_type)
+        return result_type
+
+
+def _execute_message(
+    p: Polling,
+    message: MessageTypeDef,
+    exception_deletable: bool,
+    aws_profile_dict: dict[str, Any],
+) -> ExecuteResult:
+    ctx = MessageContext.from_message(p, message)
+    if ctx.is_max_retry():
         # 最大リトライ回数を超えた場合は再処理せずメッセージを削除する
-        __finish_message(p, ExecuteResult.Reject, message, aws_profile_dict)
-        return
-    body = message.get("Body", "")
+        __finish_message(
+            p,
+            ExecuteResult.Reject,
+            message,
+            aws_profile_dict,
+            _pointer_payload(p, message),
+        )
+        return ExecuteResult.Reject
     result_type: ExecuteResult = ExecuteResult.Nil
+    error = ""
     handler_result_kwargs = {
         "result_type": result_type,
-        "retry_count": p.retry,
+        "retry_count": ctx.retry,
         "error_message": "",
         "stack_trace": "",
     }
     try:
-        message_attribute: dict[str, Any] | None = None
-        if _message_attribute := message.get("MessageAttributes"):
-            message_attribute = {
-                key: _get_message_attribute_value(value)
-                for key, value in _message_attribute.items()
-            }
-        p.handler(
-            p,
-            p.decorator(body) if p.decorator is not None else body,
-            message_attribute,
-            attribute.get("MessageGroupId", None),
-            attribute.get("MessageDeduplicationId", None),
-        )
+        with span(p, "decode"):
+            body = _decode_body(p, ctx, message)
+        with span(p, "handle"):
+            p.handler(
+                ctx,
+                body,
+                ctx.message_attributes,
+                ctx.message_group_id,
+                ctx.message_deduplication_id,
+            )
         result_type = ExecuteResult.Deletable
-    except RetryException:
-        result_type = ExecuteResult.Retry
-    except RejectException:
-        result_type = ExecuteResult.Reject
-    except RejectDLQException:
-        result_type = ExecuteResult.SendDLQ
     except Exception as e:
-        handler_result_kwargs["error_message"] = str(e)
-        handler_result_kwargs["stack_trace"] = traceback.format_exc()
-        logger.error(e, exc_info=True, stack_info=True)
-        result_type = (
-            ExecuteResult.Deletable if exception_deletable else ExecuteResult.Retry
-        )
+        result_type = _exception_result(e, exception_deletable)
+        error = _error_message(e)
+        if not isinstance(e, BasePollingException):
+            handler_result_kwargs["error_message"] = str(e)
+            handler_result_kwargs["stack_trace"] = traceback.format_exc()
+            logger.error(e, exc_info=True, stack_info=True)
     finally:
         handler_result_kwargs["result_type"] = result_type
         logger.debug("handler finally", extra={"result_type": str(result_type)})
         handler_result.send(**handler_result_kwargs)
-        __finish_message(p, result_type, message, aws_profile_dict)
+        with span(p, "ack"):
+            __finish_message(
+                p, result_type, message, aws_profile_dict, ctx.payload, error
+            )
+        if ctx.payload is not None:
+            ctx.payload.close()
+    return result_type
+
+
+def _decode_body(p: Polling, ctx: MessageContext, message: MessageTypeDef) -> Any:
+    body: Any = message.get("Body", "")
+    if p.envelope is not None:
+        body = unwrap(p.envelope, body, ctx)
+    # EventBridgeのdetailなど、デコード済みの本文は展開しない
+    if isinstance(body, (str, bytes)) and (
+        encoding := content_encoding(ctx.message_attributes, p.compression_attribute)
+    ):
+        body = decompress_body(body, encoding)
+    if p.payload_offload and is_pointer(body):
+        body, ctx.payload = fetch(p, body)
+    # EventBridgeのdetailはデコード済みのためdecoderを通さない
+    # S3から取得した大きな本文はmmapのままdecoderに渡す
+    if p.decorator is not None and isinstance(body, (str, bytes, mmap)):
+        return p.decorator(body)
+    return body
+
+
+def _pointer_payload(p: Polling, message: MessageTypeDef) -> S3Payload | None:
+    # ハンドラーに渡さないメッセージでも、削除時にS3の本文を消せるようにポインターだけ読む
+    body = message.get("Body", "")
+    if p.payload_offload and is_pointer(body):
+        return S3Payload.from_pointer(body, p.aws_profile)
+    return None
+
+
+def _error_message(e: BaseException) -> str:
+    return str(e) or type(e).__name__
+
+
+def _exception_result(e: BaseException, exception_deletable: bool) -> ExecuteResult:
+    if isinstance(e, RetryException):
+        return ExecuteResult.Retry
+    if isinstance(e, RejectException):
+        return ExecuteResult.Reject
+    if isinstance(e, RejectDLQException):
+        return ExecuteResult.SendDLQ
+    return ExecuteResult.Deletable if exception_deletable else ExecuteResult.Retry
+
+
+def _batch_results(
+    value: TBatchResult, items: list[BatchMessage], exception_deletable: bool
+) -> list[ExecuteResult | BaseException]:
+    """
+    バッチハンドラーの戻り値をメッセージごとの結果に変換する
+    None: 全件削除 / list: 渡した順の結果(足りない分は削除) / dict: MessageIdごとの結果(無い分は削除)
+    1件ずつ処理する場合にハンドラーが正常終了したのと同じく、NoneとNilは削除する
+
+    Map a batch handler's return value to one result per message. ``None``
+    deletes every message, a list is read in the order of ``items`` and a
+    dict is keyed by MessageId. Missing results, ``None`` and ``Nil`` delete
+    the message, as a single-message handler that returns normally would.
+    """
+    if value is None:
+        return [ExecuteResult.Deletable] * len(items)
+    if isinstance(value, dict):
+        values = [value.get(item.message_id) for item in items]
+    else:
+        values = list(value)
+        if len(values) > len(items):
+            raise ValueError(
+                f"The batch handler returned {len(values)} results "
+                f"for {len(items)} messages."
+            )
+        if len(values) < len(items):
+            logger.warning(
+                "The batch handler returned fewer results than messages.",
+                extra={"results": len(values), "messages": len(items)},
+            )
+            values += [None] * (len(items) - len(values))
+    return [
+        v
+        if isinstance(v, BaseException)
+        else ExecuteResult.Deletable
+        if v is None or v == ExecuteResult.Nil
+        else ExecuteResult(v)
+        for v in values
+    ]
+
+
+def _execute_batch(
+    p: Polling,
+    messages: list[MessageTypeDef],
+    exception_deletable: bool,
+    aws_profile_dict: dict[str, Any],
+) -> list[ExecuteResult]:
+    with batch_span(p, messages):
+        results = _execute_messages(p, messages, exception_deletable, aws_profile_dict)
+        set_result(",".join(sorted({str(r) for r in results})))
+        return results
+
+
+def _execute_messages(
+    p: Polling,
+    messages: list[MessageTypeDef],
+    exception_deletable: bool,
+    aws_profile_dict: dict[str, Any],
+) -> list[ExecuteResult]:
+    """
+    バッチハンドラーを1度だけ呼び出し、結果をメッセージごとに処理する
+    ハンドラーが例外を送出した場合は、その例外を全てのメッセージの結果とする
+
+    Call the batch handler once for all messages and settle each message by
+    its own result. An exception raised by the handler applies to every
+    message of the batch.
+    """
+    results: list[ExecuteResult] = [ExecuteResult.Nil] * len(messages)
+    items: list[BatchMessage] = []
+    indexes: list[int] = []
+    settled: list[tuple[int, BatchMessage, ExecuteResult | BaseException]] = []
+    for i, message in enumerate(messages):
+        item = BatchMessage.from_message(p, message)
+        if item.is_max_retry():
+            # 最大リトライ回数を超えたメッセージはハンドラーに渡さず削除する
+            results[i] = ExecuteResult.Reject
+            __finish_message(
+                p,
+                ExecuteResult.Reject,
+                message,
+                aws_profile_dict,
+                _pointer_payload(p, message),
+            )
+            continue
+        try:
+            with span(p, "decode"):
+                item.body = _decode_body(p, item, message)
+        except Exception as e:
+            # デコードできないメッセージはハンドラーに渡さずに例外を結果とする
+            logger.error(e, exc_info=True)
+            settled.append((i, item, e))
+            continue
+        items.append(item)
+        indexes.append(i)
+
+    if items:
+        outcomes: list[ExecuteResult | BaseException]
+        try:
+            with span(p, "handle"):
+                value = p.handler(p, items)  # type: ignore
+            outcomes = _batch_results(value, items, exception_deletable)
+        except Exception as e:
+            logger.error(e, exc_info=True, stack_info=True)
+            outcomes = [e] * len(items)
+        settled.extend(zip(indexes, items, outcomes))
+
+    for i, item, outcome in settled:
+        error = error_message = stack_trace = ""
+        if isinstance(outcome, BaseException):
+            result_type = _exception_result(outcome, exception_deletable)
+            error = _error_message(outcome)
+            if not isinstance(outcome, BasePollingException):
+                error_message = str(outcome)
+                stack_trace = "".join(traceback.format_exception(outcome))
+        else:
+            result_type = ExecuteResult(outcome)
+        results[i] = result_type
+        handler_result.send(
+            result_type=result_type,
+            retry_count=item.retry,
+            error_message=error_message,
+            stack_trace=stack_trace,
+        )
+        with span(p, "ack"):
+            __finish_message(
+                p, result_type, messages[i], aws_profile_dict, item.payload, error
+            )
+        if item.payload is not None:
+            item.payload.close()
+    return results
 
 
 def __finish_message(
@@ -247,64 +826,63 @@ def __finish_message(
     result: ExecuteResult,
     message: MessageTypeDef,
     aws_profile_dict: dict[str, Any] = {},
+    payload: S3Payload | None = None,
+    error: str = "",
 ):
-    if handle := message.get("ReceiptHandle"):
-        sqs = _get_session(aws_profile_dict)
-        match result:
-            case ExecuteResult.Deletable | ExecuteResult.Reject:
-                logger.debug(
-                    "Delete message", extra={"queue": p.queue_url, "handle": handle}
-                )
-                sqs.delete_message(QueueUrl=p.queue_url, ReceiptHandle=handle)
-            case ExecuteResult.Retry:
-                # 可視性タイムアウトを0に設定して即時再処理可能にする
-                logger.debug(
-                    "Change message visibility",
-                    extra={"queue": p.queue_url, "handle": handle},
-                )
-                sqs.change_message_visibility(
-                    QueueUrl=p.queue_url, ReceiptHandle=handle, VisibilityTimeout=0
-                )
-            case ExecuteResult.SendDLQ:
-                body = message.pop("Body", "")
-                kwargs = {}
-                attribute = message.get("Attributes", {})
-                if value := attribute.get("MessageGroupId"):
-                    kwargs["MessageGroupId"] = value
-                if value := attribute.get("MessageDeduplicationId", ""):
-                    kwargs["MessageDeduplicationId"] = value
-                logger.debug(
-                    "Send DLQ",
-                    extra={
-                        "queue": p.queue_url,
-                        "handle": handle,
-                        "dead_later_queue": p.dead_later_queue_url,
-                    },
-                )
-                # DLQへ送信
-                sqs.send_message(
-                    QueueUrl=p.dead_later_queue_url, MessageBody=body, **kwargs
-                )
-                # 現在のメッセージを削除
-                sqs.delete_message(QueueUrl=p.queue_url, ReceiptHandle=handle)
-    else:
-        missing_receipt_handle.send(result_type=result, message=message)
-        raise ValueError("Missing ReceiptHandle.")
+    # S3に退避された本文はメッセージの削除が成功した後に削除する
+    on_deleted = None
+    if payload is not None and p.payload_delete:
+        on_deleted = payload.delete
+    _acknowledge(p, _get_ack_buffer(p), result, message, error, on_deleted)
 
 
-def _get_message_attribute_value(
-    value: MessageAttributeValueTypeDef,
-) -> str | bytes | list[str] | list[bytes] | None:
+def _acknowledge(
+    p: Polling,
+    ack: BaseAckBuffer,
+    result: ExecuteResult,
+    message: MessageTypeDef,
+    error: str = "",
+    on_deleted: Callable[[], None] | None = None,
+) -> None:
     """
-    StringValue
-    BinaryValue
-    StringListValues
-    BinaryListValues
+    処理結果に応じてメッセージを削除・再処理・DLQへ転送する(スレッド版とasyncio版で共通)
+    Delete, release or dead-letter a message by its result. Shared by the
+    thread and asyncio engines, which only differ in the ack buffer.
     """
-    return value.get(
-        "StringValue",
-        value.get(
-            "BinaryValue",
-            value.get("StringListValues", value.get("BinaryListValues", None)),
-        ),
-    )
+    handle = message.get("ReceiptHandle")
+    if not handle:
+        missing_receipt_handle.send(result_type=result, message=message)
+        raise ValueError("Missing ReceiptHandle.")
+    match result:
+        case ExecuteResult.Deletable | ExecuteResult.Reject:
+            logger.debug(
+                "Delete message", extra={"queue": p.queue_url, "handle": handle}
+            )
+            ack.delete(handle, on_deleted)
+        case ExecuteResult.Retry | ExecuteResult.Nil:
+            # 可視性タイムアウトを0に設定して即時再処理可能にする
+            # 結果が無い場合(ハンドラーがBaseExceptionで中断した場合など)も期限まで残さない
+            logger.debug(
+                "Change message visibility",
+                extra={"queue": p.queue_url, "handle": handle},
+            )
+            ack.change_visibility(handle, 0)
+        case ExecuteResult.SendDLQ:
+            logger.debug(
+                "Send DLQ",
+                extra={
+                    "queue": p.queue_url,
+                    "handle": handle,
+                    "dead_later_queue": p.dead_later_queue_url,
+                },
+            )
+            # 本文と属性はそのまま転送し、DLQへの送信が成功した後に削除する
+            # S3に退避された本文はDLQのメッセージが参照するため削除しない
+            entry = dlq_entry(
+                message,
+                p.dead_later_queue_url,
+                p.queue_url,
+                error,
+                trace_context(p),
+            )
+            ack.send_dlq(handle, entry)
@@ -0,0 +1,275 @@
+from __future__ import annotations
+
+from logging import getLogger
+from math import ceil
+from threading import Condition, Event, Thread
+from time import monotonic, time
+from typing import TYPE_CHECKING, Literal, TypedDict
+
+from .client import get_client
+from .signal import queue_stats
+
+if TYPE_CHECKING:
+    from .handler import Polling
+
+logger = getLogger(__name__)
+
+TPolicy = Literal["weighted", "priority"]
+WEIGHTED: TPolicy = "weighted"
+PRIORITY: TPolicy = "priority"
+
+
+class QueueStats(TypedDict):
+    weight: int
+    priority: int
+    backlog: int | None
+    in_use: int
+    handled: int
+    throughput: float
+    wait_seconds_avg: float
+    wait_seconds_max: float
+
+
+class _Queue:
+    __slots__ = (
+        "polling",
+        "backlog",
+        "in_use",
+        "waiting",
+        "finish",
+        "handled",
+        "wait_total",
+        "wait_max",
+        "throughput",
+        "last_handled",
+    )
+
+    def __init__(self, polling: Polling) -> None:
+        self.polling = polling
+        # 未取得の間はNone
+        self.backlog: int | None = None
+        self.in_use = 0
+        self.waiting = 0
+        # 最後に割り当てた枠の仮想終了時刻
+        self.finish = 0.0
+        self.handled = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.throughput = 0.0
+        self.last_handled = 0
+
+    @property
+    def weight(self) -> int:
+        return max(self.polling.weight, 1)
+
+    @property
+    def priority(self) -> int:
+        return self.polling.priority
+
+    @property
+    def active(self) -> bool:
+        return bool(self.backlog) or self.in_use > 0 or self.waiting > 0
+
+
+class Scheduler:
+    """
+    複数のキューでワーカーの枠を共有し、重み付き公平またはプライオリティ順に割り当てる
+    キューごとの滞留数(ApproximateNumberOfMessages)から受信する件数を決める
+
+    Share worker slots between several queues. ``weighted`` hands slots out
+    in proportion to each queue's ``weight`` (start-time fair queuing), so a
+    bulk queue keeps progressing next to a busy one. ``priority`` serves the
+    queue with the highest ``priority`` first while it has a backlog.
+    The backlog of each queue also bounds how many messages it receives.
+    """
+
+    def __init__(
+        self,
+        slots: int,
+        policy: TPolicy = WEIGHTED,
+        *,
+        refresh_seconds: float = 5.0,
+    ) -> None:
+        if slots < 1:
+            raise ValueError("slots must be greater than or equal to 1.")
+        if policy not in (WEIGHTED, PRIORITY):
+            raise ValueError(f"Unsupported policy: {policy}")
+        self.slots = slots
+        self.policy = policy
+        self.refresh_seconds = refresh_seconds
+        self.__queues: dict[str, _Queue] = {}
+        self.__in_use = 0
+        # 仮想時刻(最後に割り当てた枠の開始時刻)
+        self.__vtime = 0.0
+        self.__cond = Condition()
+        self.__stop = Event()
+        self.__thread: Thread | None = None
+
+    def register(self, p: Polling) -> None:
+        with self.__cond:
+            self.__queues.setdefault(p.queue_url, _Queue(p))
+
+    def __start_tag(self, q: _Queue) -> float:
+        # 休止していたキューが過去の分をまとめて使わないよう、仮想時刻から始める
+        return max(q.finish, self.__vtime)
+
+    def __next(self) -> _Queue | None:
+        waiting = [q for q in self.__queues.values() if q.waiting > 0]
+        if not waiting:
+            return None
+        if self.policy == PRIORITY:
+            top = max(q.priority for q in waiting)
+            waiting = [q for q in waiting if q.priority == top]
+        return min(waiting, key=self.__start_tag)
+
+    def __blocked_by_priority(self, q: _Queue) -> bool:
+        # 優先度の高いキューに滞留があり、まだ枠を使える場合は譲る
+        return self.policy == PRIORITY and any(
+            other.priority > q.priority
+            and bool(other.backlog)
+            and other.in_use < other.polling.max_workers
+            for other in self.__queues.values()
+        )
+
+    def __can_acquire(self, q: _Queue) -> bool:
+        return (
+            self.__in_use < self.slots
+            and self.__next() is q
+            and not self.__blocked_by_priority(q)
+        )
+
+    def acquire(self, p: Polling, timeout: float | None = None) -> bool:
+        """
+        キューの順番が来るまで待機して枠を1つ確保する
+        Block until it is this queue's turn and take one slot
+        """
+        with self.__cond:
+            q = self.__queues[p.queue_url]
+            q.waiting += 1
+            acquired = self.__cond.wait_for(lambda: self.__can_acquire(q), timeout)
+            q.waiting -= 1
+            if acquired:
+                start = self.__start_tag(q)
+                self.__vtime = start
+                q.finish = start + 1 / q.weight
+                q.in_use += 1
+                self.__in_use += 1
+            # 待機をやめたことで次に選ばれるキューが変わる
+            self.__cond.notify_all()
+            return acquired
+
+    def release(self, p: Polling, wait_seconds: float = 0.0) -> None:
+        with self.__cond:
+            q = self.__queues[p.queue_url]
+            q.in_use -= 1
+            self.__in_use -= 1
+            q.handled += 1
+            q.wait_total += wait_seconds
+            q.wait_max = max(q.wait_max, wait_seconds)
+            self.__cond.notify_all()
+
+    def receive_limit(self, p: Polling, max_number: int, held: int) -> int:
+        """
+        キューの取り分から、バッファに保持中の件数を引いた数だけ受信させる
+        優先度の高いキューに譲っている場合と取り分を保持済みの場合は0を返す
+
+        Number of messages to receive so that a queue does not hold more
+        messages than its share of the slots. It is 0 while the queue yields
+        to a higher priority or already holds its share.
+        """
+        with self.__cond:
+            q = self.__queues[p.queue_url]
+            if self.__blocked_by_priority(q):
+                # 処理を始められないメッセージを受信すると、可視性タイムアウト後に再配信されて
+                # 受信回数が増え、DLQへ移されてしまう
+                return 0
+            active = [o for o in self.__queues.values() if o.active or o is q]
+            if self.policy == PRIORITY:
+                higher = sum(
+                    min(o.backlog or 0, o.polling.max_workers)
+                    for o in active
+                    if o.priority > q.priority
+                )
+                share = float(self.slots - higher)
+            else:
+                total = sum(o.weight for o in active)
+                share = self.slots * q.weight / total
+            # 枠の数をメッセージ数に換算する
+            batch_size = p.batch_size if p.batch else 1
+            share = min(share * batch_size, p.max_workers * batch_size + p.prefetch)
+            if q.backlog:
+                share = min(share, q.backlog + q.in_use * batch_size)
+        # 取り分を保持済みの場合は受信しない(滞留がない場合も取り分は1件以上ある)
+        return max(0, min(max_number, ceil(share) - held))
+
+    def wait(self, timeout: float | None = None) -> None:
+        """
+        枠の確保・解放か滞留数の更新があるまで待機する
+        Block until a slot is taken or released or a backlog is refreshed
+        """
+        with self.__cond:
+            self.__cond.wait(timeout)
+
+    def set_backlog(self, p: Polling, backlog: int) -> None:
+        with self.__cond:
+            self.__queues[p.queue_url].backlog = backlog
+            self.__cond.notify_all()
+
+    def stats(self) -> dict[str, QueueStats]:
+        with self.__cond:
+            return {
+                url: {
+                    "weight": q.weight,
+                    "priority": q.priority,
+                    "backlog": q.backlog,
+                    "in_use": q.in_use,
+                    "handled": q.handled,
+                    "throughput": q.throughput,
+                    "wait_seconds_avg": q.wait_total / q.handled if q.handled else 0.0,
+                    "wait_seconds_max": q.wait_max,
+                }
+                for url, q in self.__queues.items()
+            }
+
+    def start(self) -> None:
+        if self.__thread is None:
+            self.__thread = Thread(
+                target=self.__run, name="sqs-polling-scheduler", daemon=True
+            )
+            self.__thread.start()
+
+    def stop(self) -> None:
+        self.__stop.set()
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+
+    def __refresh(self, elapsed: float) -> None:
+        with self.__cond:
+            queues = list(self.__queues.values())
+        for q in queues:
+            p = q.polling
+            try:
+                attr = get_client(p.aws_profile).get_queue_attributes(
+                    QueueUrl=p.queue_url, AttributeNames=["ApproximateNumberOfMessages"]
+                )
+                backlog = int(attr["Attributes"]["ApproximateNumberOfMessages"])
+            except Exception as e:
+                logger.error(e, exc_info=True)
+                continue
+            self.set_backlog(p, backlog)
+        with self.__cond:
+            for q in queues:
+                q.throughput = (q.handled - q.last_handled) / elapsed
+                q.last_handled = q.handled
+        for url, stats in self.stats().items():
+            logger.debug("Queue stats", extra={"queue": url, **stats})
+            queue_stats.send(queue_url=url, timestamp=time(), **stats)
+
+    def __run(self) -> None:
+        last = monotonic()
+        self.__refresh(self.refresh_seconds)
+        while not self.__stop.wait(self.refresh_seconds):
+            now = monotonic()
+            self.__refresh(now - last)
+            last = now
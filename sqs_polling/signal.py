@@ -1,26 +1,205 @@
-from typing import Callable, Generic, TypeVar
+from __future__ import annotations
+
+import os
+from collections import deque
+from logging import getLogger
+from multiprocessing.util import Finalize
+from threading import Condition, Thread
+from typing import Any, Callable, Generic, TypeVar
+
+logger = getLogger(__name__)
 
 TConnectHandle = TypeVar("TConnectHandle", bound=Callable)
 
 
 class Signal(Generic[TConnectHandle]):
-    def __init__(self, name: str) -> None:
+    """
+    ハンドラーは送信したスレッドで同期的に呼び出される
+    asynchronous=Trueで接続したハンドラーはバックグラウンドのスレッドから呼び出され、
+    batch=Trueの場合はまとめたキーワード引数のリストを1度に受け取る
+    ハンドラーの例外はログに出力し、送信元には伝えない(raise_exceptions=Trueを除く)
+
+    Handlers are called synchronously on the sending thread. Handlers
+    connected with ``asynchronous=True`` are called from a background
+    dispatcher instead, and ``batch=True`` handlers get a list of the keyword
+    arguments of several sends at once. A failing handler is logged and never
+    reaches the sender, unless the signal was created with ``raise_exceptions``.
+    """
+
+    def __init__(self, name: str, *, raise_exceptions: bool = False) -> None:
         self.name = name
+        self.raise_exceptions = raise_exceptions
         self.__handlers: list[TConnectHandle] = []
+        self.__async_handlers: list[tuple[Callable, bool]] = []
 
-    def connect(self, handler: TConnectHandle):
-        self.__handlers.append(handler)
+    def connect(
+        self,
+        handler: TConnectHandle,
+        *,
+        asynchronous: bool = False,
+        batch: bool = False,
+    ):
+        if asynchronous or batch:
+            self.__async_handlers.append((handler, batch))
+        else:
+            self.__handlers.append(handler)
 
     def disconnect(self, handler: TConnectHandle):
-        self.__handlers.remove(handler)
+        if handler in self.__handlers:
+            self.__handlers.remove(handler)
+        else:
+            self.__async_handlers = [
+                (h, batch) for h, batch in self.__async_handlers if h != handler
+            ]
 
     def send(self, *args, **kwargs):
         for handler in self.__handlers:
-            handler(*args, **kwargs)
+            if self.raise_exceptions:
+                handler(*args, **kwargs)
+            else:
+                _call(self, handler, *args, **kwargs)
+        if self.__async_handlers:
+            dispatcher.put(self, args, kwargs)
+
+    def _async_handlers(self) -> list[tuple[Callable, bool]]:
+        return self.__async_handlers
+
+
+def _call(signal: Signal, handler: Callable, *args, **kwargs) -> None:
+    try:
+        handler(*args, **kwargs)
+    except Exception as e:
+        logger.error(
+            e, exc_info=True, extra={"signal": signal.name, "handler": handler}
+        )
+
+
+TEvent = tuple[Signal, tuple[Any, ...], dict[str, Any]]
+
+
+class SignalDispatcher:
+    """
+    非同期のハンドラーへの送信を上限付きのキューに積み、1つのスレッドで順に呼び出す
+    キューが満杯の場合は送信元を待たせずに破棄する
+
+    Queue sends for asynchronous handlers in a bounded queue drained by one
+    background thread. When the queue is full the event is dropped rather
+    than blocking the sender, which is usually a worker holding a message.
+    """
+
+    def __init__(self, maxsize: int = 10000, max_batch: int = 100) -> None:
+        self.maxsize = maxsize
+        self.max_batch = max_batch
+        self.dropped = 0
+        self.__events: deque[TEvent] = deque()
+        self.__busy = False
+        self.__closed = False
+        self.__cond = Condition()
+        self.__thread: Thread | None = None
+
+    def put(self, signal: Signal, args: tuple[Any, ...], kwargs: dict[str, Any]):
+        with self.__cond:
+            if len(self.__events) < self.maxsize:
+                self.__events.append((signal, args, kwargs))
+                self.__start()
+                self.__cond.notify()
+                return
+            self.dropped += 1
+            dropped = self.dropped
+        if dropped == 1 or dropped % 1000 == 0:
+            logger.warning(
+                "Signal queue is full",
+                extra={"signal": signal.name, "dropped": dropped},
+            )
+
+    def pending(self) -> int:
+        with self.__cond:
+            return len(self.__events) + (1 if self.__busy else 0)
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """
+        キューに積まれた送信が全て呼び出されるまで待機する
+        Wait until every queued send has been delivered
+        """
+        with self.__cond:
+            return self.__cond.wait_for(
+                lambda: not self.__events and not self.__busy, timeout
+            )
+
+    def close(self, timeout: float | None = 5.0) -> None:
+        with self.__cond:
+            self.__closed = True
+            self.__cond.notify_all()
+        if self.__thread is not None:
+            self.__thread.join(timeout)
+            self.__thread = None
+
+    def __start(self) -> None:
+        if self.__thread is None and not self.__closed:
+            self.__thread = Thread(
+                target=self.__run, name="sqs-polling-signal", daemon=True
+            )
+            self.__thread.start()
+            # ワーカープロセスの終了時にも積まれた分を送信する
+            Finalize(None, self.close, exitpriority=5)
+
+    def __run(self) -> None:
+        while True:
+            with self.__cond:
+                self.__cond.wait_for(lambda: self.__events or self.__closed)
+                if not self.__events:
+                    return
+                events = [
+                    self.__events.popleft()
+                    for _ in range(min(len(self.__events), self.max_batch))
+                ]
+                self.__busy = True
+            try:
+                _deliver(events)
+            finally:
+                with self.__cond:
+                    self.__busy = False
+                    self.__cond.notify_all()
+
+
+def _deliver(events: list[TEvent]) -> None:
+    batches: dict[Callable, tuple[Signal, list[dict[str, Any]]]] = {}
+    for signal, args, kwargs in events:
+        for handler, batch in signal._async_handlers():
+            if batch:
+                batches.setdefault(handler, (signal, []))[1].append(kwargs)
+            else:
+                _call(signal, handler, *args, **kwargs)
+    for handler, (signal, items) in batches.items():
+        _call(signal, handler, items)
+
+
+dispatcher = SignalDispatcher()
+
+
+def close_dispatcher(timeout: float | None = 5.0) -> None:
+    """
+    積まれた送信を配信してから非同期の配信を停止する
+    Deliver the queued sends and stop the background dispatcher
+    """
+    dispatcher.close(timeout)
+
+
+def _reset_dispatcher() -> None:
+    # fork先には配信用のスレッドが存在しないため作り直す
+    global dispatcher
+    dispatcher = SignalDispatcher(dispatcher.maxsize, dispatcher.max_batch)
+
+
+os.register_at_fork(after_in_child=_reset_dispatcher)
 
 
 ready = Signal("Ready")
-heartbeat = Signal("Heartbeat")
+# ハートビートのハンドラーが失敗した場合はプロセスを停止させるため、例外を伝える
+heartbeat = Signal("Heartbeat", raise_exceptions=True)
 shutdown = Signal("Shutdown")
 handler_result = Signal("HandlerResult")
 missing_receipt_handle = Signal("MissingReceiptHandle")
+buffer_occupancy = Signal("BufferOccupancy")
+worker_process_init = Signal("WorkerProcessInit")
+queue_stats = Signal("QueueStats")
@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+from contextlib import nullcontext
+from typing import TYPE_CHECKING, Any, ContextManager
+
+try:
+    from opentelemetry import propagate, trace
+    from opentelemetry.trace import Link, SpanKind
+except ImportError:  # pragma: no cover
+    trace = None  # type: ignore
+
+if TYPE_CHECKING:
+    from mypy_boto3_sqs.type_defs import MessageTypeDef
+
+    from .handler import Polling
+
+# X-Rayのトレースヘッダーを保持するシステム属性
+AWS_TRACE_HEADER = "AWSTraceHeader"
+MESSAGING_SYSTEM = "aws_sqs"
+
+_NULL = nullcontext()
+
+
+def _tracer():
+    return trace.get_tracer("sqs_polling")
+
+
+def _destination(p: Polling) -> str:
+    return p.queue_name or p.queue_url.rsplit("/", 1)[-1]
+
+
+def enabled(p: Polling) -> bool:
+    if not p.tracing:
+        return False
+    if trace is None:
+        raise ImportError(
+            "opentelemetry-api is required for tracing: "
+            "pip install sqs-apolling[otel]"
+        )
+    return True
+
+
+def _xray_to_traceparent(header: str) -> str | None:
+    # Root=1-5759e988-bd862e3fe1be46a994272793;Parent=53995c3f42cd8ad8;Sampled=1
+    fields = dict(field.split("=", 1) for field in header.split(";") if "=" in field)
+    root = fields.get("Root", "").split("-")
+    parent = fields.get("Parent", "")
+    if len(root) != 3 or len(root[1]) != 8 or len(root[2]) != 24 or len(parent) != 16:
+        return None
+    flags = "01" if fields.get("Sampled") == "1" else "00"
+    return f"00-{root[1]}{root[2]}-{parent}-{flags}"
+
+
+def _carrier(message: MessageTypeDef) -> dict[str, str]:
+    """
+    W3Cのtraceparentをメッセージ属性から、無い場合はAWSTraceHeaderから取り出す
+    W3C trace context from the message attributes, or from AWSTraceHeader
+    """
+    carrier = {
+        name: value["StringValue"]
+        for name, value in (message.get("MessageAttributes") or {}).items()
+        if "StringValue" in value
+    }
+    if "traceparent" not in carrier:
+        header = message.get("Attributes", {}).get(AWS_TRACE_HEADER)
+        if header and (traceparent := _xray_to_traceparent(header)):
+            carrier = {"traceparent": traceparent}
+    return carrier
+
+
+def extract(message: MessageTypeDef):
+    return propagate.extract(_carrier(message))
+
+
+def span(p: Polling, name: str) -> ContextManager:
+    """
+    現在のスパンの子スパン
+    記録されない(サンプリングされなかった)トレースではスパンを作らない
+
+    A child span of the current span. Nothing is created when the current
+    trace was not sampled, which keeps the unsampled hot path to one check.
+    """
+    if not p.tracing or not trace.get_current_span().is_recording():
+        return _NULL
+    return _tracer().start_as_current_span(name)
+
+
+def receive_span(p: Polling) -> ContextManager:
+    if not enabled(p):
+        return _NULL
+    return _tracer().start_as_current_span(
+        f"{_destination(p)} receive",
+        kind=SpanKind.CLIENT,
+        attributes={
+            "messaging.system": MESSAGING_SYSTEM,
+            "messaging.operation": "receive",
+            "messaging.destination.name": p.queue_url,
+        },
+    )
+
+
+def set_message_count(count: int) -> None:
+    if trace is not None and (current := trace.get_current_span()).is_recording():
+        current.set_attribute("messaging.batch.message_count", count)
+
+
+def process_span(p: Polling, message: MessageTypeDef) -> ContextManager:
+    """
+    メッセージ1件の処理のスパン
+    送信側のトレースコンテキストを親とし、サンプリングも送信側の判定に従う
+
+    Span for processing one message. The producer's trace context is the
+    parent, so a parent-based sampler follows the producer's decision.
+    """
+    if not enabled(p):
+        return _NULL
+    attribute = message.get("Attributes", {})
+    return _tracer().start_as_current_span(
+        f"{_destination(p)} process",
+        context=extract(message),
+        kind=SpanKind.CONSUMER,
+        attributes={
+            "messaging.system": MESSAGING_SYSTEM,
+            "messaging.operation": "process",
+            "messaging.destination.name": p.queue_url,
+            "messaging.message.id": message.get("MessageId", ""),
+            "messaging.sqs.receive_count": int(
+                attribute.get("ApproximateReceiveCount", 1)
+            ),
+        },
+    )
+
+
+def batch_span(p: Polling, messages: list[MessageTypeDef]) -> ContextManager:
+    """
+    バッチ処理のスパン
+    親を1つに決められないため、各メッセージの送信側のスパンをリンクとして持つ
+
+    Span for a batch handler call. A batch has no single parent, so it
+    links to the producer span of each message instead.
+    """
+    if not enabled(p):
+        return _NULL
+    links = []
+    for message in messages:
+        context = trace.get_current_span(extract(message)).get_span_context()
+        if context.is_valid:
+            links.append(Link(context))
+    return _tracer().start_as_current_span(
+        f"{_destination(p)} process",
+        kind=SpanKind.CONSUMER,
+        links=links,
+        attributes={
+            "messaging.system": MESSAGING_SYSTEM,
+            "messaging.operation": "process",
+            "messaging.destination.name": p.queue_url,
+            "messaging.batch.message_count": len(messages),
+        },
+    )
+
+
+def set_result(result: Any) -> None:
+    if trace is not None and (current := trace.get_current_span()).is_recording():
+        current.set_attribute("sqs_polling.result", str(result))
+
+
+def trace_context(p: Polling) -> dict[str, str]:
+    """
+    DLQへ転送するメッセージに設定する現在のトレースコンテキスト
+    The current trace context, to be added to messages forwarded to the DLQ
+    """
+    carrier: dict[str, str] = {}
+    if p.tracing and trace is not None:
+        propagate.inject(carrier)
+    return carrier
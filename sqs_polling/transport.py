@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+from asyncio import to_thread
+from typing import Any, Protocol
+
+# aws_profileにトランスポートを指定するキー
+TRANSPORT = "transport"
+
+
+class Transport(Protocol):
+    """
+    ポーリングが使うSQSの操作
+    引数と戻り値はboto3のSQSクライアントと同じで、boto3のクライアントもこれを満たす
+    aws_profile={"transport": ...}で指定するとboto3の代わりに使われる
+
+    The SQS operations used by the engine. Parameters and responses are those
+    of the boto3 SQS client, which satisfies this protocol as is. A transport
+    given as ``aws_profile={"transport": ...}`` is used instead of boto3.
+    """
+
+    def receive_message(self, **kwargs: Any) -> dict[str, Any]:
+        ...
+
+    def delete_message(self, **kwargs: Any) -> dict[str, Any]:
+        ...
+
+    def delete_message_batch(self, **kwargs: Any) -> dict[str, Any]:
+        ...
+
+    def change_message_visibility(self, **kwargs: Any) -> dict[str, Any]:
+        ...
+
+    def change_message_visibility_batch(self, **kwargs: Any) -> dict[str, Any]:
+        ...
+
+    def send_message(self, **kwargs: Any) -> dict[str, Any]:
+        ...
+
+    def send_message_batch(self, **kwargs: Any) -> dict[str, Any]:
+        ...
+
+    def get_queue_url(self, **kwargs: Any) -> dict[str, Any]:
+        ...
+
+    def get_queue_attributes(self, **kwargs: Any) -> dict[str, Any]:
+        ...
+
+
+class AsyncTransport:
+    """
+    asyncのハンドラーからトランスポートを使うためのラッパー
+    ロングポーリングでイベントループを止めないよう、呼び出しはスレッドで行う
+
+    Adapts a transport to the awaitable client used by async handlers.
+    Calls run in a thread so that long polling does not block the loop.
+    """
+
+    def __init__(self, transport: Transport) -> None:
+        self.transport = transport
+
+    def __getattr__(self, name: str):
+        method = getattr(self.transport, name)
+
+        async def call(**kwargs: Any) -> dict[str, Any]:
+            return await to_thread(method, **kwargs)
+
+        return call
@@ -24,6 +24,9 @@ T = TypeVar("T")
 EncodedT = TypeVar("EncodedT")
 
 
+# __type__/__value__形式の値が含まれるかを、デコード前に文字列検索で判定する
+ENVELOPE_MARKER = "__type__"
+
 _decoders: dict[str, DecoderT] = {
     "bytes": lambda o: o.encode("utf-8"),
     "base64": lambda o: base64.b64decode(o.encode("utf-8")),
@@ -41,6 +44,9 @@ def object_hook(o: dict):
         return o
 
 
+_default_object_hook = object_hook
+
+
 def loads(
     s, _loads=json.loads, decode_bytes=True, object_hook=object_hook
 ) -> dict[str, Any] | list | tuple:
@@ -51,6 +57,14 @@ def loads(
     elif decode_bytes and isinstance(s, bytes):
         s = s.decode("utf-8")
 
+    # 全てのdictでobject_hookを呼ぶと遅いため、__type__を含まない場合は省略する
+    # 独自のobject_hookは__type__以外も変換し得るため、常に呼び出す
+    if (
+        object_hook is _default_object_hook
+        and isinstance(s, str)
+        and ENVELOPE_MARKER not in s
+    ):
+        return _loads(s)
     return _loads(s, object_hook=object_hook)
 
 
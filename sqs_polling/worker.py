@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from threading import Thread
+from typing import TYPE_CHECKING, Any
+
+from .context import RECEIVED_AT
+from .execute_result import ExecuteResult
+from .handler import Polling, get_handler
+from .metrics import REGISTRY, TRecord, forward_to
+from .polling import _execute, _execute_batch, _get_session, logger
+from .signal import worker_process_init
+from .utils import find_module
+
+if TYPE_CHECKING:
+    from multiprocessing.queues import SimpleQueue
+
+    from mypy_boto3_sqs.type_defs import MessageTypeDef
+
+# ワーカープロセスに渡すメッセージ
+# (ReceiptHandle, Body, Attributes, MessageAttributes, 受信時刻, MessageId)
+TCompactMessage = tuple[str, str, dict[str, str], dict[str, Any] | None, float, str]
+
+# ワーカープロセス内で読み込み済みのハンドラー
+_worker_handlers: dict[str, Polling] = {}
+
+
+def compact_message(message: MessageTypeDef) -> TCompactMessage:
+    return (
+        message.get("ReceiptHandle", ""),
+        message.get("Body", ""),
+        message.get("Attributes", {}),  # type: ignore
+        message.get("MessageAttributes"),  # type: ignore
+        message.get(RECEIVED_AT, 0.0),  # type: ignore
+        message.get("MessageId", ""),
+    )
+
+
+def _expand_message(compact: TCompactMessage) -> MessageTypeDef:
+    (
+        receipt_handle,
+        body,
+        attributes,
+        message_attributes,
+        received_at,
+        message_id,
+    ) = compact
+    message: dict[str, Any] = {
+        "MessageId": message_id,
+        "ReceiptHandle": receipt_handle,
+        "Body": body,
+        "Attributes": attributes,
+        RECEIVED_AT: received_at,
+    }
+    if message_attributes is not None:
+        message["MessageAttributes"] = message_attributes
+    return message  # type: ignore
+
+
+def _init_worker(
+    module_name: str,
+    qualname: str,
+    name: str,
+    options: dict[str, Any],
+    metrics: SimpleQueue[TRecord | None],
+) -> None:
+    """
+    ワーカープロセスの起動時に1度だけハンドラーのモジュールを読み込み、クライアントを作成する
+    Import the handler module and build the SQS client once per worker process
+    """
+    # 削除などのメトリクスはワーカープロセスで記録されるため、親プロセスへ送る
+    forward_to(metrics.put)
+    module = find_module(module_name)
+    # spawnでは__main__が__mp_main__として読み込まれるため、読み込んだモジュール名で探す
+    p = get_handler(f"{module.__name__}.{qualname}")
+    p.update(**options)
+    # fork元のクライアントは破棄されているため、プロセスごとに作成される
+    sqs = _get_session(p.aws_profile)
+    p.set_dead_later_queue_url(sqs)
+    _worker_handlers[name] = p
+    worker_process_init.send(polling=p)
+
+
+def _ready() -> None:
+    pass
+
+
+def _execute_in_worker(name: str, compact: TCompactMessage) -> ExecuteResult:
+    p = _worker_handlers[name]
+    return _execute(p, _expand_message(compact), p.exception_deletable, p.aws_profile)
+
+
+def _execute_batch_in_worker(
+    name: str, compacts: list[TCompactMessage]
+) -> list[ExecuteResult]:
+    p = _worker_handlers[name]
+    messages = [_expand_message(compact) for compact in compacts]
+    return _execute_batch(p, messages, p.exception_deletable, p.aws_profile)
+
+
+class ProcessWorkerPool(ProcessPoolExecutor):
+    """
+    ハンドラーを読み込み済みのワーカープロセスを起動時に作成しておくプロセスプール
+    メッセージ毎にPollingをpickleせず、必要な値だけをタプルで渡す
+
+    Pre-forked process pool whose workers import the handler once at startup.
+    Only a compact message tuple is sent to a worker per message.
+    """
+
+    def __init__(self, p: Polling, max_workers: int) -> None:
+        # ワーカープロセスで記録したメトリクスを受け取るキュー
+        # Queueはプロセス終了時に未送信分を失うことがあるため、同期的に書き込むSimpleQueueを使う
+        self.__metrics: SimpleQueue[TRecord | None] = get_context().SimpleQueue()
+        super().__init__(
+            max_workers=max_workers,
+            initializer=_init_worker,
+            initargs=(
+                p.module,
+                p.handler.__qualname__,
+                p.qualified_name,
+                p.options(),
+                self.__metrics,
+            ),
+        )
+        self.name = p.qualified_name
+        # 最初のメッセージを待たずにワーカープロセスを起動させる
+        for _ in range(max_workers):
+            self.submit(_ready)
+        self.__drain = Thread(
+            target=self.__record_metrics,
+            name=f"sqs-polling-metrics-{self.name}",
+            daemon=True,
+        )
+        self.__drain.start()
+        logger.info(
+            "Worker processes started.",
+            extra={"handler": self.name, "max_workers": max_workers},
+        )
+
+    def submit_message(self, messages: list[MessageTypeDef]):
+        return self.submit(_execute_in_worker, self.name, compact_message(messages[0]))
+
+    def submit_batch(self, messages: list[MessageTypeDef]):
+        return self.submit(
+            _execute_batch_in_worker,
+            self.name,
+            [compact_message(message) for message in messages],
+        )
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False) -> None:
+        super().shutdown(wait, cancel_futures=cancel_futures)
+        if wait and self.__drain.is_alive():
+            # ワーカープロセスの終了時に送信された削除のメトリクスまで記録してから戻る
+            self.__metrics.put(None)
+            self.__drain.join()
+
+    def __record_metrics(self) -> None:
+        while (record := self.__metrics.get()) is not None:
+            REGISTRY.apply(record)
@@ -0,0 +1,193 @@
+from __future__ import annotations
+
+import socket
+from asyncio import new_event_loop, set_event_loop, sleep
+from concurrent.futures import Executor
+from threading import enumerate as enumerate_threads
+from time import monotonic
+from typing import Any, Callable
+from urllib.request import Request, urlopen
+
+import boto3
+import pytest
+from moto.server import ThreadedMotoServer
+
+from sqs_polling.handler import _handlers, get_handlers
+from sqs_polling.memory import MemoryTransport
+from sqs_polling.polling import (
+    _close_ack_buffers,
+    _handler,
+    _lease_managers,
+    _reset_ack_buffers,
+    _stop_lease_managers,
+    ev,
+)
+from sqs_polling.transport import TRANSPORT
+
+REGION = "us-east-1"
+
+
+class Queues:
+    """
+    テスト用のSQS(MemoryTransportまたはmotoサーバー)のキューを作成・投入・確認するヘルパー
+    Helpers to create, fill and inspect queues on the test SQS, either a
+    MemoryTransport or the moto server
+    """
+
+    def __init__(self, client: Any, profile: dict[str, Any]) -> None:
+        self.client = client
+        self.profile = profile
+
+    def create(self, name: str, **attributes: str) -> str:
+        return self.client.create_queue(QueueName=name, Attributes=attributes)[
+            "QueueUrl"
+        ]
+
+    def arn(self, url: str) -> str:
+        return self.__attribute(url, "QueueArn")
+
+    def send(self, url: str, *bodies: str, **entry: Any) -> list[str]:
+        return [
+            self.client.send_message(QueueUrl=url, MessageBody=body, **entry)[
+                "MessageId"
+            ]
+            for body in bodies
+        ]
+
+    def receive(
+        self, url: str, max_number: int = 10, visibility_timeout: int = 30
+    ) -> list[dict[str, Any]]:
+        return self.client.receive_message(
+            QueueUrl=url,
+            MaxNumberOfMessages=max_number,
+            VisibilityTimeout=visibility_timeout,
+            WaitTimeSeconds=0,
+            AttributeNames=["All"],
+            MessageAttributeNames=["All"],
+        ).get("Messages", [])
+
+    def visible(self, url: str) -> int:
+        return int(self.__attribute(url, "ApproximateNumberOfMessages"))
+
+    def in_flight(self, url: str) -> int:
+        return int(self.__attribute(url, "ApproximateNumberOfMessagesNotVisible"))
+
+    def empty(self, url: str) -> bool:
+        # 2回に分けて取得すると、その間に戻されたメッセージを見落とすため1回で取得する
+        attributes = self.client.get_queue_attributes(
+            QueueUrl=url,
+            AttributeNames=[
+                "ApproximateNumberOfMessages",
+                "ApproximateNumberOfMessagesNotVisible",
+            ],
+        )["Attributes"]
+        return all(int(value) == 0 for value in attributes.values())
+
+    def __attribute(self, url: str, name: str) -> str:
+        return self.client.get_queue_attributes(QueueUrl=url, AttributeNames=[name])[
+            "Attributes"
+        ][name]
+
+
+class Engine:
+    """
+    テストの中でエンジンを起動し、終了時に全てのスレッドとバッファを片付ける
+    Start the registered handlers inside a test and tear every thread and
+    buffer down afterwards
+    """
+
+    def __init__(self) -> None:
+        self.loop = new_event_loop()
+        set_event_loop(self.loop)
+        self.executors: list[Any] = []
+
+    def start(self, module_name: str, scheduler=None) -> list[Any]:
+        executors = [_handler(p, scheduler) for p in get_handlers(module_name)]
+        self.executors.extend(executors)
+        return executors
+
+    def run_until(self, predicate: Callable[[], bool], timeout: float = 10.0) -> None:
+        async def wait() -> None:
+            deadline = monotonic() + timeout
+            while not predicate():
+                if monotonic() > deadline:
+                    raise TimeoutError("The condition was not met in time.")
+                await sleep(0.01)
+
+        self.loop.run_until_complete(wait())
+
+    def stop(self) -> None:
+        ev.set()
+        for executor in self.executors:
+            if isinstance(executor, Executor):
+                executor.shutdown(wait=True)
+            else:
+                self.loop.run_until_complete(executor.aclose())
+        # 戻す処理がack用のバッファを使うため、受信と振り分けのスレッドを先に止める
+        for thread in enumerate_threads():
+            if thread.name.startswith(
+                ("sqs-polling-receiver-", "sqs-polling-dispatcher-")
+            ):
+                thread.join()
+        _stop_lease_managers()
+        _close_ack_buffers()
+        _lease_managers.clear()
+        _reset_ack_buffers()
+        ev.clear()
+        self.loop.close()
+        set_event_loop(None)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture(scope="session")
+def sqs_server():
+    port = _free_port()
+    server = ThreadedMotoServer(ip_address="127.0.0.1", port=port, verbose=False)
+    server.start()
+    yield f"http://127.0.0.1:{port}"
+    server.stop()
+
+
+@pytest.fixture
+def memory() -> MemoryTransport:
+    return MemoryTransport()
+
+
+@pytest.fixture
+def queues(memory: MemoryTransport) -> Queues:
+    return Queues(memory, {TRANSPORT: memory})
+
+
+@pytest.fixture
+def sqs_queues(sqs_server: str) -> Queues:
+    """
+    ワーカープロセスから使うキュー(MemoryTransportはプロセス間で共有できない)
+    Queues reachable from worker processes, which can not share a MemoryTransport
+    """
+    # テストごとにキューを空の状態に戻す
+    urlopen(Request(f"{sqs_server}/moto-api/reset", method="POST")).read()
+    profile = {
+        "endpoint_url": sqs_server,
+        "region_name": REGION,
+        "aws_access_key_id": "testing",
+        "aws_secret_access_key": "testing",
+    }
+    return Queues(boto3.client("sqs", **profile), profile)
+
+
+@pytest.fixture
+def engine():
+    engine = Engine()
+    yield engine
+    engine.stop()
+
+
+@pytest.fixture(autouse=True)
+def _clear_handlers():
+    yield
+    _handlers.clear()
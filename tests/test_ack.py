@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+from collections import Counter
+from time import sleep
+from typing import Any
+
+from sqs_polling.ack import AckBuffer
+
+
+class FlakyClient:
+    """
+    バッチAPIの呼び出しを記録し、最初のfailures回のDeleteMessageBatchで先頭のエントリーをサーバー側のエラーにする
+    Record the batch calls and fail the first entry of the first ``failures``
+    DeleteMessageBatch calls with a server-side (retriable) error
+    """
+
+    def __init__(self, client, failures: int = 0) -> None:
+        self.client = client
+        self.failures = failures
+        self.calls: Counter[str] = Counter()
+        self.requests: list[list[str]] = []
+
+    def __getattr__(self, name: str):
+        return getattr(self.client, name)
+
+    def change_message_visibility_batch(self, **kwargs):
+        self.calls["ChangeMessageVisibilityBatch"] += 1
+        return self.client.change_message_visibility_batch(**kwargs)
+
+    def delete_message_batch(self, *, QueueUrl: str, Entries: list[dict[str, Any]]):
+        self.calls["DeleteMessageBatch"] += 1
+        self.requests.append([entry["ReceiptHandle"] for entry in Entries])
+        if self.failures == 0:
+            return self.client.delete_message_batch(QueueUrl=QueueUrl, Entries=Entries)
+        self.failures -= 1
+        first, *rest = Entries
+        response: dict[str, Any] = {"Successful": []}
+        if rest:
+            response = self.client.delete_message_batch(QueueUrl=QueueUrl, Entries=rest)
+        response.setdefault("Failed", []).append(
+            {"Id": first["Id"], "SenderFault": False, "Code": "InternalError"}
+        )
+        return response
+
+
+def _handles(queues, url: str, n: int) -> list[str]:
+    queues.send(url, *(str(i) for i in range(n)))
+    handles = []
+    while len(handles) < n:
+        handles += [m["ReceiptHandle"] for m in queues.receive(url)]
+    return handles
+
+
+def test_flushes_full_batches_and_the_rest_on_close(queues):
+    url = queues.create("jobs")
+    handles = _handles(queues, url, 25)
+    client = FlakyClient(queues.client)
+    ack = AckBuffer(client, url, interval_seconds=60)
+
+    for handle in handles:
+        ack.delete(handle)
+    # 10件に達したバッチは呼び出し元のスレッドで送信される
+    assert client.calls["DeleteMessageBatch"] == 2
+    assert ack.pending() == 5
+
+    ack.close()
+    assert client.calls["DeleteMessageBatch"] == 3
+    assert queues.empty(url)
+
+
+def test_flushes_after_the_interval(queues):
+    url = queues.create("jobs")
+    handles = _handles(queues, url, 3)
+    client = FlakyClient(queues.client)
+    ack = AckBuffer(client, url, interval_seconds=0.05)
+
+    for handle in handles:
+        ack.delete(handle)
+    sleep(0.5)
+
+    assert client.requests == [handles]
+    assert queues.empty(url)
+    ack.close()
+
+
+def test_retries_only_the_failed_entries(queues):
+    url = queues.create("jobs")
+    handles = _handles(queues, url, 3)
+    client = FlakyClient(queues.client, failures=1)
+    ack = AckBuffer(client, url, interval_seconds=0)
+
+    for handle in handles:
+        ack.delete(handle)
+    ack.close()
+
+    # 1回目に失敗した1件だけが再送される
+    assert client.requests == [[handles[0]], [handles[0]], [handles[1]], [handles[2]]]
+    assert queues.empty(url)
+
+
+def test_drops_entries_after_max_attempts(queues):
+    url = queues.create("jobs")
+    (handle,) = _handles(queues, url, 1)
+    client = FlakyClient(queues.client, failures=5)
+    ack = AckBuffer(client, url, interval_seconds=0, max_attempts=3)
+
+    ack.delete(handle)
+    ack.close()
+
+    assert len(client.requests) == 3
+    assert queues.in_flight(url) == 1
+
+
+def test_does_not_retry_sender_faults(queues):
+    url = queues.create("jobs")
+    (handle,) = _handles(queues, url, 1)
+    client = FlakyClient(queues.client)
+    ack = AckBuffer(client, url, interval_seconds=60)
+
+    ack.change_visibility("invalid", 0)
+    ack.change_visibility(handle, 0)
+    ack.close()
+
+    assert client.calls["ChangeMessageVisibilityBatch"] == 1
+    assert queues.visible(url) == 1
+
+
+def test_on_deleted_runs_only_after_the_delete_succeeded(queues):
+    url = queues.create("jobs")
+    handles = _handles(queues, url, 2)
+    client = FlakyClient(queues.client, failures=1)
+    ack = AckBuffer(client, url, interval_seconds=60)
+    deleted: list[str] = []
+
+    for handle in handles:
+        ack.delete(handle, lambda handle=handle: deleted.append(handle))
+    ack.flush()
+    # サーバー側のエラーで失敗したエントリーは再送が成功するまで呼ばない
+    assert deleted == [handles[1]]
+
+    ack.close()
+    assert sorted(deleted) == sorted(handles)
+    assert queues.empty(url)
+
+
+def test_deletes_messages_once_sent_to_the_dlq(queues):
+    url = queues.create("jobs")
+    dlq = queues.create("jobs-dlq")
+    handles = _handles(queues, url, 2)
+    ack = AckBuffer(queues.client, url, dead_letter_queue_url=dlq, interval_seconds=0)
+
+    for handle in handles:
+        ack.send_dlq(handle, {"MessageBody": handle})
+    ack.close()
+
+    assert queues.empty(url)
+    assert sorted(m["Body"] for m in queues.receive(dlq)) == sorted(handles)
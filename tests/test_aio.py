@@ -0,0 +1,182 @@
+from __future__ import annotations
+
+import asyncio
+import json
+
+import pytest
+from test_ack import FlakyClient
+
+from sqs_polling import polling
+from sqs_polling.aio import AsyncAckBuffer
+from sqs_polling.exceptions import RejectDLQException, RetryException
+from sqs_polling.transport import AsyncTransport
+
+
+def test_async_handler_deletes_handled_messages(engine, queues):
+    url = queues.create("jobs")
+    queues.send(url, *(str(i) for i in range(20)))
+    handled = []
+
+    @polling(
+        queue_url=url,
+        aws_profile=queues.profile,
+        wait_time_seconds=0,
+        interval_seconds=0.01,
+        max_backoff_seconds=0.05,
+        max_workers=5,
+        max_number_of_messages=10,
+    )
+    async def handler(ctx, body, *_):
+        handled.append(body)
+
+    engine.start(__name__)
+    engine.run_until(lambda: queues.empty(url))
+
+    assert sorted(handled, key=int) == [str(i) for i in range(20)]
+    assert queues.client.calls["DeleteMessageBatch"] < 20
+
+
+def test_async_handler_retries_and_forwards_to_the_dlq(engine, queues):
+    dlq = queues.create("jobs-dlq")
+    url = queues.create(
+        "jobs",
+        RedrivePolicy=json.dumps(
+            {"deadLetterTargetArn": queues.arn(dlq), "maxReceiveCount": 10}
+        ),
+    )
+    queues.send(url, "retry", "broken")
+    handled = []
+
+    @polling(
+        queue_url=url,
+        aws_profile=queues.profile,
+        wait_time_seconds=0,
+        interval_seconds=0.01,
+        max_backoff_seconds=0.05,
+        max_workers=2,
+    )
+    async def handler(ctx, body, *_):
+        handled.append((body, ctx.retry))
+        if body == "retry" and ctx.retry == 0:
+            raise RetryException()
+        if body == "broken":
+            raise RejectDLQException("unknown order")
+
+    engine.start(__name__)
+    engine.run_until(lambda: queues.empty(url) and queues.visible(dlq) == 1)
+
+    assert sorted(handled) == [("broken", 0), ("retry", 0), ("retry", 1)]
+    (forwarded,) = queues.receive(dlq)
+    assert forwarded["Body"] == "broken"
+
+
+def test_async_handler_keeps_fifo_group_order(engine, queues):
+    url = queues.create("jobs.fifo", FifoQueue="true", ContentBasedDeduplication="true")
+    for i in range(5):
+        for group in ("a", "b"):
+            queues.send(url, f"{group}{i}", MessageGroupId=group)
+    handled: dict[str, list[int]] = {"a": [], "b": []}
+
+    @polling(
+        queue_url=url,
+        aws_profile=queues.profile,
+        wait_time_seconds=0,
+        interval_seconds=0.01,
+        max_backoff_seconds=0.05,
+        max_workers=4,
+        max_number_of_messages=10,
+    )
+    async def handler(ctx, body, attributes, group_id, *_):
+        if body == "a1" and ctx.retry == 0:
+            raise RetryException()
+        handled[group_id].append(int(body[1:]))
+
+    engine.start(__name__)
+    engine.run_until(lambda: queues.empty(url))
+
+    assert handled == {"a": list(range(5)), "b": list(range(5))}
+
+
+def test_async_fifo_slow_group_does_not_hold_up_other_groups(engine, queues):
+    url = queues.create("jobs.fifo", FifoQueue="true", ContentBasedDeduplication="true")
+    queues.send(url, *(f"slow{i}" for i in range(5)), MessageGroupId="slow")
+    queues.send(url, *(f"fast{i}" for i in range(10)), MessageGroupId="fast")
+    release = asyncio.Event()
+    fast = []
+
+    @polling(
+        queue_url=url,
+        aws_profile=queues.profile,
+        wait_time_seconds=0,
+        interval_seconds=0.01,
+        max_backoff_seconds=0.05,
+        max_workers=2,
+        max_number_of_messages=10,
+    )
+    async def handler(ctx, body, attributes, group_id, *_):
+        if group_id == "slow":
+            await release.wait()
+        else:
+            fast.append(body)
+
+    engine.start(__name__)
+    try:
+        # 遅いグループの待機中のメッセージが枠を埋めず、他のグループは処理され続けること
+        engine.run_until(lambda: len(fast) == 10, timeout=5)
+    finally:
+        release.set()
+    engine.run_until(lambda: queues.empty(url))
+
+    assert fast == [f"fast{i}" for i in range(10)]
+
+
+def test_async_handler_deletes_on_error_when_exception_deletable(engine, queues):
+    url = queues.create("jobs")
+    queues.send(url, "broken")
+    handled = []
+
+    @polling(
+        queue_url=url,
+        aws_profile=queues.profile,
+        exception_deletable=True,
+        wait_time_seconds=0,
+        interval_seconds=0.01,
+        max_backoff_seconds=0.05,
+    )
+    async def handler(ctx, body, *_):
+        handled.append(body)
+        raise ValueError(body)
+
+    engine.start(__name__)
+    engine.run_until(lambda: queues.empty(url))
+
+    assert handled == ["broken"]
+
+
+def test_async_handler_rejects_process_worker(engine, queues):
+    url = queues.create("jobs")
+
+    @polling(queue_url=url, aws_profile=queues.profile, process_worker=True)
+    async def handler(ctx, body, *_):
+        pass
+
+    with pytest.raises(ValueError, match="process_worker"):
+        engine.start(__name__)
+
+
+def test_async_ack_buffer_retries_only_the_failed_entries(engine, queues):
+    url = queues.create("jobs")
+    queues.send(url, "a", "b")
+    handles = [m["ReceiptHandle"] for m in queues.receive(url)]
+    flaky = FlakyClient(queues.client, failures=1)
+    ack = AsyncAckBuffer(AsyncTransport(flaky), url, interval_seconds=60)
+
+    async def run():
+        for handle in handles:
+            ack.delete(handle)
+        await ack.close()
+
+    engine.loop.run_until_complete(run())
+
+    assert flaky.requests == [handles, [handles[0]]]
+    assert queues.empty(url)
@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import pytest
+
+from sqs_polling.autoscale import AutoScaler, ConcurrencyLimit
+from sqs_polling.buffer import PrefetchBuffer
+from sqs_polling.handler import Polling
+
+
+class Backlog:
+    """
+    ApproximateNumberOfMessagesだけを返すクライアント
+    Client stub answering only ApproximateNumberOfMessages
+    """
+
+    def __init__(self, depth: int = 0) -> None:
+        self.depth = depth
+
+    def get_queue_attributes(self, **_):
+        return {"Attributes": {"ApproximateNumberOfMessages": str(self.depth)}}
+
+
+@pytest.fixture
+def backlog(monkeypatch) -> Backlog:
+    backlog = Backlog()
+    monkeypatch.setattr("sqs_polling.autoscale.get_client", lambda *_: backlog)
+    return backlog
+
+
+def _scaler(limit: int, min_workers: int = 1, max_workers: int = 8) -> AutoScaler:
+    p = Polling(
+        queue_url="jobs",
+        autoscale=True,
+        min_workers=min_workers,
+        max_workers=max_workers,
+        prefetch=2,
+    )
+    return AutoScaler(p, ConcurrencyLimit(limit), PrefetchBuffer(limit + p.prefetch))
+
+
+def _busy(scaler: AutoScaler, slots: int) -> None:
+    for _ in range(slots):
+        scaler.limit.acquire()
+    for _ in range(slots):
+        scaler.limit.release()
+
+
+def test_decide_adds_a_slot_while_busy_with_a_backlog():
+    scaler = _scaler(4)
+
+    assert scaler.decide(4, 4, 10, 0, 0, 0.0) == (5, "backlog")
+    # 枠が余っている場合は増やさない
+    assert scaler.decide(4, 3, 10, 0, 0, 0.0) == (4, "")
+
+
+def test_decide_cuts_on_errors_and_latency():
+    scaler = _scaler(8)
+
+    assert scaler.decide(8, 8, 10, 10, 2, 0.1) == (6, "error_rate")
+    assert scaler.decide(8, 8, 10, 10, 0, 0.1) == (9, "backlog")
+    assert scaler.decide(8, 8, 10, 10, 0, 0.3) == (6, "latency")
+
+
+def test_decide_drops_a_slot_when_idle():
+    scaler = _scaler(4)
+
+    assert scaler.decide(4, 1, 0, 0, 0, 0.0) == (3, "idle")
+    assert scaler.decide(4, 2, 0, 0, 0, 0.0) == (4, "")
+
+
+def test_adjust_grows_the_limit_and_the_buffer(backlog):
+    scaler = _scaler(2)
+    backlog.depth = 10
+    _busy(scaler, 2)
+
+    scaler.adjust()
+
+    assert scaler.limit.limit == 3
+    assert scaler.buffer.capacity == 3 + 2
+
+
+def test_adjust_is_bounded_by_max_workers(backlog):
+    scaler = _scaler(8, max_workers=8)
+    backlog.depth = 10
+    _busy(scaler, 8)
+
+    scaler.adjust()
+
+    assert scaler.limit.limit == 8
+
+
+def test_adjust_is_bounded_by_min_workers(backlog):
+    scaler = _scaler(3, min_workers=2)
+    for _ in range(10):
+        scaler.record(0.1, error=True)
+
+    scaler.adjust()
+
+    # floor(3 * 0.75) = 2
+    assert scaler.limit.limit == 2
+    for _ in range(10):
+        scaler.record(0.1, error=True)
+    scaler.adjust()
+    assert scaler.limit.limit == 2
+    assert scaler.buffer.capacity == 2 + 2
@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import pytest
+
+from sqs_polling import polling
+from sqs_polling.execute_result import ExecuteResult
+from sqs_polling.handler import get_handlers
+from sqs_polling.polling import _close_ack_buffers, _execute, _execute_batch
+
+
+def _run_batch(queues, url: str, handler) -> list[ExecuteResult]:
+    polling(queue_url=url, aws_profile=queues.profile, batch=True)(handler)
+    (p,) = get_handlers(__name__)
+    messages = queues.receive(url)
+    results = _execute_batch(p, messages, p.exception_deletable, p.aws_profile)
+    _close_ack_buffers()
+    return results
+
+
+def test_nil_and_missing_results_are_deleted(engine, queues):
+    url = queues.create("jobs")
+    queues.send(url, "nil", "retry", "missing")
+
+    def handler(p, items):
+        return [ExecuteResult.Nil, ExecuteResult.Retry]
+
+    results = _run_batch(queues, url, handler)
+
+    assert results == [
+        ExecuteResult.Deletable,
+        ExecuteResult.Retry,
+        ExecuteResult.Deletable,
+    ]
+    # 再処理するメッセージだけが戻され、残りは削除される
+    assert [m["Body"] for m in queues.receive(url)] == ["retry"]
+    assert queues.in_flight(url) == 1
+
+
+def test_too_many_results_retry_the_batch(engine, queues):
+    url = queues.create("jobs")
+    queues.send(url, "a", "b")
+
+    def handler(p, items):
+        return [None, None, None]
+
+    results = _run_batch(queues, url, handler)
+
+    assert results == [ExecuteResult.Retry, ExecuteResult.Retry]
+    assert queues.visible(url) == 2
+
+
+def test_interrupted_handler_releases_the_message(engine, queues):
+    url = queues.create("jobs")
+    queues.send(url, "a")
+
+    @polling(queue_url=url, aws_profile=queues.profile)
+    def handler(ctx, body, *_):
+        raise SystemExit()
+
+    (p,) = get_handlers(__name__)
+    (message,) = queues.receive(url)
+    with pytest.raises(SystemExit):
+        _execute(p, message, p.exception_deletable, p.aws_profile)
+    _close_ack_buffers()
+
+    # 結果が無いメッセージも可視性タイムアウトまで残らない
+    assert queues.visible(url) == 1
@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+from threading import Thread, Timer
+from time import monotonic
+
+import pytest
+
+from sqs_polling.buffer import FifoBuffer, PrefetchBuffer
+
+
+def _message(body: str, group_id: str | None = None) -> dict:
+    message: dict = {"Body": body, "ReceiptHandle": f"handle-{body}"}
+    if group_id is not None:
+        message["Attributes"] = {"MessageGroupId": group_id}
+    return message
+
+
+def test_prefetch_buffer_reserves_only_free_slots():
+    buffer = PrefetchBuffer(3)
+
+    assert buffer.reserve(10) == 3
+    assert buffer.reserve(10, timeout=0) == 0
+
+    # 受信できなかった分の枠は戻る
+    buffer.put([_message("a")], 3)
+    assert buffer.reserve(10) == 2
+    assert buffer.stats() == {
+        "capacity": 3,
+        "waiting": 1,
+        "in_flight": 0,
+        "reserved": 2,
+        "bytes": 1,
+    }
+
+
+def test_prefetch_buffer_holds_a_slot_until_task_done():
+    buffer = PrefetchBuffer(1)
+    buffer.put([_message("a")], buffer.reserve(1))
+
+    message = buffer.get()
+    assert message is not None
+    assert buffer.reserve(1, timeout=0) == 0
+
+    buffer.task_done(message)
+    assert buffer.reserve(1, timeout=0) == 1
+
+
+def test_prefetch_buffer_limits_buffered_bytes():
+    buffer = PrefetchBuffer(10, max_bytes=5)
+    buffer.put([_message("12345")], buffer.reserve(1))
+
+    assert buffer.reserve(1, timeout=0) == 0
+
+
+def test_prefetch_buffer_close_returns_waiting_messages_and_wakes_receivers():
+    buffer = PrefetchBuffer(1)
+    buffer.put([_message("a")], buffer.reserve(1))
+    reserved = []
+    receiver = Thread(target=lambda: reserved.append(buffer.reserve(1)))
+    receiver.start()
+
+    assert buffer.close() == [_message("a")]
+    receiver.join(timeout=1)
+
+    assert reserved == [0]
+    assert buffer.get(timeout=0) is None
+
+
+def test_get_many_waits_for_later_receives_within_the_window():
+    buffer = PrefetchBuffer(10)
+    buffer.put([_message("a")], buffer.reserve(1))
+    later = Timer(0.05, lambda: buffer.put([_message("b")], buffer.reserve(1)))
+    later.start()
+
+    messages = buffer.get_many(2, timeout=1, window_seconds=5)
+    later.join()
+
+    # 件数の上限に達した時点で、ウィンドウの終了を待たずに返す
+    assert [m["Body"] for m in messages] == ["a", "b"]
+
+
+def test_get_many_returns_when_the_window_passes():
+    buffer = PrefetchBuffer(10)
+    buffer.put([_message("a")], buffer.reserve(1))
+
+    started_at = monotonic()
+    messages = buffer.get_many(10, timeout=1, window_seconds=0.1)
+
+    assert [m["Body"] for m in messages] == ["a"]
+    assert 0.1 <= monotonic() - started_at < 1
+
+
+def test_get_many_stops_at_max_bytes():
+    buffer = PrefetchBuffer(10)
+    buffer.put([_message("123"), _message("456"), _message("7")], buffer.reserve(3))
+
+    messages = buffer.get_many(10, timeout=0, max_bytes=5, window_seconds=5)
+
+    assert [m["Body"] for m in messages] == ["123", "456"]
+    assert buffer.stats()["waiting"] == 1
+
+
+def test_prefetch_buffer_requires_a_slot():
+    with pytest.raises(ValueError):
+        PrefetchBuffer(0)
+
+
+def test_fifo_buffer_hands_out_one_message_per_group_in_order():
+    buffer = FifoBuffer(4)
+    a0, a1, b0 = _message("a0", "a"), _message("a1", "a"), _message("b0", "b")
+    buffer.put([a0, a1, b0], buffer.reserve(3))
+
+    assert buffer.get(timeout=0) == a0
+    assert buffer.get(timeout=0) == b0
+    # 前のメッセージが終わるまで同じグループは取り出さない
+    assert buffer.get(timeout=0) is None
+
+    buffer.task_done(a0)
+    assert buffer.get(timeout=0) == a1
+
+
+def test_fifo_buffer_holds_one_slot_per_group():
+    buffer = FifoBuffer(2)
+    a = [_message(f"a{i}", "a") for i in range(5)]
+    buffer.put(a, buffer.reserve(2))
+
+    # 1つのグループの待機分は1枠しか使わないため、他のグループを受信できる
+    assert buffer.reserve(10, timeout=0) == 1
+
+
+def test_fifo_buffer_drop_group_returns_waiting_messages():
+    buffer = FifoBuffer(4)
+    a0, a1, a2 = (_message(f"a{i}", "a") for i in range(3))
+    buffer.put([a0, a1, a2], buffer.reserve(3))
+    assert buffer.get(timeout=0) == a0
+
+    assert buffer.drop_group("a") == [a1, a2]
+    buffer.task_done(a0)
+    assert buffer.get(timeout=0) is None
+    assert buffer.stats()["bytes"] == 0
@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import os
+
+import pytest
+
+from sqs_polling import client
+from sqs_polling.client import DEFAULT_MAX_POOL_CONNECTIONS, get_client, reset_clients
+
+PROFILE = {
+    "region_name": "us-east-1",
+    "aws_access_key_id": "testing",
+    "aws_secret_access_key": "testing",
+    "endpoint_url": "http://localhost:1",
+}
+
+
+@pytest.fixture(autouse=True)
+def _reset():
+    reset_clients()
+    yield
+    reset_clients()
+
+
+def _pool_size(sqs) -> int:
+    return sqs.meta.config.max_pool_connections
+
+
+def test_shares_client_per_profile():
+    sqs = get_client(PROFILE)
+
+    assert get_client(dict(PROFILE)) is sqs
+    assert _pool_size(sqs) == DEFAULT_MAX_POOL_CONNECTIONS
+    assert get_client({**PROFILE, "region_name": "eu-west-1"}) is not sqs
+    assert get_client({**PROFILE, "endpoint_url": "http://localhost:2"}) is not sqs
+
+
+def test_upgrades_pool_size_only_when_larger():
+    sqs = get_client(PROFILE)
+
+    larger = get_client(PROFILE, DEFAULT_MAX_POOL_CONNECTIONS + 5)
+    assert larger is not sqs
+    assert _pool_size(larger) == DEFAULT_MAX_POOL_CONNECTIONS + 5
+
+    # 小さいプールの要求では作り直さない
+    assert get_client(PROFILE) is larger
+    assert get_client(PROFILE, 2) is larger
+
+
+def test_resets_registry_after_fork():
+    sqs = get_client(PROFILE)
+    lock = client._lock
+
+    pid = os.fork()
+    if pid == 0:  # pragma: no cover
+        ok = not client._clients and client._lock is not lock
+        ok = ok and get_client(PROFILE) is not sqs
+        os._exit(0 if ok else 1)
+    _, status = os.waitpid(pid, 0)
+
+    assert os.waitstatus_to_exitcode(status) == 0
+    assert get_client(PROFILE) is sqs
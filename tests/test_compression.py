@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+import json
+
+import pytest
+
+from sqs_polling.compression import CONTENT_ENCODING, compress_body
+from sqs_polling.context import MessageContext
+from sqs_polling.decoder import json_decoder
+from sqs_polling.handler import Polling
+from sqs_polling.polling import _decode_body
+
+
+def _decode(body: str, encoding: str, **options):
+    p = Polling(queue_url="jobs", decoder=json_decoder(), **options)
+    message = {
+        "Body": body,
+        "MessageAttributes": {
+            CONTENT_ENCODING: {"DataType": "String", "StringValue": encoding}
+        },
+    }
+    return _decode_body(p, MessageContext.from_message(p, message), message)
+
+
+def test_decompression_is_off_by_default():
+    body = json.dumps({"a": 1})
+
+    assert _decode(body, "utf-8") == {"a": 1}
+    assert _decode(body, "gzip") == {"a": 1}
+
+
+@pytest.mark.parametrize("encoding", ["gzip", "GZIP", " Gzip "])
+def test_encoding_names_are_case_insensitive(encoding):
+    body = compress_body(json.dumps({"a": 1}).encode(), "gzip")
+
+    assert _decode(body, encoding, compression_attribute=CONTENT_ENCODING) == {"a": 1}
+
+
+def test_identity_leaves_the_body_unchanged():
+    body = json.dumps({"a": 1})
+
+    assert _decode(body, "identity", compression_attribute=CONTENT_ENCODING) == {"a": 1}
+
+
+def test_unknown_encodings_fail_when_enabled():
+    with pytest.raises(ValueError):
+        _decode("{}", "br", compression_attribute=CONTENT_ENCODING)
+
+
+def test_decoded_eventbridge_details_are_not_decompressed():
+    envelope = {"detail-type": "OrderPlaced", "source": "shop", "detail": {"a": 1}}
+
+    decoded = _decode(
+        json.dumps(envelope),
+        "gzip",
+        compression_attribute=CONTENT_ENCODING,
+        envelope="eventbridge",
+    )
+
+    assert decoded == {"a": 1}
@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+import pytest
+
+from sqs_polling.context import RECEIVED_AT, MessageContext
+from sqs_polling.handler import Polling
+
+
+def _polling(**kwargs) -> Polling:
+    return Polling(queue_url="https://sqs.us-east-1.amazonaws.com/0/jobs", **kwargs)
+
+
+def test_context_reads_the_message():
+    p = _polling()
+    ctx = MessageContext.from_message(
+        p,
+        {
+            "ReceiptHandle": "handle",
+            "Body": "body",
+            "Attributes": {
+                "ApproximateReceiveCount": "3",
+                "MessageGroupId": "group",
+                "MessageDeduplicationId": "dedup",
+            },
+            "MessageAttributes": {
+                "kind": {"DataType": "String", "StringValue": "order"},
+            },
+            RECEIVED_AT: 100.0,
+        },
+    )
+
+    assert ctx.retry == 2
+    assert ctx.receipt_handle == "handle"
+    assert ctx.message_attributes == {"kind": "order"}
+    assert ctx.message_group_id == "group"
+    assert ctx.message_deduplication_id == "dedup"
+    assert ctx.received_at == 100.0
+    # 未定義の属性はPollingの値を返す
+    assert ctx.queue_url == p.queue_url
+
+
+def test_context_is_max_retry_uses_its_own_retry_count():
+    p = _polling(max_retry_count=2)
+
+    assert not MessageContext(p, retry=1).is_max_retry()
+    assert MessageContext(p, retry=2).is_max_retry()
+    assert p.is_max_retry(2)
+
+
+def test_polling_retry_is_kept_as_a_deprecated_attribute():
+    p = _polling(max_retry_count=2)
+
+    with pytest.warns(DeprecationWarning):
+        p.retry = 2
+    with pytest.warns(DeprecationWarning):
+        assert p.retry == 2
+    with pytest.warns(DeprecationWarning):
+        assert p.is_max_retry()
@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass
+
+import pytest
+
+from sqs_polling.decoder import available_backend, json_decoder
+from sqs_polling.utils import loads
+
+BACKENDS = ["json", "orjson", "msgspec"]
+BODY = json.dumps({"id": 1, "tags": ["a"], "nested": {"name": "x"}})
+ENVELOPE = json.dumps(
+    {"id": 1, "data": {"__type__": "bytes", "__value__": "abc"}, "items": [{}]}
+)
+
+
+@dataclass
+class Order:
+    id: int
+    tags: list
+
+
+@pytest.fixture(params=BACKENDS)
+def backend(request) -> str:
+    # 未インストールのライブラリはスキップする
+    if request.param != "json":
+        pytest.importorskip(request.param)
+    return request.param
+
+
+def test_available_backend_prefers_the_fastest():
+    pytest.importorskip("msgspec")
+    assert available_backend() == "msgspec"
+
+
+def test_decodes_plain_bodies(backend):
+    decode = json_decoder(backend=backend)
+
+    assert decode(BODY) == json.loads(BODY)
+    assert decode(BODY.encode()) == json.loads(BODY)
+
+
+def test_restores_envelope_values(backend):
+    decode = json_decoder(backend=backend)
+
+    assert decode(ENVELOPE) == {"id": 1, "data": b"abc", "items": [{}]}
+
+
+def test_decodes_into_a_type(backend):
+    decode = json_decoder(Order, backend=backend)
+
+    assert decode(BODY) == Order(id=1, tags=["a"])
+
+
+def test_loads_skips_the_default_hook_without_a_marker():
+    assert loads(BODY) == json.loads(BODY)
+    assert loads(ENVELOPE)["data"] == b"abc"
+    assert loads(ENVELOPE.encode())["data"] == b"abc"
+
+
+def test_loads_always_calls_a_custom_object_hook():
+    seen = []
+
+    def hook(o: dict):
+        seen.append(o)
+        return {k.upper(): v for k, v in o.items()}
+
+    assert loads(BODY, object_hook=hook) == {
+        "ID": 1,
+        "TAGS": ["a"],
+        "NESTED": {"NAME": "x"},
+    }
+    assert len(seen) == 2
@@ -0,0 +1,280 @@
+from __future__ import annotations
+
+import json
+from importlib import import_module
+from threading import Event, Lock, current_thread
+from time import monotonic, sleep
+
+from sqs_polling import polling
+from sqs_polling.dlq import ERROR, RETRY_COUNT, SOURCE_MESSAGE_ID, SOURCE_QUEUE
+from sqs_polling.exceptions import RejectDLQException, RetryException
+
+
+def test_continuous_mode_handles_every_message(engine, queues):
+    url = queues.create("jobs")
+    queues.send(url, *(str(i) for i in range(30)))
+    lock = Lock()
+    handled = []
+
+    @polling(
+        queue_url=url,
+        aws_profile=queues.profile,
+        continuous=True,
+        wait_time_seconds=0,
+        interval_seconds=0.01,
+        max_backoff_seconds=0.05,
+        max_workers=4,
+        max_number_of_messages=10,
+        ack_interval_seconds=0.05,
+    )
+    def handler(ctx, body, *_):
+        with lock:
+            handled.append(int(body))
+
+    engine.start(__name__)
+    engine.run_until(lambda: queues.empty(url))
+
+    assert sorted(handled) == list(range(30))
+    # 削除はバッチでまとめて送信される
+    assert queues.client.calls["DeleteMessage"] == 0
+    assert queues.client.calls["DeleteMessageBatch"] < 30
+
+
+def test_continuous_mode_receives_only_for_free_workers(engine, queues):
+    url = queues.create("jobs")
+    queues.send(url, *(str(i) for i in range(6)))
+    samples = []
+
+    @polling(
+        queue_url=url,
+        aws_profile=queues.profile,
+        continuous=True,
+        wait_time_seconds=0,
+        interval_seconds=0.01,
+        max_backoff_seconds=0.05,
+        max_workers=2,
+        max_number_of_messages=10,
+        ack_interval_seconds=0,
+    )
+    def handler(ctx, body, *_):
+        sleep(0.1)
+
+    def sample() -> bool:
+        samples.append(queues.in_flight(url))
+        return queues.empty(url)
+
+    engine.start(__name__)
+    engine.run_until(sample)
+
+    # 空きワーカーの数までしか受信しない
+    assert max(samples) <= 2
+
+
+def test_retried_message_is_handled_again(engine, queues):
+    url = queues.create("jobs")
+    queues.send(url, "once", "twice")
+    handled = []
+
+    @polling(
+        queue_url=url,
+        aws_profile=queues.profile,
+        continuous=True,
+        wait_time_seconds=0,
+        interval_seconds=0.01,
+        max_backoff_seconds=0.05,
+    )
+    def handler(ctx, body, *_):
+        handled.append((body, ctx.retry))
+        if body == "twice" and ctx.retry == 0:
+            raise RetryException()
+
+    engine.start(__name__)
+    engine.run_until(lambda: queues.empty(url))
+
+    assert sorted(handled) == [("once", 0), ("twice", 0), ("twice", 1)]
+
+
+def test_interval_mode_handles_messages(engine, queues):
+    url = queues.create("jobs")
+    queues.send(url, *(str(i) for i in range(5)))
+    handled = []
+
+    @polling(
+        queue_url=url,
+        aws_profile=queues.profile,
+        wait_time_seconds=0,
+        interval_seconds=0.01,
+        max_workers=2,
+        max_number_of_messages=5,
+    )
+    def handler(ctx, body, *_):
+        handled.append(body)
+
+    engine.start(__name__)
+    engine.run_until(lambda: queues.empty(url))
+
+    assert sorted(handled) == ["0", "1", "2", "3", "4"]
+
+
+class ReceiveRecorder:
+    """
+    ReceiveMessageを呼び出したスレッドと同時に実行中の数を記録する
+    Record the threads that call ReceiveMessage and how many overlap
+    """
+
+    def __init__(self, receive) -> None:
+        self.receive = receive
+        self.threads: set[str] = set()
+        self.running = 0
+        self.peak = 0
+        self.lock = Lock()
+
+    def __call__(self, *args, **kwargs):
+        with self.lock:
+            self.threads.add(current_thread().name)
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        try:
+            return self.receive(*args, **kwargs)
+        finally:
+            with self.lock:
+                self.running -= 1
+
+
+def test_interval_receivers_long_poll_off_the_event_loop(engine, queues, monkeypatch):
+    url = queues.create("jobs")
+    # パッケージのpollingはデコレーターのため、モジュールはimport_moduleで取り出す
+    module = import_module("sqs_polling.polling")
+    recorder = ReceiveRecorder(module._sqs_receive)
+    monkeypatch.setattr(module, "_sqs_receive", recorder)
+
+    @polling(
+        queue_url=url,
+        aws_profile=queues.profile,
+        wait_time_seconds=1,
+        interval_seconds=0.01,
+        receivers=3,
+        max_workers=3,
+    )
+    def handler(ctx, body, *_):
+        pass
+
+    engine.start(__name__)
+    ticks = [monotonic()]
+
+    def tick() -> bool:
+        ticks.append(monotonic())
+        return ticks[-1] - ticks[0] > 1.5
+
+    engine.run_until(tick)
+
+    # ロングポーリング中もイベントループは止まらない
+    assert max(b - a for a, b in zip(ticks, ticks[1:])) < 0.5
+    assert "MainThread" not in recorder.threads
+    assert recorder.peak == 3
+
+
+def test_fifo_keeps_group_order_across_retries(engine, queues):
+    url = queues.create("jobs.fifo", FifoQueue="true", ContentBasedDeduplication="true")
+    for i in range(10):
+        for group in ("a", "b", "c"):
+            queues.send(url, f"{group}{i}", MessageGroupId=group)
+    lock = Lock()
+    handled: dict[str, list[int]] = {"a": [], "b": [], "c": []}
+
+    @polling(
+        queue_url=url,
+        aws_profile=queues.profile,
+        continuous=True,
+        wait_time_seconds=0,
+        interval_seconds=0.01,
+        max_backoff_seconds=0.05,
+        max_workers=3,
+        max_number_of_messages=10,
+        prefetch=10,
+    )
+    def handler(ctx, body, attributes, group_id, *_):
+        # 途中のメッセージを1度だけ再処理させても、後続が追い越さないこと
+        if body == "a3" and ctx.retry == 0:
+            raise RetryException()
+        with lock:
+            handled[group_id].append(int(body[1:]))
+
+    engine.start(__name__)
+    engine.run_until(lambda: queues.empty(url))
+
+    assert handled == {group: list(range(10)) for group in ("a", "b", "c")}
+
+
+def test_fifo_slow_group_does_not_hold_up_other_groups(engine, queues):
+    url = queues.create("jobs.fifo", FifoQueue="true", ContentBasedDeduplication="true")
+    queues.send(url, *(f"slow{i}" for i in range(5)), MessageGroupId="slow")
+    queues.send(url, *(f"fast{i}" for i in range(10)), MessageGroupId="fast")
+    release = Event()
+    fast = []
+
+    @polling(
+        queue_url=url,
+        aws_profile=queues.profile,
+        continuous=True,
+        wait_time_seconds=0,
+        interval_seconds=0.01,
+        max_backoff_seconds=0.05,
+        max_workers=2,
+        max_number_of_messages=10,
+    )
+    def handler(ctx, body, attributes, group_id, *_):
+        if group_id == "slow":
+            release.wait(10)
+        else:
+            fast.append(body)
+
+    engine.start(__name__)
+    try:
+        # 遅いグループの待機中のメッセージが枠を埋めず、他のグループは処理され続けること
+        engine.run_until(lambda: len(fast) == 10, timeout=5)
+    finally:
+        release.set()
+    engine.run_until(lambda: queues.empty(url))
+
+    assert fast == [f"fast{i}" for i in range(10)]
+
+
+def test_send_dlq_forwards_message_with_failure_attributes(engine, queues):
+    dlq = queues.create("jobs-dlq")
+    url = queues.create(
+        "jobs",
+        RedrivePolicy=json.dumps(
+            {"deadLetterTargetArn": queues.arn(dlq), "maxReceiveCount": 10}
+        ),
+    )
+    (message_id,) = queues.send(
+        url,
+        "broken",
+        MessageAttributes={"kind": {"DataType": "String", "StringValue": "order"}},
+    )
+    queues.send(url, "fine")
+
+    @polling(
+        queue_url=url,
+        aws_profile=queues.profile,
+        continuous=True,
+        wait_time_seconds=0,
+        interval_seconds=0.01,
+        max_backoff_seconds=0.05,
+    )
+    def handler(ctx, body, *_):
+        if body == "broken":
+            raise RejectDLQException("unknown order")
+
+    engine.start(__name__)
+    engine.run_until(lambda: queues.empty(url) and queues.visible(dlq) == 1)
+
+    (forwarded,) = queues.receive(dlq)
+    assert forwarded["Body"] == "broken"
+    attributes = forwarded["MessageAttributes"]
+    assert attributes["kind"]["StringValue"] == "order"
+    assert attributes[ERROR]["StringValue"] == "unknown order"
+    assert attributes[RETRY_COUNT]["StringValue"] == "0"
+    assert attributes[SOURCE_MESSAGE_ID]["StringValue"] == message_id
+    assert attributes[SOURCE_QUEUE]["StringValue"] == url
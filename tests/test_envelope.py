@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import base64
+import json
+
+import pytest
+
+from sqs_polling import context, polling
+from sqs_polling.context import MessageContext
+from sqs_polling.envelope import unwrap
+from sqs_polling.handler import Polling
+
+SNS = {
+    "Type": "Notification",
+    "MessageId": "sns-1",
+    "TopicArn": "arn:aws:sns:us-east-1:000000000000:orders",
+    "Message": json.dumps({"id": 1}),
+    "MessageAttributes": {
+        "kind": {"Type": "String", "Value": "order"},
+        "count": {"Type": "Number", "Value": "3"},
+        "blob": {"Type": "Binary", "Value": base64.b64encode(b"raw").decode()},
+        "tags": {"Type": "String.Array", "Value": '["a", "b"]'},
+    },
+}
+EVENTBRIDGE = {
+    "version": "0",
+    "id": "event-1",
+    "detail-type": "OrderPlaced",
+    "source": "shop",
+    "detail": {"id": 1},
+}
+
+
+def _context(**message) -> MessageContext:
+    p = Polling(queue_url="https://sqs.us-east-1.amazonaws.com/0/jobs")
+    return MessageContext.from_message(p, {"ReceiptHandle": "handle", **message})
+
+
+def test_unwraps_sns_messages():
+    ctx = _context()
+
+    assert unwrap("sns", json.dumps(SNS), ctx) == SNS["Message"]
+    assert ctx.envelope == SNS
+
+
+def test_unwraps_eventbridge_details():
+    ctx = _context()
+
+    assert unwrap("eventbridge", json.dumps(EVENTBRIDGE), ctx) == {"id": 1}
+    assert ctx.envelope == EVENTBRIDGE
+
+
+def test_auto_detects_the_envelope():
+    assert unwrap("auto", json.dumps(SNS), _context()) == SNS["Message"]
+    assert unwrap("auto", json.dumps(EVENTBRIDGE), _context()) == {"id": 1}
+
+
+@pytest.mark.parametrize("body", ["plain text", '{"id": 1}', "[1, 2]", "{broken"])
+def test_auto_passes_other_bodies_through(body):
+    ctx = _context()
+
+    assert unwrap("auto", body, ctx) is body
+    assert ctx.envelope is None
+
+
+def test_rejects_bodies_that_are_not_the_expected_envelope():
+    with pytest.raises(ValueError):
+        unwrap("sns", '{"id": 1}', _context())
+    with pytest.raises(ValueError):
+        unwrap("sns", json.dumps(EVENTBRIDGE), _context())
+
+
+def test_sns_attributes_are_merged_and_converted_lazily(monkeypatch):
+    ctx = _context(
+        MessageAttributes={
+            "kind": {"DataType": "String", "StringValue": "sqs"},
+            "trace": {"DataType": "String", "StringValue": "t-1"},
+        }
+    )
+    converted = []
+    sns_value = context._get_sns_attribute_value
+    monkeypatch.setattr(
+        context,
+        "_get_sns_attribute_value",
+        lambda v: converted.append(v) or sns_value(v),
+    )
+
+    unwrap("sns", json.dumps(SNS), ctx)
+    attributes = ctx.message_attributes
+    assert attributes is not None
+
+    assert converted == []
+    assert sorted(attributes) == ["blob", "count", "kind", "tags", "trace"]
+    assert len(attributes) == 5
+    # SNSの属性がSQSの属性より優先される
+    assert attributes["kind"] == "order"
+    assert converted == [SNS["MessageAttributes"]["kind"]]
+    assert attributes["trace"] == "t-1"
+    assert attributes["count"] == "3"
+    assert attributes["blob"] == b"raw"
+    assert attributes["tags"] == ["a", "b"]
+    # 変換済みの値は再変換しない
+    attributes["kind"]
+    assert len(converted) == 4
+
+
+def test_engine_passes_the_inner_message_to_the_handler(engine, queues):
+    url = queues.create("jobs")
+    queues.send(url, json.dumps(SNS))
+    queues.send(url, json.dumps(EVENTBRIDGE))
+    queues.send(url, json.dumps({"id": 2}))
+    handled = []
+
+    @polling(
+        queue_url=url,
+        aws_profile=queues.profile,
+        wait_time_seconds=0,
+        interval_seconds=0.01,
+        envelope="auto",
+        decoder=json.loads,
+    )
+    def handler(ctx, body, message_attributes, *_):
+        handled.append((body, dict(message_attributes or {}).get("kind")))
+
+    engine.start(__name__)
+    engine.run_until(lambda: queues.empty(url))
+
+    assert sorted(handled, key=lambda h: h[0]["id"]) == [
+        ({"id": 1}, "order"),
+        ({"id": 1}, None),
+        ({"id": 2}, None),
+    ]
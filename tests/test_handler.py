@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import sys
+from textwrap import dedent
+from time import monotonic
+
+import pytest
+
+from sqs_polling import polling
+from sqs_polling.handler import get_handler, get_handlers
+from sqs_polling.main import _get_pollings, handler
+
+HANDLER = """
+from sqs_polling import polling
+
+
+@polling(queue_url="{queue}")
+def handle(ctx, body, *_):
+    pass
+"""
+
+
+@pytest.fixture
+def modules(tmp_path, monkeypatch):
+    monkeypatch.syspath_prepend(str(tmp_path))
+    names = []
+
+    def write(name: str, source: str) -> None:
+        (tmp_path / f"{name}.py").write_text(dedent(source))
+        names.append(name)
+
+    yield write
+    for name in names:
+        sys.modules.pop(name, None)
+
+
+def test_same_named_handlers_in_different_modules(modules):
+    modules("orders", HANDLER.format(queue="orders"))
+    modules("billing", HANDLER.format(queue="billing"))
+
+    assert [p.queue_url for p in _get_pollings("orders")] == ["orders"]
+    assert [p.queue_url for p in _get_pollings("billing.handle")] == ["billing"]
+    assert get_handler("orders.handle").queue_url == "orders"
+    assert [p.queue_url for p in get_handlers("billing")] == ["billing"]
+
+
+def test_handler_rejects_a_module_with_several_handlers(modules):
+    modules(
+        "jobs",
+        HANDLER.format(queue="orders")
+        + HANDLER.format(queue="billing").replace("handle(", "other("),
+    )
+
+    with pytest.raises(ValueError):
+        handler("jobs")
+
+
+def test_rejects_duplicate_registrations():
+    def handle(ctx, body, *_):
+        pass
+
+    polling(queue_url="orders")(handle)
+    with pytest.raises(ValueError):
+        polling(queue_url="billing")(handle)
+    assert get_handler(f"{__name__}.{handle.__qualname__}").queue_url == "orders"
+
+
+def test_a_long_poll_does_not_hold_up_other_queues(engine, queues):
+    idle = queues.create("idle")
+    busy = queues.create("busy")
+    queues.send(busy, *(str(i) for i in range(5)))
+    options = dict(aws_profile=queues.profile, interval_seconds=0.01)
+
+    @polling(queue_url=idle, wait_time_seconds=2, **options)
+    def wait(ctx, body, *_):
+        pass
+
+    @polling(queue_url=busy, wait_time_seconds=0, max_number_of_messages=5, **options)
+    def work(ctx, body, *_):
+        pass
+
+    started_at = monotonic()
+    engine.start(__name__)
+    engine.run_until(lambda: queues.empty(busy))
+
+    assert monotonic() - started_at < 1.0
@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import asyncio
+from time import sleep
+
+import pytest
+
+from sqs_polling import polling
+from sqs_polling.lease import LeaseManager
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr("sqs_polling.lease.monotonic", lambda: now[0])
+    return now
+
+
+def _timeouts(lease: LeaseManager) -> list[int]:
+    return [entry["VisibilityTimeout"] for batch in lease.due() for entry in batch]
+
+
+def test_extends_leases_about_to_expire(clock):
+    lease = LeaseManager("jobs", 10)
+    lease.track("a")
+
+    clock[0] = 4.0
+    assert _timeouts(lease) == []
+
+    clock[0] = 6.0
+    (batch,) = lease.due()
+    assert batch == [{"ReceiptHandle": "a", "VisibilityTimeout": 10, "Id": "0"}]
+
+    lease.extended(batch, {"Successful": [{"Id": "0"}]})
+    clock[0] = 10.0
+    assert _timeouts(lease) == []
+
+
+def test_stops_tracking_sender_fault_extensions(clock):
+    lease = LeaseManager("jobs", 10)
+    lease.track("a")
+
+    clock[0] = 6.0
+    (batch,) = lease.due()
+    lease.extended(batch, {"Failed": [{"Id": "0", "SenderFault": True}]})
+
+    assert len(lease) == 0
+
+
+def test_keeps_transient_failures_for_the_next_tick(clock):
+    lease = LeaseManager("jobs", 10)
+    lease.track("a")
+
+    clock[0] = 6.0
+    (batch,) = lease.due()
+    lease.extended(
+        batch, {"Failed": [{"Id": "0", "SenderFault": False, "Code": "InternalError"}]}
+    )
+
+    assert len(lease) == 1
+    clock[0] = 6.5
+    assert _timeouts(lease) == [10]
+
+
+def test_stops_extending_after_max_lease_seconds(clock):
+    lease = LeaseManager("jobs", 10, max_lease_seconds=12)
+    lease.track("a")
+
+    clock[0] = 6.0
+    assert _timeouts(lease) == [6]
+
+    clock[0] = 12.0
+    assert _timeouts(lease) == []
+    assert len(lease) == 0
+
+
+def test_never_extends_to_a_zero_visibility_timeout(clock):
+    lease = LeaseManager("jobs", 10, max_lease_seconds=10.5)
+    lease.track("a")
+
+    clock[0] = 9.6
+    assert _timeouts(lease) == [1]
+
+
+def test_checks_more_often_than_the_margin():
+    for visibility_timeout in (1, 2, 10, 60):
+        lease = LeaseManager("jobs", visibility_timeout)
+        assert lease.interval_seconds < lease.margin_seconds
+
+
+def test_engine_keeps_long_running_messages_invisible(engine, queues):
+    url = queues.create("jobs")
+    queues.send(url, "slow")
+    handled = []
+
+    @polling(
+        queue_url=url,
+        aws_profile=queues.profile,
+        visibility_timeout=2,
+        extend_visibility=True,
+        continuous=True,
+        wait_time_seconds=0,
+        interval_seconds=0.01,
+        max_backoff_seconds=0.05,
+        max_workers=2,
+    )
+    def handler(ctx, body, *_):
+        handled.append(body)
+        # 可視性タイムアウトを超えて処理しても他の受信に渡らないこと
+        sleep(4)
+
+    engine.start(__name__)
+    engine.run_until(lambda: queues.empty(url))
+
+    assert handled == ["slow"]
+    assert queues.client.calls["ChangeMessageVisibilityBatch"] >= 2
+
+
+def test_async_engine_keeps_long_running_messages_invisible(engine, queues):
+    url = queues.create("jobs")
+    queues.send(url, "slow")
+    handled = []
+
+    @polling(
+        queue_url=url,
+        aws_profile=queues.profile,
+        visibility_timeout=2,
+        extend_visibility=True,
+        wait_time_seconds=0,
+        interval_seconds=0.01,
+        max_backoff_seconds=0.05,
+        max_workers=2,
+    )
+    async def handler(ctx, body, *_):
+        handled.append(body)
+        await asyncio.sleep(4)
+
+    engine.start(__name__)
+    engine.run_until(lambda: queues.empty(url))
+
+    assert handled == ["slow"]
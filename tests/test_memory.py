@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import json
+import pickle
+
+import pytest
+from botocore.exceptions import ClientError
+
+from sqs_polling.memory import MemoryTransport
+
+
+@pytest.fixture
+def clock():
+    return [0.0]
+
+
+@pytest.fixture
+def memory(clock) -> MemoryTransport:
+    return MemoryTransport(clock=lambda: clock[0])
+
+
+def test_hides_received_messages_until_the_visibility_timeout(queues, clock):
+    url = queues.create("jobs")
+    queues.send(url, "a")
+
+    (message,) = queues.receive(url, visibility_timeout=10)
+    assert message["Attributes"]["ApproximateReceiveCount"] == "1"
+    assert queues.receive(url) == []
+
+    clock[0] = 10.0
+    (message,) = queues.receive(url)
+    assert message["Attributes"]["ApproximateReceiveCount"] == "2"
+
+
+def test_change_visibility_needs_an_in_flight_message(queues, clock):
+    url = queues.create("jobs")
+    queues.send(url, "a")
+    (message,) = queues.receive(url, visibility_timeout=10)
+
+    queues.client.change_message_visibility(
+        QueueUrl=url, ReceiptHandle=message["ReceiptHandle"], VisibilityTimeout=0
+    )
+    assert queues.visible(url) == 1
+    with pytest.raises(ClientError):
+        queues.client.change_message_visibility(
+            QueueUrl=url, ReceiptHandle=message["ReceiptHandle"], VisibilityTimeout=0
+        )
+
+
+def test_moves_messages_to_the_dlq_after_max_receive_count(queues, clock):
+    dlq = queues.create("jobs-dlq")
+    url = queues.create(
+        "jobs",
+        RedrivePolicy=json.dumps(
+            {
+                "deadLetterTargetArn": "arn:aws:sqs:us-east-1:000000000000:jobs-dlq",
+                "maxReceiveCount": 2,
+            }
+        ),
+    )
+    queues.send(url, "a")
+
+    for i in range(2):
+        assert len(queues.receive(url, visibility_timeout=1)) == 1
+        clock[0] += 1
+    assert queues.receive(url) == []
+    assert [m["Body"] for m in queues.receive(dlq)] == ["a"]
+
+
+def test_fifo_locks_a_group_while_it_is_in_flight(queues):
+    url = queues.create("jobs.fifo", FifoQueue="true")
+    for i in range(2):
+        queues.send(url, f"a{i}", MessageGroupId="a", MessageDeduplicationId=f"a{i}")
+    queues.send(url, "b0", MessageGroupId="b", MessageDeduplicationId="b0")
+    # 重複排除IDが同じメッセージは追加されない
+    queues.send(url, "b0", MessageGroupId="b", MessageDeduplicationId="b0")
+
+    first = queues.receive(url, max_number=1)
+    assert [m["Body"] for m in first] == ["a0"]
+    assert [m["Body"] for m in queues.receive(url)] == ["b0"]
+    assert queues.receive(url) == []
+
+    queues.client.delete_message(QueueUrl=url, ReceiptHandle=first[0]["ReceiptHandle"])
+    assert [m["Body"] for m in queues.receive(url)] == ["a1"]
+
+
+def test_can_not_be_shared_with_worker_processes(memory):
+    with pytest.raises(TypeError):
+        pickle.dumps(memory)
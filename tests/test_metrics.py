@@ -0,0 +1,21 @@
+from __future__ import annotations
+
+import os
+import signal
+
+from sqs_polling.metrics import REGISTRY, ack_entries
+
+
+def test_resets_registry_locks_after_fork():
+    # 他のスレッドが記録中にforkした状態を、ロックを持ったままforkして再現する
+    with ack_entries._lock:
+        pid = os.fork()
+        if pid == 0:  # pragma: no cover
+            # ロックが作り直されていなければ待ち続けるため、タイムアウトで終了させる
+            signal.alarm(10)
+            ack_entries.inc("jobs", "delete", "success")
+            REGISTRY.collect()
+            os._exit(0)
+    _, status = os.waitpid(pid, 0)
+
+    assert os.waitstatus_to_exitcode(status) == 0
@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import json
+from io import BytesIO
+
+import pytest
+from botocore.response import StreamingBody
+
+from sqs_polling import polling
+from sqs_polling.decoder import json_decoder
+from sqs_polling.payload import POINTER_CLASS
+
+
+class FakeS3:
+    """
+    get_object・delete_objectだけを持つS3のテスト用クライアント
+    An S3 stand-in that serves objects from a dict
+    """
+
+    def __init__(self, objects: dict[str, bytes]) -> None:
+        self.objects = objects
+        self.deleted: list[str] = []
+
+    def get_object(self, *, Bucket: str, Key: str):
+        data = self.objects[Key]
+        return {
+            "Body": StreamingBody(BytesIO(data), len(data)),
+            "ContentLength": len(data),
+        }
+
+    def delete_object(self, *, Bucket: str, Key: str):
+        self.deleted.append(Key)
+        return {}
+
+
+@pytest.fixture
+def s3(monkeypatch) -> FakeS3:
+    s3 = FakeS3({})
+    monkeypatch.setattr("sqs_polling.payload.get_client", lambda *_, **__: s3)
+    return s3
+
+
+def _pointer(key: str) -> str:
+    return json.dumps([POINTER_CLASS, {"s3BucketName": "payloads", "s3Key": key}])
+
+
+@pytest.mark.parametrize("spill_bytes", [0, 16])
+def test_offloaded_payloads_are_decoded(engine, queues, s3, spill_bytes):
+    url = queues.create("jobs")
+    s3.objects["large"] = json.dumps({"items": list(range(100))}).encode()
+    queues.send(url, _pointer("large"))
+    handled = []
+
+    @polling(
+        queue_url=url,
+        aws_profile=queues.profile,
+        decoder=json_decoder(),
+        payload_offload=True,
+        payload_spill_bytes=spill_bytes,
+        continuous=True,
+        wait_time_seconds=0,
+        interval_seconds=0.01,
+        max_backoff_seconds=0.05,
+    )
+    def handler(ctx, body, *_):
+        handled.append(body)
+
+    engine.start(__name__)
+    engine.run_until(lambda: queues.empty(url) and s3.deleted == ["large"])
+
+    # 一時ファイルに書き出した本文もdecoderを通してから渡される
+    assert handled == [{"items": list(range(100))}]
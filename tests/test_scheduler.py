@@ -0,0 +1,180 @@
+from __future__ import annotations
+
+from threading import Lock
+from time import sleep
+
+import pytest
+
+from sqs_polling import polling
+from sqs_polling.handler import Polling, get_handlers
+from sqs_polling.scheduler import PRIORITY, Scheduler
+
+
+def _polling(name: str, **options) -> Polling:
+    return Polling(queue_url=name, **options)
+
+
+def test_weighted_limits_follow_the_weights():
+    scheduler = Scheduler(4)
+    bulk = _polling("bulk", weight=1, max_workers=4)
+    orders = _polling("orders", weight=3, max_workers=4)
+    scheduler.register(bulk)
+    scheduler.register(orders)
+    scheduler.set_backlog(bulk, 100)
+    scheduler.set_backlog(orders, 100)
+
+    assert scheduler.receive_limit(orders, 10, 0) == 3
+    assert scheduler.receive_limit(bulk, 10, 0) == 1
+
+
+def test_limits_are_bounded_by_backlog_and_max_number():
+    scheduler = Scheduler(8)
+    orders = _polling("orders", max_workers=8)
+    scheduler.register(orders)
+
+    scheduler.set_backlog(orders, 100)
+    assert scheduler.receive_limit(orders, 5, 0) == 5
+    assert scheduler.receive_limit(orders, 10, 6) == 2
+
+    scheduler.set_backlog(orders, 2)
+    assert scheduler.receive_limit(orders, 10, 0) == 2
+
+
+def test_priority_serves_the_higher_queue_first():
+    scheduler = Scheduler(1, PRIORITY)
+    low = _polling("low", priority=0)
+    high = _polling("high", priority=1)
+    scheduler.register(low)
+    scheduler.register(high)
+    scheduler.set_backlog(high, 10)
+
+    assert not scheduler.acquire(low, timeout=0.05)
+    assert scheduler.acquire(high, timeout=0.05)
+    scheduler.release(high)
+
+    scheduler.set_backlog(high, 0)
+    assert scheduler.acquire(low, timeout=0.05)
+    scheduler.release(low)
+
+
+def test_blocked_queue_receives_nothing():
+    scheduler = Scheduler(4, PRIORITY)
+    low = _polling("low", priority=0, max_workers=4)
+    high = _polling("high", priority=1, max_workers=4)
+    scheduler.register(low)
+    scheduler.register(high)
+
+    scheduler.set_backlog(high, 10)
+    assert scheduler.receive_limit(low, 10, 0) == 0
+
+    scheduler.set_backlog(high, 0)
+    assert scheduler.receive_limit(low, 10, 0) == 4
+
+
+def test_queue_holding_its_share_receives_nothing():
+    scheduler = Scheduler(2)
+    orders = _polling("orders", max_workers=2)
+    scheduler.register(orders)
+    scheduler.set_backlog(orders, 100)
+
+    assert scheduler.receive_limit(orders, 10, 2) == 0
+    # 滞留が無くても、保持していなければ新着を受け取る
+    scheduler.set_backlog(orders, 0)
+    assert scheduler.receive_limit(orders, 10, 0) == 2
+
+
+def test_rejects_invalid_settings():
+    with pytest.raises(ValueError):
+        Scheduler(0)
+    with pytest.raises(ValueError):
+        Scheduler(1, "fifo")  # type: ignore
+
+
+def test_engine_shares_workers_between_queues(engine, queues):
+    urls = [queues.create("orders"), queues.create("bulk")]
+    for url in urls:
+        queues.send(url, *(str(i) for i in range(10)))
+    lock = Lock()
+    running = [0]
+    peak = [0]
+
+    def handle(ctx, body, *_):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        sleep(0.01)
+        with lock:
+            running[0] -= 1
+
+    options = dict(
+        aws_profile=queues.profile,
+        continuous=True,
+        wait_time_seconds=0,
+        interval_seconds=0.01,
+        max_backoff_seconds=0.05,
+        max_workers=2,
+        max_number_of_messages=10,
+    )
+
+    @polling(queue_url=urls[0], weight=3, **options)
+    def orders(*args):
+        handle(*args)
+
+    @polling(queue_url=urls[1], weight=1, **options)
+    def bulk(*args):
+        handle(*args)
+
+    scheduler = Scheduler(2, refresh_seconds=0.1)
+    scheduler.start()
+    try:
+        engine.start(__name__, scheduler)
+        engine.run_until(lambda: all(queues.empty(url) for url in urls))
+    finally:
+        scheduler.stop()
+
+    stats = scheduler.stats()
+    assert [stats[url]["handled"] for url in urls] == [10, 10]
+    # 2つのキューで合わせて2枠までしか同時に処理しない
+    assert peak[0] <= 2
+
+
+def test_engine_does_not_receive_for_a_blocked_queue(engine, queues):
+    high_url, low_url = queues.create("high"), queues.create("low")
+    queues.send(high_url, *(str(i) for i in range(5)))
+    queues.send(low_url, *(str(i) for i in range(5)))
+    options = dict(
+        aws_profile=queues.profile,
+        continuous=True,
+        wait_time_seconds=0,
+        interval_seconds=0.01,
+        max_backoff_seconds=0.05,
+    )
+
+    @polling(queue_url=high_url, priority=1, **options)
+    def high(ctx, body, *_):
+        sleep(0.05)
+
+    @polling(queue_url=low_url, priority=0, **options)
+    def low(ctx, body, *_):
+        pass
+
+    scheduler = Scheduler(1, PRIORITY, refresh_seconds=0.05)
+    for p in get_handlers(__name__):
+        scheduler.register(p)
+        if p.queue_url == high_url:
+            scheduler.set_backlog(p, 5)
+    scheduler.start()
+    samples = []
+
+    def sample() -> bool:
+        samples.append((queues.visible(high_url), queues.in_flight(low_url)))
+        return queues.empty(high_url) and queues.empty(low_url)
+
+    try:
+        engine.start(__name__, scheduler)
+        engine.run_until(sample)
+    finally:
+        scheduler.stop()
+
+    # 優先度の高いキューに滞留がある間は、低いキューのメッセージを受信しない
+    assert all(in_flight == 0 for visible, in_flight in samples if visible > 0)
@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+from threading import Event, current_thread
+
+import pytest
+
+from sqs_polling import signal
+from sqs_polling.signal import Signal, SignalDispatcher, heartbeat
+
+
+@pytest.fixture
+def dispatcher(monkeypatch) -> SignalDispatcher:
+    dispatcher = SignalDispatcher(maxsize=2)
+    monkeypatch.setattr(signal, "dispatcher", dispatcher)
+    yield dispatcher
+    dispatcher.close()
+
+
+def test_asynchronous_handlers_run_on_the_dispatcher(dispatcher):
+    threads = []
+    received = []
+    s = Signal("Test")
+    s.connect(lambda **kwargs: threads.append(current_thread()))
+    s.connect(lambda **kwargs: received.append(kwargs), asynchronous=True)
+
+    s.send(id=1)
+
+    assert dispatcher.flush(timeout=5)
+    assert received == [{"id": 1}]
+    assert threads == [current_thread()]
+
+
+def test_batch_handlers_get_the_keyword_arguments_of_several_sends(dispatcher):
+    started, release = Event(), Event()
+    batches = []
+    s = Signal("Test")
+    s.connect(lambda **_: started.set() or release.wait(5), asynchronous=True)
+    s.connect(batches.append, batch=True)
+
+    s.send(id=1)
+    started.wait(5)
+    # 配信中に積まれた送信はまとめて渡される
+    s.send(id=2)
+    s.send(id=3)
+    release.set()
+
+    assert dispatcher.flush(timeout=5)
+    assert batches == [[{"id": 1}], [{"id": 2}, {"id": 3}]]
+
+
+def test_failing_handlers_do_not_stop_the_others(dispatcher):
+    received = []
+
+    def fail(**_):
+        raise RuntimeError("broken")
+
+    s = Signal("Test")
+    s.connect(fail)
+    s.connect(lambda **kwargs: received.append(("sync", kwargs)))
+    s.connect(fail, asynchronous=True)
+    s.connect(lambda **kwargs: received.append(("async", kwargs)), asynchronous=True)
+
+    s.send(id=1)
+
+    assert dispatcher.flush(timeout=5)
+    assert received == [("sync", {"id": 1}), ("async", {"id": 1})]
+
+
+def test_drops_sends_when_the_queue_is_full(dispatcher):
+    started, release = Event(), Event()
+    received = []
+
+    def slow(**kwargs):
+        started.set()
+        release.wait(5)
+        received.append(kwargs)
+
+    s = Signal("Test")
+    s.connect(slow, asynchronous=True)
+
+    s.send(id=1)
+    started.wait(5)
+    # 送信元を待たせずに、上限を超えた分は破棄する
+    for i in range(2, 5):
+        s.send(id=i)
+    release.set()
+
+    assert dispatcher.flush(timeout=5)
+    assert dispatcher.dropped == 1
+    assert received == [{"id": 1}, {"id": 2}, {"id": 3}]
+
+
+def test_heartbeat_raises_handler_exceptions():
+    def fail():
+        raise RuntimeError("unhealthy")
+
+    heartbeat.connect(fail)
+    try:
+        with pytest.raises(RuntimeError):
+            heartbeat.send()
+    finally:
+        heartbeat.disconnect(fail)
+
+    s = Signal("Test")
+    s.connect(fail)
+    s.send()
@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import json
+
+import pytest
+
+pytest.importorskip("opentelemetry.sdk")
+
+from opentelemetry import trace  # noqa: E402
+from opentelemetry.sdk.trace import TracerProvider  # noqa: E402
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor  # noqa: E402
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import (  # noqa: E402
+    InMemorySpanExporter,
+)
+
+from sqs_polling import polling, tracing  # noqa: E402
+from sqs_polling.exceptions import RejectDLQException  # noqa: E402
+from sqs_polling.handler import Polling  # noqa: E402
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+SPAN_ID = "00f067aa0ba902b7"
+TRACEPARENT = f"00-{TRACE_ID}-{SPAN_ID}-01"
+XRAY_HEADER = "Root=1-%s-%s;Parent=%s;Sampled=1" % (TRACE_ID[:8], TRACE_ID[8:], SPAN_ID)
+
+
+@pytest.fixture
+def spans(monkeypatch) -> InMemorySpanExporter:
+    # グローバルのTracerProviderは1度しか設定できないため、テストごとにトレーサーを差し替える
+    exporter = InMemorySpanExporter()
+    provider = TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(exporter))
+    monkeypatch.setattr(tracing, "_tracer", lambda: provider.get_tracer(__name__))
+    return exporter
+
+
+def _polling() -> Polling:
+    return Polling(queue_url="https://sqs.us-east-1.amazonaws.com/0/jobs", tracing=True)
+
+
+def _parent(span) -> tuple[str, str]:
+    assert span.parent is not None
+    return (
+        trace.format_trace_id(span.parent.trace_id),
+        trace.format_span_id(span.parent.span_id),
+    )
+
+
+def test_process_span_is_a_child_of_the_w3c_traceparent(spans):
+    message = {
+        "MessageId": "m-1",
+        "MessageAttributes": {
+            "traceparent": {"DataType": "String", "StringValue": TRACEPARENT}
+        },
+    }
+
+    with tracing.process_span(_polling(), message):
+        pass
+
+    (span,) = spans.get_finished_spans()
+    assert span.name == "jobs process"
+    assert span.kind == trace.SpanKind.CONSUMER
+    assert _parent(span) == (TRACE_ID, SPAN_ID)
+    assert span.attributes["messaging.message.id"] == "m-1"
+
+
+def test_process_span_is_a_child_of_the_xray_header(spans):
+    message = {
+        "MessageId": "m-1",
+        "Attributes": {tracing.AWS_TRACE_HEADER: XRAY_HEADER},
+    }
+
+    with tracing.process_span(_polling(), message):
+        pass
+
+    (span,) = spans.get_finished_spans()
+    assert _parent(span) == (TRACE_ID, SPAN_ID)
+
+
+def test_broken_xray_headers_start_a_new_trace(spans):
+    message = {"Attributes": {tracing.AWS_TRACE_HEADER: "Root=1-abc;Parent=xyz"}}
+
+    with tracing.process_span(_polling(), message):
+        pass
+
+    (span,) = spans.get_finished_spans()
+    assert span.parent is None
+
+
+def test_dlq_forwards_carry_the_trace_context(engine, queues, spans):
+    dlq = queues.create("jobs-dlq")
+    url = queues.create(
+        "jobs",
+        RedrivePolicy=json.dumps(
+            {"deadLetterTargetArn": queues.arn(dlq), "maxReceiveCount": 10}
+        ),
+    )
+    queues.send(
+        url,
+        "broken",
+        MessageAttributes={
+            "traceparent": {"DataType": "String", "StringValue": TRACEPARENT}
+        },
+    )
+
+    @polling(
+        queue_url=url,
+        aws_profile=queues.profile,
+        wait_time_seconds=0,
+        interval_seconds=0.01,
+        tracing=True,
+    )
+    def handler(ctx, body, *_):
+        raise RejectDLQException("unknown order")
+
+    engine.start(__name__)
+    engine.run_until(lambda: queues.empty(url) and queues.visible(dlq) == 1)
+
+    (forwarded,) = queues.receive(dlq)
+    traceparent = forwarded["MessageAttributes"]["traceparent"]["StringValue"]
+    _, trace_id, span_id, _ = traceparent.split("-")
+    finished = {span.name: span for span in spans.get_finished_spans()}
+    assert {"jobs process", "decode", "handle", "ack"} <= set(finished)
+    assert _parent(finished["jobs process"]) == (TRACE_ID, SPAN_ID)
+    # DLQのメッセージは転送した時点のスパンを親として引き継ぐ
+    assert trace_id == TRACE_ID
+    assert span_id == trace.format_span_id(finished["ack"].context.span_id)
@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+from textwrap import dedent
+
+from sqs_polling import polling
+from sqs_polling.execute_result import ExecuteResult
+from sqs_polling.handler import get_handlers
+from sqs_polling.metrics import ack_entries
+from sqs_polling.worker import ProcessWorkerPool
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def test_process_workers_handle_messages(engine, sqs_queues, tmp_path):
+    url = sqs_queues.create("jobs")
+    sqs_queues.send(url, *(str(i) for i in range(5)))
+
+    @polling(
+        queue_url=url,
+        aws_profile=sqs_queues.profile,
+        process_worker=True,
+        continuous=True,
+        wait_time_seconds=0,
+        interval_seconds=0.01,
+        max_backoff_seconds=0.05,
+        max_workers=2,
+        max_number_of_messages=5,
+    )
+    def handler(ctx, body, *_):
+        # ワーカープロセスで処理されるため、結果はファイルで受け取る
+        (tmp_path / body).write_text(str(os.getpid()))
+
+    engine.start(__name__)
+    engine.run_until(lambda: sqs_queues.empty(url))
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["0", "1", "2", "3", "4"]
+    assert str(os.getpid()) not in {path.read_text() for path in tmp_path.iterdir()}
+
+
+def _deleted(url: str) -> float:
+    labels = {"queue": url, "action": "delete", "outcome": "success"}
+    return sum(s.value for s in ack_entries.collect().samples if s.labels == labels)
+
+
+def test_worker_process_metrics_are_recorded_in_the_parent(sqs_queues):
+    url = sqs_queues.create("jobs")
+    sqs_queues.send(url, *(str(i) for i in range(5)))
+
+    @polling(
+        queue_url=url,
+        aws_profile=sqs_queues.profile,
+        process_worker=True,
+        max_workers=2,
+        ack_interval_seconds=60,
+    )
+    def handle(ctx, body, *_):
+        pass
+
+    (p,) = get_handlers(__name__)
+    deleted = _deleted(url)
+    pool = ProcessWorkerPool(p, p.max_workers)
+    futures = [pool.submit_message([message]) for message in sqs_queues.receive(url)]
+    assert [f.result() for f in futures] == [ExecuteResult.Deletable] * 5
+    pool.shutdown()
+
+    # 削除はワーカープロセスの終了時に送信され、親プロセスで記録される
+    assert _deleted(url) - deleted == 5
+    assert sqs_queues.empty(url)
+
+
+SPAWN_SCRIPT = """
+import multiprocessing
+import os
+import sys
+
+from sqs_polling import polling
+from sqs_polling.handler import _handlers
+from sqs_polling.worker import ProcessWorkerPool
+
+
+@polling(
+    queue_url=os.environ["QUEUE_URL"],
+    aws_profile={
+        "endpoint_url": os.environ["ENDPOINT_URL"],
+        "region_name": "us-east-1",
+        "aws_access_key_id": "testing",
+        "aws_secret_access_key": "testing",
+    },
+    process_worker=True,
+)
+def handler(ctx, body, *_):
+    with open(os.environ["OUTPUT"], "w") as f:
+        f.write(body)
+
+
+if __name__ == "__main__":
+    multiprocessing.set_start_method(sys.argv[1])
+    (p,) = _handlers.values()
+    pool = ProcessWorkerPool(p, 1)
+    message = {
+        "ReceiptHandle": os.environ["RECEIPT_HANDLE"],
+        "Body": "from main",
+        "Attributes": {"ApproximateReceiveCount": "1"},
+    }
+    print(pool.submit_message([message]).result())
+    pool.shutdown()
+"""
+
+
+def test_spawned_workers_load_handlers_defined_in_main(sqs_queues, tmp_path):
+    url = sqs_queues.create("jobs")
+    script = tmp_path / "worker_main.py"
+    script.write_text(dedent(SPAWN_SCRIPT))
+    for method in ("spawn", "forkserver"):
+        sqs_queues.send(url, method)
+        (message,) = sqs_queues.receive(url)
+        output = tmp_path / method
+        env = dict(
+            os.environ,
+            PYTHONPATH=str(ROOT),
+            QUEUE_URL=url,
+            ENDPOINT_URL=sqs_queues.profile["endpoint_url"],
+            RECEIPT_HANDLE=message["ReceiptHandle"],
+            OUTPUT=str(output),
+        )
+
+        # __main__のハンドラーはワーカープロセスでは__mp_main__として読み込まれる
+        result = subprocess.run(
+            [sys.executable, str(script), method],
+            env=env,
+            cwd=tmp_path,
+            capture_output=True,
+            text=True,
+            timeout=60,
+        )
+
+        assert result.returncode == 0, result.stderr
+        assert output.read_text() == "from main"
+        assert sqs_queues.empty(url)